@@ -0,0 +1,106 @@
+'''
+    test_backends.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that every table backend in tmm_backends.py (but the GDB one, which
+    needs arcpy) writes, reads & updates policy tables alike.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+node_ids = [10003, 10001, 10002, 10005, 10004]
+tline_ids = ['m000001', 'b000000', 'c000002']
+
+
+class BackendsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def table_paths(self, name):
+        paths = [
+            os.path.join(self.work_dir, name + '.csv'),
+            os.path.join(self.work_dir, 'TMM_GIS.sqlite', name),
+            os.path.join(self.work_dir, 'TMM_GIS.gpkg', name),
+        ]
+        if pyarrow is not None:
+            paths += [os.path.join(self.work_dir, name + '.parquet'), os.path.join(self.work_dir, name + '.feather')]
+        return paths
+
+    def read_nodes(self, table):
+        return tmm_backends.read_policy_table(table, 'NODE_ID', TMM.node_fields)
+
+    def test_get_backend(self):
+        self.assertIsInstance(tmm_backends.get_backend(os.path.join(self.work_dir, 'TMM_GIS.gdb', 'extra_attr_nodes')), tmm_backends.GDBBackend)
+        self.assertIsInstance(tmm_backends.get_backend(os.path.join(self.work_dir, 'TMM_GIS.gpkg', 'extra_attr_nodes')), tmm_backends.SQLiteBackend)
+        self.assertIsInstance(tmm_backends.get_backend(os.path.join(self.work_dir, 'nodes.feather')), tmm_backends.ArrowBackend)
+        with self.assertRaises(ValueError):
+            tmm_backends.get_backend(os.path.join(self.work_dir, 'nodes.xlsx'))
+
+    def test_create_policy_table(self):
+        for table in self.table_paths('extra_attr_nodes'):
+            tmm_backends.create_policy_table(table, 'NODE_ID', node_ids + [10001], TMM.node_fields)
+            self.assertEqual(tmm_backends.get_backend(table).list_fields(table), ['NODE_ID'] + list(TMM.node_fields))
+            policy = self.read_nodes(table)
+            self.assertEqual(policy.ids.tolist(), sorted(node_ids), table)
+            for field in TMM.node_fields:
+                self.assertEqual(policy.columns[field].tolist(), [0] * len(node_ids), table)
+        for table in self.table_paths('extra_attr_tlines'):
+            tmm_backends.create_policy_table(table, 'TLINE_ID', tline_ids, TMM.tline_fields, True)
+            policy = tmm_backends.read_policy_table(table, 'TLINE_ID', TMM.tline_fields, True)
+            self.assertEqual(policy.ids.tolist(), sorted(tline_ids), table)
+
+    def test_apply_policy(self):
+        for table in self.table_paths('extra_attr_nodes'):
+            tmm_backends.create_policy_table(table, 'NODE_ID', node_ids, TMM.node_fields)
+            self.assertEqual(tmm_backends.apply_policy(table, 'NODE_ID', [10002, 10004, 99999], ['ADD_INFO', 'ADD_SHELTER'], [1, 3]), 2, table)
+            self.assertEqual(tmm_backends.apply_policy(table, 'NODE_ID', [10002], ['ADD_INFO', 'ADD_PA'], [0, 1], ignore_zeroes=True), 1, table)
+            policy = self.read_nodes(table)
+            self.assertEqual(policy.columns['ADD_INFO'].tolist(), [0, 1, 0, 1, 0], table)
+            self.assertEqual(policy.columns['ADD_SHELTER'].tolist(), [0, 3, 0, 3, 0], table)
+            self.assertEqual(policy.columns['ADD_PA'].tolist(), [0, 1, 0, 0, 0], table)
+
+    def test_update_policy(self):
+        for table in self.table_paths('extra_attr_tlines'):
+            tmm_backends.create_policy_table(table, 'TLINE_ID', tline_ids, TMM.tline_fields, True)
+            columns = {'ADD_WIFI': np.array([1, 1]), 'IMP_RELIABILITY': np.array([20, 35])}
+            self.assertEqual(tmm_backends.update_policy(table, 'TLINE_ID', ['m000001', 'b000000'], ['ADD_WIFI', 'IMP_RELIABILITY'], columns), 2, table)
+            self.assertEqual(tmm_backends.update_policy(table, 'TLINE_ID', [], ['ADD_WIFI'], {'ADD_WIFI': np.array([])}), 0, table)
+            policy = tmm_backends.read_policy_table(table, 'TLINE_ID', TMM.tline_fields, True)
+            self.assertEqual(policy.ids.tolist(), ['b000000', 'c000002', 'm000001'], table)
+            self.assertEqual(policy.columns['ADD_WIFI'].tolist(), [1, 0, 1], table)
+            self.assertEqual(policy.columns['IMP_RELIABILITY'].tolist(), [35, 0, 20], table)
+
+    def test_write_sparse_policy(self):
+        dense_table = os.path.join(self.work_dir, 'TMM_GIS.sqlite', 'extra_attr_nodes')
+        tmm_backends.create_policy_table(dense_table, 'NODE_ID', node_ids, TMM.node_fields)
+        tmm_backends.apply_policy(dense_table, 'NODE_ID', [10001, 10005], ['ADD_PARKING'], [-10])
+        for table in self.table_paths('sparse_nodes'):
+            tmm_backends.write_sparse_policy(table, 'NODE_ID', self.read_nodes(dense_table))
+            policy = self.read_nodes(table)
+            self.assertEqual(policy.ids.tolist(), [10001, 10005], table)
+            self.assertEqual(policy.columns['ADD_PARKING'].tolist(), [-10, -10], table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+'''
+    test_batch.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_batch.py reads scenario manifests, applies their policy
+    overrides, and builds each scenario as a single build would.
+
+        python -m pytest tests
+
+'''
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_batch
+import tmm_cache
+import tmm_scoring
+import tmm_synthetic
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=4)
+        self.node_policy = tmm_backends.read_policy_table(self.network['node_table'], 'NODE_ID', TMM.node_fields)
+        self.tline_policy = tmm_backends.read_policy_table(self.network['tline_table'], 'TLINE_ID', TMM.tline_fields, True)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write_manifest(self, specs):
+        manifest_path = os.path.join(self.work_dir, 'manifest.json')
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump({'scenarios': specs}, manifest_file)
+        return manifest_path
+
+    def test_manifest_defaults(self):
+        specs = tmm_batch.read_manifest(self.write_manifest([{'name': 'base'}, {'name': 'alt', 'output_dir': self.work_dir}]))
+        self.assertEqual(specs[0]['node_table'], os.path.join(TMM.gdb, 'extra_attr_nodes'))
+        self.assertEqual(specs[0]['tline_table'], os.path.join(TMM.gdb, 'extra_attr_tlines'))
+        self.assertEqual(specs[0]['output_dir'], os.path.join(TMM.output_dir, 'base'))
+        self.assertEqual(specs[1]['output_dir'], self.work_dir)
+
+    def test_manifest_errors(self):
+        with self.assertRaises(ValueError):
+            tmm_batch.read_manifest(self.write_manifest([{'name': 'base'}, {'name': 'base'}]))
+        with self.assertRaises(ValueError):
+            tmm_batch.read_manifest(self.write_manifest([{'name': 'base', 'node_policies': [{'prefix': '1', 'values': {'ADD_INFO': 1}}]}]))
+
+    def test_overrides(self):
+        node_ids = self.node_policy.ids[[3, 7]].tolist()
+        node_policy = tmm_batch.apply_overrides(self.node_policy, [
+            {'values': {'ADD_INFO': 0}},
+            {'ids': node_ids, 'values': {'ADD_INFO': 1, 'ADD_SHELTER': 5}},
+        ])
+        self.assertEqual(np.flatnonzero(node_policy.columns['ADD_INFO']).tolist(), [3, 7])
+        self.assertEqual(node_policy.columns['ADD_SHELTER'][[3, 7]].tolist(), [5, 5])
+        self.assertIs(node_policy.columns['ADD_PARKING'], self.node_policy.columns['ADD_PARKING'])  # Not overridden, so not copied
+        self.assertNotEqual(self.node_policy.columns['ADD_INFO'].tolist(), node_policy.columns['ADD_INFO'].tolist())
+
+        tline_policy = tmm_batch.apply_overrides(self.tline_policy, [{'prefix': 'm', 'values': {'ADD_WIFI': 1}}])
+        is_metra = np.char.startswith(self.tline_policy.ids, 'm')
+        self.assertTrue((tline_policy.columns['ADD_WIFI'][is_metra] == 1).all())
+        self.assertEqual(tline_policy.columns['ADD_WIFI'][~is_metra].tolist(), self.tline_policy.columns['ADD_WIFI'][~is_metra].tolist())
+
+    def test_override_errors(self):
+        with self.assertRaises(ValueError) as context:
+            tmm_batch.apply_overrides(self.node_policy, [{'ids': [self.node_policy.ids[0], 99, 98], 'values': {'ADD_INFO': 1}}])
+        self.assertIn('99, 98', str(context.exception))
+        with self.assertRaises(ValueError):
+            tmm_batch.apply_overrides(self.node_policy, [{'prefix': '1', 'values': {'ADD_INFO': 1}}])
+        with self.assertRaises(ValueError):
+            tmm_batch.apply_overrides(self.node_policy, [{'values': {'ADD_NOTHING': 1}}])
+
+    def test_run_batch(self):
+        specs = tmm_batch.read_manifest(self.write_manifest([
+            {'name': name, 'node_table': self.network['node_table'], 'tline_table': self.network['tline_table'],
+             'output_dir': os.path.join(self.work_dir, name), 'tline_policies': tline_policies}
+            for name, tline_policies in (('base', []), ('wifi', [{'values': {'ADD_WIFI': 1}}]))]))
+        results = tmm_batch.run_batch(specs, self.network['input_dir'], processes=1)
+        self.assertEqual(results, [(spec['name'], spec['output_dir']) for spec in specs])
+
+        baseline = tmm_cache.read_baseline(self.network['input_dir'])
+        wifi_policy = tmm_batch.apply_overrides(self.tline_policy, specs[1]['tline_policies'])
+        for spec, tline_policy in ((specs[0], self.tline_policy), (specs[1], wifi_policy)):
+            reference_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'reference', spec['name']))
+            tmm_scoring.write_scenario(tmm_scoring.score_scenario(baseline, self.node_policy, tline_policy), reference_dir)
+            for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+                with open(os.path.join(reference_dir, filename), 'rb') as reference_csv:
+                    with open(os.path.join(spec['output_dir'], filename), 'rb') as output_csv:
+                        self.assertEqual(reference_csv.read(), output_csv.read(), filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+'''
+    test_cache.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_cache.py serves cached baseline CSVs only while they are
+    still valid, and replaces a cache without disturbing its readers.
+
+        python -m pytest tests
+
+'''
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import tmm_cache
+import tmm_scoring
+import tmm_synthetic
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.input_dir = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=3)['input_dir']
+        self.csv_file = os.path.join(self.input_dir, 'rail_node_extra_attributes.csv')
+        self.table_dir = os.path.join(tmm_cache.default_cache_dir(self.input_dir), 'rail_node_extra_attributes')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def assertSameTable(self, table, other):
+        self.assertEqual(table.fields, other.fields)
+        self.assertEqual(table.ids.tolist(), other.ids.tolist())
+        for field in table.fields:
+            self.assertEqual(table.columns[field].tolist(), other.columns[field].tolist(), field)
+
+    def read_meta(self):
+        with open(os.path.join(self.table_dir, tmm_cache.meta_file_name)) as meta_file:
+            return json.load(meta_file)
+
+    def test_cached_table_matches_csv(self):
+        parsed = tmm_scoring.read_csv_table(self.csv_file)
+        self.assertSameTable(tmm_cache.read_cached_table(self.csv_file), parsed)
+        cached = tmm_cache.read_cached_table(self.csv_file)
+        self.assertIsInstance(cached.ids, np.memmap)
+        self.assertSameTable(cached, parsed)
+
+    def test_touched_csv_keeps_cache(self):
+        tmm_cache.read_cached_table(self.csv_file)
+        sha1 = self.read_meta()['sha1']
+        later = time.time() + 10
+        os.utime(self.csv_file, (later, later))
+        tmm_cache.read_cached_table(self.csv_file)
+        meta = self.read_meta()
+        self.assertEqual(meta['sha1'], sha1)
+        self.assertEqual(meta['mtime'], os.stat(self.csv_file).st_mtime)
+        self.assertEqual([name for name in os.listdir(self.table_dir) if name.endswith('.tmp')], [])
+
+    def test_changed_csv_rebuilds_cache(self):
+        old = tmm_cache.read_cached_table(self.csv_file)
+        with tmm_scoring.open_csv(self.csv_file, 'a') as csv_file:
+            csv_file.write('99999,3,1,250\r\n')
+        new = tmm_cache.read_cached_table(self.csv_file)
+        self.assertEqual(len(new), len(old) + 1)
+        self.assertSameTable(new, tmm_scoring.read_csv_table(self.csv_file))
+        self.assertEqual(old.ids.tolist(), new.ids[:-1].tolist())  # The replaced cache is still readable
+
+    def test_neutral_table_tracks_scoring(self):
+        neutral = tmm_cache.read_neutral_table('rail', self.csv_file)
+        self.assertSameTable(neutral, tmm_scoring.neutral_table('rail', tmm_scoring.read_csv_table(self.csv_file)))
+        neutral_dir = os.path.join(tmm_cache.default_cache_dir(self.input_dir), tmm_cache.neutral_dir_prefix + 'rail_node_extra_attributes')
+        with open(os.path.join(neutral_dir, tmm_cache.meta_file_name)) as meta_file:
+            meta = json.load(meta_file)
+        meta['scoring'] = 'an older tmm_scoring.py'
+        tmm_cache._write_meta(neutral_dir, meta)
+        tmm_cache.read_neutral_table('rail', self.csv_file)
+        with open(os.path.join(neutral_dir, tmm_cache.meta_file_name)) as meta_file:
+            self.assertEqual(json.load(meta_file)['scoring'], tmm_cache.scoring_digest())
+
+    def test_other_process_temp_dir_untouched(self):
+        other_temp_dir = '{0}.{1}.tmp'.format(self.table_dir, os.getpid() + 1)
+        os.makedirs(other_temp_dir)
+        tmm_cache.read_cached_table(self.csv_file)
+        tmm_cache.write_cached_table(self.csv_file, tmm_scoring.read_csv_table(self.csv_file), False, self.table_dir)
+        self.assertTrue(os.path.isdir(other_temp_dir))
+        siblings = os.listdir(os.path.dirname(self.table_dir))
+        self.assertEqual([name for name in siblings if name.endswith('.old')], [])
+
+    def test_edited_output_leaves_store_intact(self):
+        store_dir = os.path.join(self.work_dir, 'store')
+        output_dir = os.path.join(self.work_dir, 'output')
+        os.makedirs(output_dir)
+        tmm_scoring.write_scenario(tmm_cache.read_baseline(self.input_dir), output_dir)
+        tmm_cache.store_scenario(store_dir, 'scenario', output_dir)
+        reused_dir = os.path.join(self.work_dir, 'reused')
+        os.makedirs(reused_dir)
+        reused_csv = tmm_cache.materialize_scenario(store_dir, 'scenario', reused_dir)[0]
+        with open(reused_csv, 'r+b') as csv_file:  # Edited in place, e.g. by Excel
+            csv_file.write(b'EDITED')
+        stored_csv = os.path.join(store_dir, 'scenario', os.path.basename(reused_csv))
+        with open(stored_csv, 'rb') as stored, open(os.path.join(output_dir, os.path.basename(reused_csv)), 'rb') as original:
+            self.assertEqual(stored.read(), original.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+'''
+    test_diff.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_diff.py joins scenario CSVs to the baseline CSVs on their
+    IDs and totals the changes in each attribute by group and TOD.
+
+        python -m pytest tests
+
+'''
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_diff
+import tmm_gdb2csv
+import tmm_scoring
+import tmm_synthetic
+import tmm_tod
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_diff_table(self):
+        baseline = tmm_scoring.table_from_rows(['line', '@easeb', 'note'], [
+            ['c2', '2', 'x'], ['b1', '1', 'y'], ['m3', '3', 'z']], id_is_tline=True)
+        scenario = tmm_scoring.table_from_rows(['line', '@easeb', 'note'], [
+            ['m3', '3.5', 'z'], ['b1', '1.0', 'y'], ['p4', '2', 'w']], id_is_tline=True)
+        ids, changes, added, removed = tmm_diff.diff_table(baseline, scenario)
+        self.assertEqual(ids.tolist(), ['b1', 'm3'])
+        self.assertEqual(sorted(changes), ['@easeb'])  # Text attributes are skipped
+        self.assertEqual(changes['@easeb'].tolist(), [0.0, 0.5])
+        self.assertEqual((added, removed), (1, 1))
+
+    def test_summarize_changes(self):
+        ids = np.array(['b01', 'b02', 'm01', 'm02', 'm03'])
+        changes = np.array([0.0, 1.0, -2.0, 0.5, 0.5])
+        rows = tmm_diff.summarize_changes(changes, tmm_diff.group_labels('easeb', ids, True, prefix_length=2))
+        summary = dict(((row['group_by'], row['group']), row) for row in rows)
+        self.assertEqual([(row['group_by'], row['group']) for row in rows][:3], [('all', 'all'), ('mode', 'b'), ('mode', 'm')])
+        self.assertEqual((summary['all', 'all']['rows'], summary['all', 'all']['changed']), (5, 4))
+        self.assertEqual(summary['all', 'all']['total_change'], 0.0)
+        self.assertEqual((summary['mode', 'm']['min_change'], summary['mode', 'm']['max_change']), (-2.0, 0.5))
+        self.assertEqual(summary['prefix', 'b0']['mean_change'], 0.5)
+
+    def test_diff_scenario(self):
+        network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=9)
+        baseline = tmm_scoring.read_baseline(network['input_dir'])
+        node_policy, tline_policy = tmm_gdb2csv.load_policy_tables(network['node_table'], network['tline_table'])
+        scenario = tmm_scoring.score_scenario(baseline, node_policy, tline_policy)
+        scenario_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'shelters'))
+        tmm_scoring.write_scenario(scenario, scenario_dir)
+        tod_ids = {}
+        for tod in (1, 2):
+            ids = tmm_synthetic.read_tod_ids(network['itinerary_dir'], tod)
+            tod_ids[tod] = (ids['node_ids'], ids['tline_ids'])
+        tmm_tod.write_tod_scenarios(scenario, tod_ids, scenario_dir, threads=1)
+
+        summary = tmm_diff.diff_scenario(baseline, scenario_dir)
+        rows = dict(((row['table'], row['attribute'], row['group_by'], row['group']), row) for row in summary)
+        self.assertEqual(set(row['scenario'] for row in summary), set(['shelters']))
+        bus_changes = scenario['bus'].columns['@bstyp'].astype(float) - baseline['bus'].columns['@bstyp'].astype(float)
+        all_row = rows['bus', '@bstyp', 'all', 'all']
+        self.assertEqual((all_row['rows'], all_row['changed'], all_row['added'], all_row['removed']),
+                         (len(baseline['bus']), int((bus_changes != 0).sum()), 0, 0))
+        self.assertAlmostEqual(all_row['total_change'], bus_changes.sum(), places=4)
+        self.assertEqual(rows['easeb', '@easeb', 'tod', '1']['rows'], len(tod_ids[1][1]))
+        self.assertNotIn(('easeb', '@easeb', 'tod', '3'), rows)
+
+        summary_csv = tmm_diff.write_summary(summary, os.path.join(self.work_dir, 'summary.csv'))
+        with tmm_scoring.open_csv(summary_csv, 'r') as written:
+            written_rows = list(csv.reader(written))
+        self.assertEqual(written_rows[0], list(tmm_diff.summary_fields))
+        self.assertEqual(len(written_rows) - 1, len(summary))
+
+
+if __name__ == '__main__':
+    unittest.main()
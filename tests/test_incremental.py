@@ -0,0 +1,101 @@
+'''
+    test_incremental.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_incremental.py patches a previous build's outputs into
+    exactly the CSVs of a full build, re-scoring only the changed rows.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_cache
+import tmm_gdb2csv
+import tmm_incremental
+import tmm_scoring
+import tmm_synthetic
+
+test_scale = 0.05  # Multiple of CMAP's network size
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=2)
+        self.input_dir = self.network['input_dir']
+        self.output_dir = os.path.join(self.work_dir, 'output')
+        self.build()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def build(self, full_build=False):
+        return tmm_gdb2csv.build_outputs(self.input_dir, self.output_dir, self.network['node_table'],
+                                         self.network['tline_table'], full_build=full_build, store_dir=False)
+
+    def assertMatchesFullBuild(self):
+        node_policy, tline_policy = tmm_gdb2csv.load_policy_tables(self.network['node_table'], self.network['tline_table'])
+        scenario = tmm_scoring.score_scenario(tmm_cache.read_baseline(self.input_dir), node_policy, tline_policy)
+        reference_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'reference'))
+        tmm_scoring.write_scenario(scenario, reference_dir)
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            with open(os.path.join(reference_dir, filename), 'rb') as reference_csv:
+                with open(os.path.join(self.output_dir, filename), 'rb') as output_csv:
+                    self.assertEqual(reference_csv.read(), output_csv.read(), filename)
+
+    def node_ids(self):
+        return tmm_backends.read_policy_table(self.network['node_table'], 'NODE_ID', TMM.node_fields).ids
+
+    def test_changed_ids(self):
+        policy = tmm_backends.read_policy_table(self.network['node_table'], 'NODE_ID', TMM.node_fields)
+        hashes = tmm_incremental.row_hashes(policy, policy.fields)
+        changed = policy.take(np.arange(1, len(policy)))  # First ID removed
+        changed.columns['ADD_INFO'] = changed.columns['ADD_INFO'].copy()
+        changed.columns['ADD_INFO'][[0, 5]] += 1
+        expected = [policy.ids[0], policy.ids[1], policy.ids[6]]
+        self.assertEqual(tmm_incremental.changed_ids(policy.ids, hashes, changed, policy.fields).tolist(), expected)
+
+    def test_patch_changed_rows(self):
+        node_ids = self.node_ids()
+        tmm_backends.apply_policy(self.network['node_table'], 'NODE_ID', node_ids[:10].tolist(), ['ADD_SHELTER'], [4])
+        mtimes = dict((filename, os.path.getmtime(os.path.join(self.output_dir, filename)))
+                      for key, filename, id_is_tline in tmm_scoring.baseline_csvs)
+        self.assertEqual(self.build(), (10, 0))
+        self.assertMatchesFullBuild()
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            rewritten = os.path.getmtime(os.path.join(self.output_dir, filename)) != mtimes[filename]
+            self.assertEqual(rewritten, not id_is_tline, filename)
+        self.assertEqual(self.build(), (0, 0))
+
+    def test_patch_removed_policy_rows(self):
+        # Rows dropped from the policy table revert to their baseline values
+        policy = tmm_backends.read_policy_table(self.network['node_table'], 'NODE_ID', TMM.node_fields)
+        keep = np.arange(len(policy)) % 5 != 0
+        columns = dict((field, policy.columns[field][keep]) for field in policy.fields)
+        columns['NODE_ID'] = policy.ids[keep]
+        tmm_backends.write_table(self.network['node_table'], ['NODE_ID'] + policy.fields, columns)
+        self.assertEqual(self.build(), ((~keep).sum(), 0))
+        self.assertMatchesFullBuild()
+
+    def test_edited_outputs_need_full_build(self):
+        bus_csv = os.path.join(self.output_dir, 'bus_node_extra_attributes.csv')
+        with open(bus_csv, 'a') as bus_file:
+            bus_file.write('99999,1,0\r\n')
+        tmm_backends.apply_policy(self.network['node_table'], 'NODE_ID', self.node_ids()[:3].tolist(), ['ADD_INFO'], [1])
+        self.assertIsNone(self.build())
+        self.assertMatchesFullBuild()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+'''
+    test_instrument.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_instrument.py records each stage of a run, including
+    failed and concurrent stages, and writes its report & profile.
+
+        python -m pytest tests
+
+'''
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import tmm_instrument
+import tmm_scoring
+
+
+def busy_wait(seconds):
+    ''' Use the CPU for the specified wall time. '''
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class InstrumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_stages(self):
+        report = tmm_instrument.RunReport('test')
+        with report.stage('read', rows_in=10) as stage:
+            stage['rows_modified'] = np.int64(3)
+        with self.assertRaises(KeyError):
+            with tmm_instrument.stage(report, 'fail'):
+                raise KeyError('missing')
+        with tmm_instrument.stage(None, 'unrecorded', rows_in=5) as stage:
+            self.assertEqual(stage['rows_in'], 5)
+
+        self.assertEqual([stage['stage'] for stage in report.stages], ['read', 'fail'])
+        read, fail = report.stages
+        self.assertEqual((read['rows_in'], read['rows_modified']), (10, 3))
+        self.assertNotIn('failed', read)
+        self.assertTrue(fail['failed'])
+        for stage in report.stages:
+            self.assertGreaterEqual(stage['wall_seconds'], 0)
+            self.assertGreaterEqual(stage['cpu_seconds'], 0)
+            self.assertEqual(stage['cpu_scope'], tmm_instrument.cpu_scope)
+
+        with open(report.write(self.work_dir)) as report_file:
+            written = json.load(report_file)
+        self.assertEqual(written['script'], 'test')
+        self.assertEqual(written['stages'][0]['rows_modified'], 3)
+        self.assertEqual(os.listdir(self.work_dir), ['test_report.json'])
+
+    @unittest.skipUnless(tmm_instrument.cpu_scope == 'thread', 'stage CPU time is per process')
+    def test_concurrent_stage_cpu_time(self):
+        # A stage run in a thread doesn't count the work of the main thread
+        report = tmm_instrument.RunReport('test')
+
+        def idle_stage():
+            with report.stage('idle'):
+                time.sleep(0.3)
+
+        thread = threading.Thread(target=idle_stage)
+        thread.start()
+        busy_wait(0.3)
+        thread.join()
+        self.assertLess(report.stages[0]['cpu_seconds'], 0.1)
+
+    def test_changed_rows(self):
+        table = tmm_scoring.table_from_rows(['inode', '@bstyp'], [['1', '3'], ['2', '4'], ['3', '5']])
+        adjusted = table.copy()
+        adjusted.columns['@bstyp'] = np.array(['3', '4.5', '5.0'], dtype='U')
+        self.assertEqual(tmm_instrument.changed_rows(table, adjusted), 2)
+        self.assertEqual(tmm_instrument.changed_rows(table, table), 0)
+
+    def test_profile(self):
+        report = tmm_instrument.RunReport('test', profiler='cprofile')
+        with report.stage('work'):
+            busy_wait(0.01)
+        report.write(self.work_dir)
+        self.assertEqual(sorted(os.listdir(self.work_dir)), ['test_report.json', 'test_report.prof'])
+        with self.assertRaises(ValueError):
+            tmm_instrument.RunReport('test', profiler='gprof')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+'''
+    test_itinerary.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that the CSR arrays of tmm_itinerary.py index each tline's stops,
+    and the tlines serving each node, exactly as the tsegs list them.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_itinerary
+import tmm_synthetic
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+def tod_ids(tsegs, tline_ids=None):
+    ''' Return a TOD's ID lists (as tmm_shp2gdb.read_tod_ids() reads them)
+        from a list of (LINE_ID, INODE, JNODE) tsegs. '''
+    return {
+        'tline_ids': tline_ids or sorted(set(line_id for line_id, inode, jnode in tsegs)),
+        'tseg_line_ids': [line_id for line_id, inode, jnode in tsegs],
+        'tseg_inodes': [inode for line_id, inode, jnode in tsegs],
+        'tseg_jnodes': [jnode for line_id, inode, jnode in tsegs],
+    }
+
+
+class ItineraryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        # Tsegs of different tlines interleaved, one tline with a missing node
+        # & one running in TOD 2 only
+        self.index = tmm_itinerary.ItineraryIndex.from_tod_ids({
+            1: tod_ids([('bX9', 1.0, 2.0), ('cB', 5.0, 6.0), ('bX9', 2.0, 3.0), ('cB', 6.0, float('nan'))], ['bX9', 'bX9a', 'cB']),
+            2: tod_ids([('bX9a', 3.0, 2.0), ('m1', 7.0, 3.0)]),
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_stops(self):
+        self.assertEqual(self.index.stops('bX9', 1).tolist(), [1, 2, 3])
+        self.assertEqual(self.index.stops('cB', 1).tolist(), [5, 6])
+        self.assertEqual(self.index.stops('bX9a', 1).tolist(), [])
+        self.assertEqual(self.index.stops('bX9a', 2).tolist(), [3, 2])
+        self.assertEqual(self.index.stops('bX9', 3).tolist(), [])
+        self.assertEqual(self.index.stops('p2', 1).tolist(), [])
+
+    def test_serving_tlines(self):
+        self.assertEqual(self.index.serving_tlines(3).tolist(), ['bX9', 'bX9a', 'm1'])
+        self.assertEqual(self.index.serving_tlines(3, tod=1).tolist(), ['bX9'])
+        self.assertEqual(self.index.serving_tlines(99).tolist(), [])
+
+    def test_route_stops(self):
+        tline_ids = self.index.match_tlines(['bX9*'])
+        self.assertEqual(tline_ids, ['bX9', 'bX9a'])
+        self.assertEqual(self.index.route_stops(tline_ids).tolist(), [1, 2, 3])
+        self.assertEqual(self.index.route_stops(['m1', 'cB'], tod=2).tolist(), [3, 7])
+
+    def test_synthetic_network(self):
+        network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=11)
+        tods = dict((tod, tmm_synthetic.read_tod_ids(network['itinerary_dir'], tod)) for tod in tmm_synthetic.tod_periods)
+        index = tmm_itinerary.ItineraryIndex.from_tod_ids(tods)
+        index = tmm_itinerary.ItineraryIndex.load(index.save(os.path.join(self.work_dir, tmm_itinerary.index_file_name)))
+        for tod, ids in tods.items():
+            stops = {}
+            last_stops = {}
+            serving = {}
+            for line_id, inode, jnode in zip(ids['tseg_line_ids'], ids['tseg_inodes'], ids['tseg_jnodes']):
+                stops.setdefault(line_id, []).append(int(inode))
+                last_stops[line_id] = int(jnode)
+            for line_id in ids['tline_ids']:
+                itinerary = stops[line_id] + [last_stops[line_id]]
+                self.assertEqual(index.stops(line_id, tod).tolist(), itinerary)
+                for node_id in itinerary:
+                    serving.setdefault(node_id, set()).add(line_id)
+            for node_id, line_ids in serving.items():
+                self.assertEqual(index.serving_tlines(node_id, tod).tolist(), sorted(line_ids))
+
+    def test_apply_route_stops_policy(self):
+        table = os.path.join(self.work_dir, 'TMM_GIS.sqlite', 'extra_attr_nodes')
+        tmm_backends.create_policy_table(table, 'NODE_ID', range(1, 10), TMM.node_fields)
+        self.assertEqual(tmm_itinerary.apply_route_stops_policy(self.index, ['bX9*'], {'ADD_SHELTER': 3}, table, tod=1), (3, 3))
+        policy = tmm_backends.read_policy_table(table, 'NODE_ID', TMM.node_fields)
+        self.assertEqual(policy.ids[policy.columns['ADD_SHELTER'] == 3].tolist(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            tmm_itinerary.apply_route_stops_policy(self.index, ['z*'], {'ADD_SHELTER': 3}, table)
+        with self.assertRaises(ValueError):
+            tmm_itinerary.apply_route_stops_policy(self.index, ['bX9'], {'ADD_WIFI': 1}, table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+'''
+    test_scoring.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that the vectorized formulas in tmm_scoring.py produce exactly the
+    batchin CSVs of the original per-row formulas (reproduced below from the
+    original tmm_gdb2csv.py), on a small synthetic network (tmm_synthetic.py),
+    whether a scenario is scored in full, as a sparse overlay or reused from
+    the scenario store.
+
+        python -m pytest tests
+
+'''
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_gdb2csv
+import tmm_instrument
+import tmm_scoring
+import tmm_synthetic
+
+test_scale = 0.05  # Multiple of CMAP's network size
+
+
+# -----------------------------------------------------------------------------
+#  Original per-row formulas.
+# -----------------------------------------------------------------------------
+def adjust_easeb_value(tline_id, tline_dict, csv_dict):
+    current_easeb_value = float(csv_dict[tline_id]['@easeb'])
+    max_easeb_value = 4.0
+    if tline_id in tline_dict and current_easeb_value < max_easeb_value:
+        field_fw = (('ADD_STAND_CAP', 1.0/5, 1.0), ('LOWER_FLOOR', 1.0/3, 1.0), ('NEW_VEHICLES', 1.0/5, 1.0))
+        improvement = sum([float(tline_dict[tline_id][attr]) * f * w for attr, f, w in field_fw])
+        pct_improvement = improvement / sum([w for attr, f, w in field_fw])
+        adjustment = (max_easeb_value - current_easeb_value) * pct_improvement
+        csv_dict[tline_id]['@easeb'] = str(round(current_easeb_value + adjustment, 2))
+
+
+def adjust_info_value(node_id, node_dict, csv_dict, info_field):
+    current_info_value = csv_dict[node_id][info_field]
+    if node_id in node_dict and current_info_value != '2':
+        if node_dict[node_id]['ADD_INFO'] + node_dict[node_id]['ADD_PA'] > 0:
+            csv_dict[node_id][info_field] = '2'
+
+
+def adjust_prof_values(tline_id, tline_dict, csv_dict):
+    if tline_id in tline_dict:
+        wifi_bonus = int(tline_dict[tline_id]['ADD_WIFI']) * (1.0/1) * 0.05
+        seat_bonus = int(tline_dict[tline_id]['IMP_SEATS']) * (1.0/5) * 0.05
+        productivity_bonus = wifi_bonus + seat_bonus
+        for prof_field in ('@prof1', '@prof2', '@prof3'):
+            csv_dict[tline_id][prof_field] = str(round(float(csv_dict[tline_id][prof_field]) - productivity_bonus, 2))
+
+
+def adjust_relim_value(tline_id, tline_dict, csv_dict):
+    current_relim_value = float(csv_dict[tline_id]['@relim'])
+    if tline_id in tline_dict:
+        imp_rel_pct = tline_dict[tline_id]['IMP_RELIABILITY'] / 100.0
+        csv_dict[tline_id]['@relim'] = round(current_relim_value * (1.0 - imp_rel_pct), 2)
+
+
+def adjust_rspac_value(node_id, node_dict, csv_dict):
+    current_rspac_value = int(csv_dict[node_id]['@rspac'])
+    if node_id in node_dict:
+        csv_dict[node_id]['@rspac'] = max(current_rspac_value + node_dict[node_id]['ADD_PARKING'], 0)
+
+
+def adjust_type_value(node_id, node_dict, csv_dict, type_field):
+    current_type_value = float(csv_dict[node_id][type_field])
+    max_type_value = 6.0
+    if node_id in node_dict and current_type_value < max_type_value:
+        improvement = sum([float(node_dict[node_id][attr]) * f * w for attr, f, w in tmm_scoring.type_fwv])
+        pct_improvement = improvement / sum([w for attr, f, w in tmm_scoring.type_fwv])
+        adjustment = (max_type_value - current_type_value) * pct_improvement
+        csv_dict[node_id][type_field] = str(round(current_type_value + adjustment, 2))
+
+
+def write_reference_scenario(input_dir, output_dir, node_dict, tline_dict):
+    ''' Build a scenario's batchin CSVs with the original per-row formulas. '''
+    adjusters = {
+        'bus': lambda row_id, csv_dict: (
+            adjust_type_value(row_id, node_dict, csv_dict, '@bstyp'),
+            adjust_info_value(row_id, node_dict, csv_dict, '@bsinf')),
+        'rail': lambda row_id, csv_dict: (
+            adjust_type_value(row_id, node_dict, csv_dict, '@rstyp'),
+            adjust_info_value(row_id, node_dict, csv_dict, '@rsinf'),
+            adjust_rspac_value(row_id, node_dict, csv_dict)),
+        'easeb': lambda row_id, csv_dict: adjust_easeb_value(row_id, tline_dict, csv_dict),
+        'prof': lambda row_id, csv_dict: adjust_prof_values(row_id, tline_dict, csv_dict),
+        'relim': lambda row_id, csv_dict: adjust_relim_value(row_id, tline_dict, csv_dict),
+    }
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        csv_dict = {}
+        with tmm_scoring.open_csv(os.path.join(input_dir, filename), 'r') as attr_csv:
+            dict_reader = csv.DictReader(attr_csv)
+            csv_fields = dict_reader.fieldnames
+            for row_dict in dict_reader:
+                row_id = row_dict[csv_fields[0]]
+                csv_dict[row_id if id_is_tline else int(row_id)] = row_dict
+        for row_id in list(csv_dict):
+            adjusters[key](row_id, csv_dict)
+        with tmm_scoring.open_csv(os.path.join(output_dir, filename), 'w') as attr_csv:
+            dict_writer = csv.DictWriter(attr_csv, csv_fields)
+            dict_writer.writeheader()
+            for row_id in sorted(csv_dict):
+                dict_writer.writerow(csv_dict[row_id])
+
+
+def policy_dict(policy):
+    ''' Convert a policy AttrTable into a dictionary of rows keyed by ID, as
+        the original TMM.make_attribute_dict() returned it. '''
+    rows = {}
+    for i, row_id in enumerate(policy.ids.tolist()):
+        rows[row_id] = dict((field, int(policy.columns[field][i])) for field in policy.fields)
+    return rows
+
+
+# -----------------------------------------------------------------------------
+#  Tests.
+# -----------------------------------------------------------------------------
+class ScoringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=1)
+        self.input_dir = self.network['input_dir']
+        self.node_policy, self.tline_policy = tmm_gdb2csv.load_policy_tables(
+            self.network['node_table'], self.network['tline_table'])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def assertSameOutputs(self, reference_dir, output_dir):
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            with open(os.path.join(reference_dir, filename), 'rb') as reference_csv:
+                with open(os.path.join(output_dir, filename), 'rb') as output_csv:
+                    self.assertEqual(reference_csv.read(), output_csv.read(), filename)
+
+    def reference(self, node_policy, tline_policy):
+        reference_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'reference'))
+        write_reference_scenario(self.input_dir, reference_dir, policy_dict(node_policy), policy_dict(tline_policy))
+        return reference_dir
+
+    def test_format_rounded(self):
+        # Ties & values whose binary representation falls just below a tie,
+        # which np.round() would round differently (e.g. 2.675 -> 2.68)
+        values = np.array([2.675, -2.675, 1.005, 0.125, 0.375, -0.125, 0.785, -0.001, 4.999, 3.0])
+        expected = ['2.67', '-2.67', '1.0', '0.12', '0.38', '-0.12', '0.79', '-0.0', '5.0', '3.0']
+        self.assertEqual(tmm_scoring.format_rounded(values).tolist(), expected)
+        self.assertEqual(tmm_scoring.format_rounded(values, repr).tolist(), [repr(round(value, 2)) for value in values.tolist()])
+
+    def test_full_build(self):
+        reference_dir = self.reference(self.node_policy, self.tline_policy)
+        baseline = tmm_scoring.read_baseline(self.input_dir)
+        scenario = tmm_scoring.score_scenario(baseline, self.node_policy, self.tline_policy)
+        tmm_scoring.write_scenario(scenario, TMM.ensure_dir(os.path.join(self.work_dir, 'full')))
+        self.assertSameOutputs(reference_dir, os.path.join(self.work_dir, 'full'))
+
+    def test_partial_policy_tables(self):
+        # Nodes & tlines missing from the policy tables keep their values, and
+        # parking removed beyond a station's spaces leaves none
+        node_policy = self.node_policy.take(np.arange(0, len(self.node_policy), 2))
+        node_policy.columns['ADD_PARKING'] = node_policy.columns['ADD_PARKING'].copy()
+        node_policy.columns['ADD_PARKING'][::5] = -500
+        tline_policy = self.tline_policy.take(np.arange(0, len(self.tline_policy), 3))
+        reference_dir = self.reference(node_policy, tline_policy)
+        scenario = tmm_scoring.score_scenario(tmm_scoring.read_baseline(self.input_dir), node_policy, tline_policy)
+        tmm_scoring.write_scenario(scenario, TMM.ensure_dir(os.path.join(self.work_dir, 'partial')))
+        self.assertSameOutputs(reference_dir, os.path.join(self.work_dir, 'partial'))
+
+    def test_overlay_builds(self):
+        reference_dir = self.reference(self.node_policy, self.tline_policy)
+
+        # Policy tables covering every node & tline, scored as an overlay
+        output_dir = os.path.join(self.work_dir, 'overlay')
+        tmm_gdb2csv.build_outputs(self.input_dir, output_dir, self.network['node_table'], self.network['tline_table'],
+                                  full_build=True, store_dir=False)
+        self.assertSameOutputs(reference_dir, output_dir)
+
+    def test_sparse_build(self):
+        # Sparse policy tables, holding only the rows with a policy set: every
+        # other row keeps its baseline text (e.g. '3', not '3.0'), as in a
+        # dense build from the same tables
+        sparse_db = os.path.join(self.work_dir, 'sparse.sqlite')
+        node_table = tmm_backends.write_sparse_policy(os.path.join(sparse_db, 'extra_attr_nodes'), 'NODE_ID', self.node_policy)
+        tline_table = tmm_backends.write_sparse_policy(os.path.join(sparse_db, 'extra_attr_tlines'), 'TLINE_ID', self.tline_policy, True)
+        node_overlay, tline_overlay = tmm_scoring.policy_overlay(self.node_policy), tmm_scoring.policy_overlay(self.tline_policy)
+        reference_dir = self.reference(node_overlay, tline_overlay)
+        dense_dir = os.path.join(self.work_dir, 'dense')
+        tmm_gdb2csv.build_outputs(self.input_dir, dense_dir, node_table, tline_table, full_build=True, store_dir=False)
+        self.assertSameOutputs(reference_dir, dense_dir)
+        sparse_dir = os.path.join(self.work_dir, 'sparse')
+        tmm_gdb2csv.build_outputs(self.input_dir, sparse_dir, node_table, tline_table, full_build=True, store_dir=False, sparse=True)
+        self.assertSameOutputs(reference_dir, sparse_dir)
+
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            overlay_ids = set((tline_overlay if id_is_tline else node_overlay).ids.tolist())
+            with open(os.path.join(self.input_dir, filename), 'rb') as baseline_csv:
+                baseline_lines = baseline_csv.read().splitlines()
+            with open(os.path.join(sparse_dir, filename), 'rb') as sparse_csv:
+                sparse_lines = sparse_csv.read().splitlines()
+            kept = [line for line in baseline_lines[1:] if (line.split(b',')[0].decode() if id_is_tline else int(line.split(b',')[0])) not in overlay_ids]
+            self.assertTrue(kept)
+            self.assertTrue(set(kept) <= set(sparse_lines), filename)
+
+    def test_stored_scenario(self):
+        reference_dir = self.reference(self.node_policy, self.tline_policy)
+        store_dir = os.path.join(self.work_dir, 'store')
+        for name in ('stored', 'reused'):
+            report = tmm_instrument.RunReport('test_scoring')
+            output_dir = os.path.join(self.work_dir, name)
+            tmm_gdb2csv.build_outputs(self.input_dir, output_dir, self.network['node_table'], self.network['tline_table'],
+                                      report=report, store_dir=store_dir)
+            self.assertSameOutputs(reference_dir, output_dir)
+        self.assertIn('reuse stored scenario', [stage['stage'] for stage in report.stages])
+
+
+if __name__ == '__main__':
+    unittest.main()
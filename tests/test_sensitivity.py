@@ -0,0 +1,97 @@
+'''
+    test_sensitivity.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_sensitivity.py draws valid parameter sets and sweeps a
+    scenario to the scores of tmm_scoring.py under each of them.
+
+        python -m pytest tests
+
+'''
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import tmm_cache
+import tmm_gdb2csv
+import tmm_scoring
+import tmm_sensitivity
+import tmm_synthetic
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+class SensitivityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=6)
+        self.baseline = tmm_cache.read_baseline(network['input_dir'])
+        self.node_policy, self.tline_policy = tmm_gdb2csv.load_policy_tables(network['node_table'], network['tline_table'])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_default_parameters(self):
+        # With no parameters varied, every draw scores as tmm_scoring.py does
+        drawn = tmm_sensitivity.draw_parameters({}, 3)
+        sweeps = tmm_sensitivity.sweep_scenario(self.baseline, self.node_policy, self.tline_policy, drawn)
+        scenario = tmm_scoring.score_scenario(self.baseline, self.node_policy, self.tline_policy)
+        for key, (ids, stats) in sweeps.items():
+            self.assertEqual(ids.tolist(), scenario[key].ids.tolist())
+            for attribute, attribute_stats in stats.items():
+                np.testing.assert_allclose(attribute_stats['min'], attribute_stats['max'])
+                np.testing.assert_allclose(attribute_stats['mean'], scenario[key].columns[attribute].astype(float), atol=0.005 + 1e-9)
+
+    def test_draws(self):
+        parameters = {
+            'type_fwv.ADD_SHELTER.w': {'uniform': [0.5, 1.5]},
+            'easeb_fwv.LOWER_FLOOR.f': {'triangular': [0.1, 0.2, 0.5]},
+            'max_type_value': 6.5,
+        }
+        drawn = tmm_sensitivity.draw_parameters(parameters, 50, seed=1)
+        self.assertEqual(drawn['type_fwv'].shape, (len(tmm_scoring.type_fwv), 50))
+        self.assertTrue((drawn['max_type_value'] == 6.5).all())
+        self.assertTrue((drawn['max_easeb_value'] == tmm_scoring.max_easeb_value).all())
+        np.testing.assert_array_equal(drawn['type_fwv'], tmm_sensitivity.draw_parameters(parameters, 50, seed=1)['type_fwv'])
+
+    def test_invalid_parameters(self):
+        invalid = (
+            {'max_walk_value': 1},
+            {'max_type_value': {'lognormal': [0, 1]}},
+            {'max_type_value': {'uniform': [6.5]}},
+            {'max_type_value': {'uniform': [6.5, 5.5]}},
+            {'max_type_value': {'normal': [6, -1]}},
+            {'easeb_fwv.LOWER_FLOOR.f': {'triangular': [0.1, 0.6, 0.5]}},
+        )
+        for parameters in invalid:
+            with self.assertRaises(ValueError):
+                tmm_sensitivity.draw_parameters(parameters, 10, seed=1)
+
+    def test_zero_weight_sum(self):
+        parameters = dict(('prof_fwv.{0}.w'.format(field), {'uniform': [0, 0]}) for field, f, w in tmm_scoring.prof_fwv)
+        with self.assertRaises(ValueError) as context:
+            tmm_sensitivity.draw_parameters(parameters, 10, seed=1)
+        self.assertIn('prof_fwv', str(context.exception))
+
+    def test_write_sensitivity(self):
+        drawn = tmm_sensitivity.draw_parameters({'type_fwv.ADD_SHELTER.w': {'normal': [1.0, 0.2]}}, 20, seed=2)
+        sweeps = tmm_sensitivity.sweep_scenario(self.baseline, self.node_policy, self.tline_policy, drawn)
+        csv_files = tmm_sensitivity.write_sensitivity(sweeps, self.baseline, self.work_dir)
+        self.assertEqual([os.path.basename(csv_file) for csv_file in csv_files],
+                         ['sensitivity_' + filename for key, filename, id_is_tline in tmm_scoring.baseline_csvs if key in sweeps])
+        with tmm_scoring.open_csv(csv_files[0], 'r') as sensitivity_csv:
+            rows = list(csv.reader(sensitivity_csv))
+        self.assertEqual(rows[0], [self.baseline['bus'].fields[0]] + ['@bstyp_' + stat_name for stat_name in tmm_sensitivity.stat_names])
+        self.assertEqual(len(rows) - 1, len(self.baseline['bus']))
+        self.assertFalse(any('nan' in value for row in rows for value in row))
+
+
+if __name__ == '__main__':
+    unittest.main()
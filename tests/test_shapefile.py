@@ -0,0 +1,184 @@
+'''
+    test_shapefile.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_shapefile.py reads the DBF columns & shapes of small
+    shapefiles written below, and builds the policy tables & indexes of a
+    network of them as tmm_shp2gdb.py would.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_itinerary
+import tmm_shapefile
+import tmm_spatial
+
+
+# -----------------------------------------------------------------------------
+#  Shapefile writers.
+# -----------------------------------------------------------------------------
+def write_dbf(dbf_path, fields, rows, deleted=(), encoding='latin-1'):
+    ''' Write a dBASE III table. fields is a list of (name, type, length,
+        decimals); rows is a list of lists of values (None for a blank). '''
+    header_length = 32 + 32 * len(fields) + 1
+    record_length = 1 + sum(length for name, field_type, length, decimals in fields)
+    with open(dbf_path, 'wb') as dbf_file:
+        dbf_file.write(struct.pack('<B3BIHH20x', 3, 126, 10, 17, len(rows), header_length, record_length))
+        for name, field_type, length, decimals in fields:
+            dbf_file.write(struct.pack('<11sc4xBB14x', name.encode('ascii'), field_type.encode('ascii'), length, decimals))
+        dbf_file.write(b'\x0D')
+        for i, row in enumerate(rows):
+            dbf_file.write(b'*' if i in deleted else b' ')
+            for (name, field_type, length, decimals), value in zip(fields, row):
+                if value is None:
+                    text = ''
+                elif field_type in ('N', 'F'):
+                    text = '{0:.{1}f}'.format(value, decimals).rjust(length)
+                else:
+                    text = u'{0}'.format(value)
+                dbf_file.write(text.encode(encoding).ljust(length, b' ')[:length])
+        dbf_file.write(b'\x1A')
+    return dbf_path
+
+
+def write_shapefile(shp_path, shape_type, shapes, fields, rows, deleted=()):
+    ''' Write a point (1) or polyline (3) shapefile, with its .shx & .dbf.
+        Each shape is an (x, y) tuple, a list of parts (lists of (x, y)), or
+        None for a null shape. '''
+    contents = []
+    for shape in shapes:
+        if shape is None:
+            contents.append(struct.pack('<i', 0))
+        elif shape_type == 1:
+            contents.append(struct.pack('<idd', 1, shape[0], shape[1]))
+        else:
+            points = [point for part in shape for point in part]
+            xs = [x for x, y in points]
+            ys = [y for x, y in points]
+            part_starts = np.cumsum([0] + [len(part) for part in shape[:-1]]).tolist()
+            contents.append(
+                struct.pack('<i4dii', 3, min(xs), min(ys), max(xs), max(ys), len(shape), len(points)) +
+                struct.pack('<{0}i'.format(len(shape)), *part_starts) +
+                struct.pack('<{0}d'.format(2 * len(points)), *[value for point in points for value in point]))
+
+    def header(file_bytes):
+        return struct.pack('>i20xi', 9994, file_bytes // 2) + struct.pack('<ii4d32x', 1000, shape_type, 0, 0, 0, 0)
+
+    records = b''
+    index = b''
+    for number, content in enumerate(contents):
+        index += struct.pack('>ii', (100 + len(records)) // 2, len(content) // 2)
+        records += struct.pack('>ii', number + 1, len(content) // 2) + content
+    base_path = os.path.splitext(shp_path)[0]
+    with open(shp_path, 'wb') as shp_file:
+        shp_file.write(header(100 + len(records)) + records)
+    with open(base_path + '.shx', 'wb') as shx_file:
+        shx_file.write(header(100 + len(index)) + index)
+    write_dbf(base_path + '.dbf', fields, rows, deleted)
+    return shp_path
+
+
+def write_tod(tod_dir, nodes, tlines):
+    ''' Write a TOD's Emme shapefiles, from a dictionary of node ID: (x, y)
+        and a dictionary of tline ID: itinerary (a list of node IDs). '''
+    os.makedirs(tod_dir)
+    node_ids = sorted(nodes)
+    write_shapefile(os.path.join(tod_dir, 'emme_nodes.shp'), 1, [nodes[node_id] for node_id in node_ids],
+                    [('ID', 'N', 10, 1)], [[float(node_id)] for node_id in node_ids])
+    tline_ids = sorted(tlines)
+    write_shapefile(os.path.join(tod_dir, 'emme_tlines.shp'), 3, [[[nodes[node_id] for node_id in tlines[tline_id]]] for tline_id in tline_ids],
+                    [('ID', 'C', 20, 0)], [[tline_id] for tline_id in tline_ids])
+    tsegs = [(tline_id, inode, jnode) for tline_id in tline_ids for inode, jnode in zip(tlines[tline_id][:-1], tlines[tline_id][1:])]
+    write_shapefile(os.path.join(tod_dir, 'emme_tsegs.shp'), 3, [[[nodes[inode], nodes[jnode]]] for tline_id, inode, jnode in tsegs],
+                    [('LINE_ID', 'C', 20, 0), ('INODE', 'N', 10, 0), ('JNODE', 'N', 10, 0)], [list(tseg) for tseg in tsegs])
+
+
+# -----------------------------------------------------------------------------
+#  Tests.
+# -----------------------------------------------------------------------------
+class ShapefileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_dbf_columns(self):
+        fields = [('ID', 'N', 8, 0), ('SPEED', 'N', 8, 2), ('NAME', 'C', 12, 0), ('RAIL', 'L', 1, 0), ('STOPS', 'N', 5, 0)]
+        rows = [[1, 25.5, u'Ashland', 'T', 40], [2, None, u'Caf\xe9', 'F', None], [3, 0.25, u'', 'y', 7]]
+        dbf = tmm_shapefile.DBFTable(write_dbf(os.path.join(self.work_dir, 'lines.dbf'), fields, rows, deleted=[1]))
+        self.assertEqual(len(dbf), 3)
+        self.assertEqual(dbf.fields, ['ID', 'SPEED', 'NAME', 'RAIL', 'STOPS'])
+        self.assertEqual(dbf.deleted.tolist(), [False, True, False])
+        columns = dbf.columns(dbf.fields)
+        self.assertEqual(columns['ID'].dtype.kind, 'i')
+        self.assertEqual(columns['ID'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['SPEED'][[0, 2]].tolist(), [25.5, 0.25])
+        self.assertTrue(np.isnan(columns['SPEED'][1]))
+        self.assertEqual(columns['NAME'].tolist(), [u'Ashland', u'Caf\xe9', u''])
+        self.assertEqual(columns['RAIL'].tolist(), [True, False, True])
+        self.assertEqual(columns['STOPS'].dtype.kind, 'f')  # Blanks keep a numeric field as floats
+
+    def test_shapes(self):
+        points = write_shapefile(os.path.join(self.work_dir, 'nodes.shp'), 1, [(1.5, 2.5), None, (3.0, -4.0)],
+                                 [('ID', 'N', 10, 0)], [[1], [2], [3]])
+        node_shp = tmm_shapefile.ShapeFile(points)
+        self.assertEqual(len(node_shp), 3)
+        xy = node_shp.point_xy()
+        self.assertEqual(xy[[0, 2]].tolist(), [[1.5, 2.5], [3.0, -4.0]])
+        self.assertTrue(np.isnan(xy[1]).all())
+        self.assertEqual(node_shp.point_xy([2]).tolist(), [[3.0, -4.0]])
+        self.assertEqual(list(node_shp.shapes()), [(1.5, 2.5), None, (3.0, -4.0)])
+
+        parts = [[(0.0, 0.0), (1.0, 1.0)], [(5.0, 5.0), (6.0, 5.0), (7.0, 4.0)]]
+        lines = write_shapefile(os.path.join(self.work_dir, 'lines.shp'), 3, [parts, None],
+                                [('ID', 'C', 8, 0)], [['a'], ['b']])
+        line_shp = tmm_shapefile.ShapeFile(lines)
+        self.assertEqual(line_shp.shape(0), parts)
+        self.assertIsNone(line_shp.shape(1))
+        self.assertEqual(line_shp.columns(['ID'])['ID'].tolist(), ['a', 'b'])
+        with self.assertRaises(ValueError):
+            line_shp.point_xy()
+
+    def test_ingest_network(self):
+        nodes = dict((node_id, (1170000.0 + 100 * node_id, 1900000.0 + 50 * node_id)) for node_id in range(1, 9))
+        shp_root_dir = os.path.join(self.work_dir, 'shapefiles')
+        for tod in tmm_shapefile.tod_periods:
+            tlines = {'bX9': [1, 2, 3]}
+            if tod == 3:
+                tlines['m1'] = [3, 5, 7]
+            write_tod(os.path.join(shp_root_dir, 'Scenario_10{0}'.format(tod), 'emme'), nodes, tlines)
+        with self.assertRaises(ValueError):
+            tmm_shapefile.find_shapefiles(os.path.join(self.work_dir, 'missing'))
+
+        out_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'output'))
+        paths = tmm_shapefile.ingest_network(shp_root_dir, out_dir)
+        node_policy = tmm_backends.read_policy_table(paths['node_table'], 'NODE_ID', TMM.node_fields)
+        tline_policy = tmm_backends.read_policy_table(paths['tline_table'], 'TLINE_ID', TMM.tline_fields, True)
+        self.assertEqual(node_policy.ids.tolist(), [1, 2, 3, 5, 7])  # Only nodes on a tline's itinerary
+        self.assertEqual(tline_policy.ids.tolist(), ['bX9', 'm1'])
+
+        itineraries = tmm_itinerary.ItineraryIndex.load(paths['itinerary_index'])
+        self.assertEqual(itineraries.stops('m1', 3).tolist(), [3, 5, 7])
+        self.assertEqual(itineraries.serving_tlines(3).tolist(), ['bX9', 'm1'])
+        spatial = tmm_spatial.SpatialIndex.load(paths['spatial_index'])
+        self.assertEqual(sorted(spatial.node_ids.tolist()), [1, 2, 3, 5, 7])
+        self.assertEqual(spatial.nearest_nodes(nodes[5], 1).tolist(), [5])
+        self.assertEqual(spatial.nearest_tlines(nodes[7], 1).tolist(), ['m1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
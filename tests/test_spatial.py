@@ -0,0 +1,113 @@
+'''
+    test_spatial.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that the grid index of tmm_spatial.py selects exactly the nodes &
+    tlines that a brute-force search over every node & segment does.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_spatial
+
+n_nodes = 2000
+n_tlines = 60
+extent = 50000.0  # Feet, as in TMM_NAD27.prj
+
+
+class SpatialTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        rng = np.random.RandomState(10)
+        self.node_ids = 10001 + np.arange(n_nodes, dtype=np.int64)
+        self.node_xy = rng.uniform(0, extent, (n_nodes, 2)) + [1150000, 1850000]
+        self.tline_ids = np.array(['b{0:06d}'.format(i) for i in range(n_tlines)], dtype='U')
+        seg_xy = []
+        seg_line = []
+        for line_index in range(n_tlines):
+            stops = self.node_xy[rng.choice(n_nodes, 8)]
+            seg_xy.extend(np.hstack([stops[:-1], stops[1:]]).tolist())
+            seg_line.extend([line_index] * (len(stops) - 1))
+        self.seg_xy = np.array(seg_xy)
+        self.seg_line = np.array(seg_line)
+        self.index = tmm_spatial.SpatialIndex.from_geometry(self.node_ids, self.node_xy, self.tline_ids, self.seg_xy, self.seg_line)
+        self.point = self.node_xy.mean(axis=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def tline_distances(self, x, y):
+        distances = np.full(n_tlines, np.inf)
+        np.minimum.at(distances, self.seg_line, tmm_spatial._segment_distances(self.seg_xy, x, y))
+        return distances
+
+    def test_nodes(self):
+        x, y = self.point
+        distance = extent / 10
+        expected = self.node_ids[np.hypot(self.node_xy[:, 0] - x, self.node_xy[:, 1] - y) <= distance]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(sorted(self.index.nodes_within([[x, y]], distance).tolist()), expected.tolist())
+
+        box = [[x - distance, y - distance], [x + distance, y - distance], [x + distance, y + distance], [x - distance, y + distance]]
+        inside = (np.abs(self.node_xy[:, 0] - x) < distance) & (np.abs(self.node_xy[:, 1] - y) < distance)
+        self.assertEqual(self.index.nodes_in_polygon(box).tolist(), self.node_ids[inside].tolist())
+
+        nearest = self.node_ids[np.argsort(np.hypot(self.node_xy[:, 0] - x, self.node_xy[:, 1] - y), kind='mergesort')[:10]]
+        self.assertEqual(self.index.nearest_nodes((x, y), 10).tolist(), nearest.tolist())
+        self.assertEqual(len(self.index.nearest_nodes((x, y), n_nodes + 5)), n_nodes)
+
+    def test_tlines(self):
+        x, y = self.point
+        distance = extent / 20
+        distances = self.tline_distances(x, y)
+        self.assertEqual(self.index.tlines_within([[x, y]], distance).tolist(), self.tline_ids[distances <= distance].tolist())
+
+        box = np.array([[x - distance, y - distance], [x + distance, y - distance], [x + distance, y + distance], [x - distance, y + distance]])
+        hit = tmm_spatial._points_in_polygon(self.seg_xy[:, :2], box) | tmm_spatial._points_in_polygon(self.seg_xy[:, 2:], box)
+        for edge in np.hstack([box, np.roll(box, -1, axis=0)]):
+            hit |= tmm_spatial._segments_cross(self.seg_xy, edge)
+        self.assertEqual(self.index.tlines_in_polygon(box).tolist(), self.tline_ids[np.unique(self.seg_line[hit])].tolist())
+
+        nearest = self.tline_ids[np.argsort(distances, kind='mergesort')[:5]]
+        self.assertEqual(self.index.nearest_tlines((x, y), 5).tolist(), nearest.tolist())
+
+    def test_save_load(self):
+        index_file = self.index.save(os.path.join(self.work_dir, tmm_spatial.index_file_name))
+        loaded = tmm_spatial.SpatialIndex.load(index_file)
+        query = {'buffer': {'node_ids': self.node_ids[:3].tolist(), 'distance': extent / 15}}
+        for layer in ('nodes', 'tlines'):
+            self.assertEqual(tmm_spatial.query_ids(loaded, layer, query).tolist(), tmm_spatial.query_ids(self.index, layer, query).tolist())
+
+    def test_query_errors(self):
+        with self.assertRaises(ValueError):
+            tmm_spatial.query_ids(self.index, 'stops', {'nearest': {'point': self.point, 'k': 1}})
+        with self.assertRaises(ValueError):
+            tmm_spatial.query_ids(self.index, 'nodes', {'within': {}})
+        with self.assertRaises(ValueError):
+            tmm_spatial.query_ids(self.index, 'nodes', {'nearest': {'point': self.point, 'k': 1}, 'polygon': []})
+
+    def test_apply_spatial_policy(self):
+        table = os.path.join(self.work_dir, 'TMM_GIS.sqlite', 'extra_attr_nodes')
+        tmm_backends.create_policy_table(table, 'NODE_ID', self.node_ids, TMM.node_fields)
+        query = {'nearest': {'point': self.point.tolist(), 'k': 7}}
+        self.assertEqual(tmm_spatial.apply_spatial_policy(self.index, 'nodes', query, {'ADD_SHELTER': 2}, table), (7, 7))
+        policy = tmm_backends.read_policy_table(table, 'NODE_ID', TMM.node_fields)
+        self.assertEqual(policy.ids[policy.columns['ADD_SHELTER'] == 2].tolist(), sorted(tmm_spatial.query_ids(self.index, 'nodes', query).tolist()))
+        with self.assertRaises(ValueError):
+            tmm_spatial.apply_spatial_policy(self.index, 'nodes', query, {'ADD_WIFI': 1}, table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+    test_streaming.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_streaming.py writes exactly the batchin CSVs of an
+    in-memory build, whether the baseline CSVs are streamed straight through
+    or spilled to sorted runs and merged.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_gdb2csv
+import tmm_scoring
+import tmm_streaming
+import tmm_synthetic
+
+test_scale = 0.02  # Multiple of CMAP's network size
+test_chunk_rows = 7  # Small enough for every CSV to span several chunks
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.output_dir = os.path.join(self.work_dir, 'output')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def generate(self, sorted_inputs):
+        network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=7, sorted_inputs=sorted_inputs)
+        self.input_dir = network['input_dir']
+        self.node_policy, self.tline_policy = tmm_gdb2csv.load_policy_tables(network['node_table'], network['tline_table'])
+
+    def assertMatchesInMemoryBuild(self):
+        reference_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'reference'))
+        scenario = tmm_scoring.score_scenario(tmm_scoring.read_baseline(self.input_dir), self.node_policy, self.tline_policy)
+        tmm_scoring.write_scenario(scenario, reference_dir)
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            with open(os.path.join(reference_dir, filename), 'rb') as reference_csv:
+                with open(os.path.join(self.output_dir, filename), 'rb') as output_csv:
+                    self.assertEqual(reference_csv.read(), output_csv.read(), filename)
+        self.assertEqual(sorted(os.listdir(self.output_dir)), sorted(filename for key, filename, id_is_tline in tmm_scoring.baseline_csvs))
+
+    def stream(self):
+        return tmm_streaming.stream_scenario(self.input_dir, self.output_dir, self.node_policy, self.tline_policy, test_chunk_rows)
+
+    def test_iter_csv_chunks(self):
+        self.generate(sorted_inputs=True)
+        csv_file = os.path.join(self.input_dir, 'rail_node_extra_attributes.csv')
+        chunks = list(tmm_streaming.iter_csv_chunks(csv_file, chunk_rows=test_chunk_rows))
+        table = tmm_scoring.read_csv_table(csv_file)
+        self.assertTrue(all(len(chunk) == test_chunk_rows for chunk in chunks[:-1]))
+        self.assertEqual([row_id for chunk in chunks for row_id in chunk.ids.tolist()], table.ids.tolist())
+
+    def test_sorted_inputs(self):
+        self.generate(sorted_inputs=True)
+        self.assertEqual(len(self.stream()), len(tmm_scoring.baseline_csvs))
+        self.assertMatchesInMemoryBuild()
+
+    def test_unsorted_inputs(self):
+        self.generate(sorted_inputs=False)
+        self.stream()
+        self.assertMatchesInMemoryBuild()
+
+    def test_duplicate_ids(self):
+        # The last row of a duplicated ID is kept, even once it has been written
+        self.generate(sorted_inputs=True)
+        easeb_csv = os.path.join(self.input_dir, 'boarding_ease_by_line_id.csv')
+        first_tline_id = tmm_scoring.read_csv_table(easeb_csv, True).ids[0]
+        for csv_file, rows in ((os.path.join(self.input_dir, 'bus_node_extra_attributes.csv'), ['10001,5,2', '10002,4,0']),
+                               (easeb_csv, ['{0},1'.format(first_tline_id)])):
+            with tmm_scoring.open_csv(csv_file, 'a') as attr_csv:
+                attr_csv.write(''.join(row + '\r\n' for row in rows))
+        self.stream()
+        self.assertMatchesInMemoryBuild()
+
+
+if __name__ == '__main__':
+    unittest.main()
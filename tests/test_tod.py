@@ -0,0 +1,77 @@
+'''
+    test_tod.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_tod.py writes each TOD's batchin CSVs as the rows of the
+    scenario's CSVs that are in the TOD's network.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_gdb2csv
+import tmm_scoring
+import tmm_synthetic
+import tmm_tod
+
+test_scale = 0.02  # Multiple of CMAP's network size
+
+
+class TODTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        network = tmm_synthetic.generate_network(os.path.join(self.work_dir, 'network'), test_scale, seed=8)
+        node_policy, tline_policy = tmm_gdb2csv.load_policy_tables(network['node_table'], network['tline_table'])
+        self.scenario = tmm_scoring.score_scenario(tmm_scoring.read_baseline(network['input_dir']), node_policy, tline_policy)
+        self.scenario_dir = TMM.ensure_dir(os.path.join(self.work_dir, 'scenario'))
+        tmm_scoring.write_scenario(self.scenario, self.scenario_dir)
+        self.tod_ids = {}
+        for tod in tmm_synthetic.tod_periods:
+            ids = tmm_synthetic.read_tod_ids(network['itinerary_dir'], tod)
+            self.tod_ids[tod] = (ids['node_ids'], ids['tline_ids'])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def assertTODOutputs(self, output_dir, scen):
+        for tod, (node_ids, tline_ids) in self.tod_ids.items():
+            tod_dir = os.path.join(output_dir, 'Scenario_{0}'.format(scen + tod))
+            for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+                tod_ids = set(tline_ids) if id_is_tline else set(str(node_id) for node_id in node_ids)
+                with tmm_scoring.open_csv(os.path.join(self.scenario_dir, filename), 'r') as scenario_csv:
+                    lines = scenario_csv.read().splitlines(True)
+                expected = lines[:1] + [line for line in lines[1:] if line.split(',')[0] in tod_ids]
+                self.assertGreater(len(expected), 1)
+                with tmm_scoring.open_csv(os.path.join(tod_dir, filename), 'r') as tod_csv:
+                    self.assertEqual(tod_csv.read().splitlines(True), expected, '{0} ({1})'.format(filename, tod))
+
+    def test_write_tod_scenarios(self):
+        output_dir = os.path.join(self.work_dir, 'output')
+        tod_dirs = tmm_tod.write_tod_scenarios(self.scenario, self.tod_ids, output_dir)
+        self.assertEqual(tod_dirs, [os.path.join(output_dir, 'Scenario_{0}'.format(100 + tod)) for tod in sorted(self.tod_ids)])
+        self.assertTODOutputs(output_dir, 100)
+
+    def test_single_thread(self):
+        output_dir = os.path.join(self.work_dir, 'output')
+        tmm_tod.write_tod_scenarios(self.scenario, self.tod_ids, output_dir, scen=200, threads=1)
+        self.assertTODOutputs(output_dir, 200)
+
+    def test_filter_scenario(self):
+        filtered = tmm_tod.filter_scenario(self.scenario, [10001, 10001, 99999], [])
+        self.assertEqual(filtered['bus'].ids.tolist(), [10001])
+        self.assertEqual(filtered['bus'].columns['@bstyp'].tolist(), self.scenario['bus'].columns['@bstyp'][:1].tolist())
+        for key in ('rail', 'easeb', 'prof', 'relim'):
+            self.assertEqual(len(filtered[key]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
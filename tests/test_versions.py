@@ -0,0 +1,126 @@
+'''
+    test_versions.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    Checks that tmm_versions.py saves, checks out, compares & exports versions
+    of the policy tables exactly, sharing bases between versions and deleting
+    them with the last version that uses them.
+
+        python -m pytest tests
+
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmm_gis'))
+import TMM
+import tmm_backends
+import tmm_gdb2csv
+import tmm_versions
+
+n_nodes = 200
+n_tlines = 40
+
+
+class VersionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='tmm_test_')
+        self.store_dir = os.path.join(self.work_dir, tmm_versions.store_dir_name)
+        self.node_table = os.path.join(self.work_dir, 'TMM_GIS.sqlite', 'extra_attr_nodes')
+        self.tline_table = os.path.join(self.work_dir, 'TMM_GIS.sqlite', 'extra_attr_tlines')
+        tmm_backends.create_policy_table(self.node_table, 'NODE_ID', 10001 + np.arange(n_nodes), TMM.node_fields)
+        tmm_backends.create_policy_table(self.tline_table, 'TLINE_ID', ['b{0:06d}'.format(i) for i in range(n_tlines)], TMM.tline_fields, True)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def read_tables(self):
+        return tmm_gdb2csv.load_policy_tables(self.node_table, self.tline_table)
+
+    def set_policy(self, table, key_field, ids, field, value):
+        tmm_backends.update_policy(table, key_field, list(ids), [field], {field: np.full(len(ids), value, dtype=np.int16)})
+
+    def save_tables(self, name):
+        return tmm_versions.save_version(self.store_dir, name, *self.read_tables())
+
+    def assertPoliciesEqual(self, policies, expected):
+        for policy, expected_policy in zip(policies, expected):
+            self.assertEqual(policy.ids.tolist(), expected_policy.ids.tolist())
+            self.assertEqual(list(policy.fields), list(expected_policy.fields))
+            for field in expected_policy.fields:
+                self.assertEqual(policy.columns[field].tolist(), expected_policy.columns[field].tolist(), field)
+
+    def test_save_load(self):
+        base_meta = self.save_tables('baseline')
+        self.set_policy(self.node_table, 'NODE_ID', [10003, 10010], 'ADD_SHELTER', 2)
+        self.set_policy(self.tline_table, 'TLINE_ID', ['b000005'], 'ADD_WIFI', 1)
+        shelters = self.read_tables()
+        meta = self.save_tables('shelters')
+        self.assertEqual(meta['base'], base_meta['base'])  # Few rows changed, so the base is shared
+        self.assertEqual(meta['changed_rows'], {'node': 2, 'tline': 1})
+        self.assertPoliciesEqual(tmm_versions.load_version(self.store_dir, 'shelters'), shelters)
+        self.assertEqual([name for name, meta in tmm_versions.list_versions(self.store_dir)], ['baseline', 'shelters'])
+
+        # Tables identical to a base reuse it without diffing
+        tmm_versions.checkout_version(self.store_dir, 'baseline', self.node_table, self.tline_table)
+        self.assertEqual(self.save_tables('baseline_copy'), {'base': base_meta['base'], 'changed_rows': {'node': 0, 'tline': 0}})
+        with self.assertRaises(ValueError):
+            self.save_tables('base_shelters')
+        with self.assertRaises(ValueError):
+            tmm_versions.load_version(self.store_dir, 'missing')
+
+    def test_rebase(self):
+        base_meta = self.save_tables('baseline')
+        node_ids = (10001 + np.arange(0, n_nodes, 2)).tolist()  # Half the nodes, more than rebase_fraction
+        self.set_policy(self.node_table, 'NODE_ID', node_ids, 'ADD_SEATS', 1)
+        wifi = self.read_tables()
+        meta = self.save_tables('wifi')
+        self.assertNotEqual(meta['base'], base_meta['base'])
+        self.assertEqual(meta['changed_rows'], {'node': 0, 'tline': 0})
+        self.assertPoliciesEqual(tmm_versions.load_version(self.store_dir, 'wifi'), wifi)
+
+        base_files = lambda: sorted(name for name in os.listdir(self.store_dir) if name.startswith(tmm_versions.base_prefix))
+        self.assertEqual(len(base_files()), 2)
+        tmm_versions.delete_version(self.store_dir, 'wifi')
+        self.assertEqual(base_files(), ['{0}{1}.npz'.format(tmm_versions.base_prefix, base_meta['base'])])
+
+    def test_checkout(self):
+        baseline = self.read_tables()
+        self.save_tables('baseline')
+        self.set_policy(self.node_table, 'NODE_ID', [10001, 10002, 10003], 'ADD_SHELTER', 1)
+        self.set_policy(self.tline_table, 'TLINE_ID', ['b000001', 'b000002'], 'ADD_WIFI', 4)
+        shelters = self.read_tables()
+        self.save_tables('shelters')
+
+        self.assertEqual(tmm_versions.checkout_version(self.store_dir, 'baseline', self.node_table, self.tline_table), (3, 2))
+        self.assertPoliciesEqual(self.read_tables(), baseline)
+        self.assertEqual(tmm_versions.checkout_version(self.store_dir, 'shelters', self.node_table, self.tline_table), (3, 2))
+        self.assertPoliciesEqual(self.read_tables(), shelters)
+        self.assertEqual(tmm_versions.checkout_version(self.store_dir, 'shelters', self.node_table, self.tline_table), (0, 0))
+
+        changes, added, removed = tmm_versions.diff_policies(baseline[0], shelters[0])
+        self.assertEqual(changes['ADD_SHELTER'][0].tolist(), [10001, 10002, 10003])
+        self.assertEqual(changes['ADD_SHELTER'][2].tolist(), [1, 1, 1])
+        self.assertEqual((len(changes['ADD_SEATS'][0]), len(added), len(removed)), (0, 0, 0))
+
+    def test_export(self):
+        self.set_policy(self.node_table, 'NODE_ID', [10007], 'ADD_SHELTER', 3)
+        self.set_policy(self.tline_table, 'TLINE_ID', ['b000009'], 'ADD_WIFI', 2)
+        self.save_tables('shelters')
+        node_table, tline_table = tmm_versions.export_version(self.store_dir, 'shelters', os.path.join(self.work_dir, 'export.sqlite'))
+        node_policy = tmm_backends.read_policy_table(node_table, 'NODE_ID', TMM.node_fields)
+        tline_policy = tmm_backends.read_policy_table(tline_table, 'TLINE_ID', TMM.tline_fields, True)
+        self.assertEqual(node_policy.ids.tolist(), [10007])
+        self.assertEqual(node_policy.columns['ADD_SHELTER'].tolist(), [3])
+        self.assertEqual(tline_policy.ids.tolist(), ['b000009'])
+        self.assertEqual(tline_policy.columns['ADD_WIFI'].tolist(), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
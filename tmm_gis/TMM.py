@@ -2,15 +2,20 @@
 '''
     TMM.py
     Author: npeterson
-    Revised: 4/9/2015
+    Revised: 10/17/2026
     ---------------------------------------------------------------------------
     This module stores information used by other TMM scripts.
 
+    arcpy is only imported by the methods that need it (via import_arcpy(),
+    which also lets geoprocessing overwrite existing outputs), so that the
+    scripts' pure-Python code (scoring, CSV I/O, non-GDB table formats) can
+    be imported quickly without ArcGIS.
+
 '''
 import os
 import sys
-import arcpy
-arcpy.env.OverwriteOutput = True
+import tmm_backends
+import tmm_scoring
 
 # -----------------------------------------------------------------------------
 #  1. DIRECTORIES & FILES
@@ -58,9 +63,19 @@ tline_fields = (
 # -----------------------------------------------------------------------------
 #  3. METHODS
 # -----------------------------------------------------------------------------
+def add_message(message):
+    ''' Report a message with arcpy.AddMessage() if arcpy is in use, or else
+        print it. '''
+    if 'arcpy' in sys.modules:
+        sys.modules['arcpy'].AddMessage(message)
+    else:
+        print(message)
+    return message
+
+
 def check_selection(lyr):
     ''' Check whether specified feature layer has a selection. '''
-    import arcpy
+    arcpy = import_arcpy()
     desc = arcpy.Describe(lyr)
     selected = desc.FIDSet
     if len(selected) == 0:
@@ -71,6 +86,7 @@ def check_selection(lyr):
 
 def delete_if_exists(filepath):
     ''' Check if a file exists, and delete it if so. '''
+    arcpy = import_arcpy()
     if arcpy.Exists(filepath):
         arcpy.Delete_management(filepath)
         message = filepath + ' successfully deleted.'
@@ -81,6 +97,7 @@ def delete_if_exists(filepath):
 
 def die(error_message):
     ''' End processing prematurely. '''
+    arcpy = import_arcpy()
     arcpy.AddError('\n' + error_message + '\n')
     sys.exit()
     return None
@@ -94,6 +111,15 @@ def ensure_dir(directory):
     return directory
 
 
+def import_arcpy():
+    ''' Import arcpy for the methods & scripts that need it, with its
+        environment set up as every TMM script expects. Returns the arcpy
+        module. '''
+    import arcpy
+    arcpy.env.OverwriteOutput = True
+    return arcpy
+
+
 def make_attribute_dict(fc, key_field, attr_list=['*']):
     ''' Create a dictionary of feature class/table attributes, using OID as the
         key. Default of ['*'] for attr_list (instead of actual attribute names)
@@ -101,17 +127,17 @@ def make_attribute_dict(fc, key_field, attr_list=['*']):
         - NOTE 1: when key_field is the OID field, the OID attribute name can
           be fetched by MHN.determine_OID_fieldname(fc).
         - NOTE 2: using attr_list=[] will essentially build a list of unique
-          key_field values. '''
-    attr_dict = {}
-    fc_field_objects = arcpy.ListFields(fc)
-    fc_fields = [field.name for field in fc_field_objects if field.type != 'Geometry']
+          key_field values.
+        - NOTE 3: fc can be in any format supported by tmm_backends.
+        - NOTE 4: the "dictionary" is a compact tmm_scoring.AttributeStore,
+          which stores each field as a single typed array. '''
+    backend = tmm_backends.get_backend(fc)
+    fc_fields = backend.list_fields(fc)
     if attr_list == ['*']:
         valid_fields = fc_fields
     else:
         valid_fields = [field for field in attr_list if field in fc_fields]
     # Ensure that key_field is always the first field in the field list
-    cursor_fields = [key_field] + list(set(valid_fields) - set([key_field]))
-    with arcpy.da.SearchCursor(fc, cursor_fields) as cursor:
-        for row in cursor:
-            attr_dict[row[0]] = dict(zip(cursor.fields, row))
-    return attr_dict
+    read_fields = [key_field] + list(set(valid_fields) - set([key_field]))
+    columns = backend.read_columns(fc, read_fields)
+    return tmm_scoring.AttributeStore.from_columns(key_field, read_fields, columns)
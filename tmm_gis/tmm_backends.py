@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+'''
+    tmm_backends.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module provides interchangeable readers & writers for the tables used
+    by the TMM scripts (chiefly the extra_attr_nodes/extra_attr_tlines policy
+    tables), so that they can be stored in formats other than a file
+    geodatabase. Every backend reads whole columns at once into NumPy arrays,
+    rather than iterating over a cursor one row at a time.
+
+    The backend is chosen from the table path:
+      - <dir>\\TMM_GIS.gdb\\<table>          (file geodatabase; needs arcpy)
+      - <dir>\\TMM_GIS.gpkg\\<table>         (GeoPackage attribute table)
+      - <dir>\\TMM_GIS.sqlite\\<table>       (SQLite; also .db)
+      - <dir>\\<table>.csv                   (CSV)
+      - <dir>\\<table>.parquet               (Parquet; needs pyarrow)
+      - <dir>\\<table>.feather               (Feather; needs pyarrow)
+
+    Each backend has the same methods, taking a table path and passing
+    columns as a dictionary of equal-length arrays keyed by fieldname:
+    list_fields(table), read_columns(table, fields), write_columns(table,
+    fields, columns) (creating or replacing the table), and update_rows()
+    & update_values() (updating the rows with the specified IDs, and
+    returning the number of rows updated).
+
+'''
+import csv
+import os
+import sqlite3
+import numpy as np
+import TMM
+import tmm_scoring
+
+gdb_exts = ('.gdb',)
+sqlite_exts = ('.gpkg', '.sqlite', '.db')
+
+query_chunk_size = 1000  # Max IDs per where clause when updating a GDB table
+full_scan_fraction = 0.25  # Update whole GDB table if selection is larger
+tline_id_length = 20  # Minimum width of a TLINE_ID text field
+
+
+# -----------------------------------------------------------------------------
+#  1. BACKENDS
+# -----------------------------------------------------------------------------
+class FileBackend(object):
+    ''' Shared behaviour of the single-file backends, whose rows are updated
+        by reading, updating & rewriting the whole table. Subclasses provide
+        list_fields(), read_columns() and write_columns(). '''
+
+    def update_rows(self, table, key_field, ids, fields, values):
+        ''' Set the specified fields to the specified values in every row
+            whose key_field value is in ids. Returns the number of rows
+            updated. The whole table is read, updated & rewritten. '''
+        all_fields = self.list_fields(table)
+        columns = self.read_columns(table, all_fields)
+        keys = columns[key_field].astype('U')
+        selected = np.unique(np.array([u'{0}'.format(row_id) for row_id in ids], dtype='U'))
+        rows, _ = tmm_scoring.match_ids(keys, selected)
+        for field, value in zip(fields, values):
+            columns[field] = columns[field].copy()
+            columns[field][rows] = value
+        self.write_columns(table, all_fields, columns)
+        return int(rows.sum())
+
+    def update_values(self, table, key_field, ids, fields, columns):
+        ''' Set the specified fields of every row whose key_field value is in
+            ids to that row's own values, from a dictionary of columns aligned
+            with ids, in a single pass. Returns the number of rows updated.
+            The whole table is read, updated & rewritten once. '''
+        all_fields = self.list_fields(table)
+        table_columns = self.read_columns(table, all_fields)
+        keys = table_columns[key_field].astype('U')
+        new_keys = np.array([u'{0}'.format(row_id) for row_id in ids], dtype='U')
+        order = np.argsort(new_keys, kind='mergesort')
+        found, pos = tmm_scoring.match_ids(keys, new_keys[order])
+        for field in fields:
+            values = np.asarray(columns[field])[order[pos[found]]]
+            if table_columns[field].dtype.kind == 'U':
+                values = values.astype('U')  # Widening the column if need be
+            table_columns[field] = tmm_scoring.patch_rows(table_columns[field], found, values)
+        self.write_columns(table, all_fields, table_columns)
+        return int(found.sum())
+
+
+class ArrowBackend(FileBackend):
+    ''' Parquet and Feather files, read & written with pyarrow. '''
+
+    def list_fields(self, table):
+        return list(self._read(table, None).column_names)
+
+    def read_columns(self, table, fields):
+        arrow_table = self._read(table, list(fields))
+        return dict((field, arrow_table.column(field).to_numpy()) for field in fields)
+
+    def write_columns(self, table, fields, columns):
+        import pyarrow
+        arrow_table = pyarrow.table([columns[field] for field in fields], names=list(fields))
+        if table.lower().endswith('.parquet'):
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(arrow_table, table)
+        else:
+            import pyarrow.feather
+            pyarrow.feather.write_feather(arrow_table, table)
+        return table
+
+    def _read(self, table, fields):
+        if table.lower().endswith('.parquet'):
+            import pyarrow.parquet
+            return pyarrow.parquet.read_table(table, columns=fields)
+        import pyarrow.feather
+        return pyarrow.feather.read_table(table, columns=fields)
+
+
+class CSVBackend(FileBackend):
+    ''' CSV files with a header row. Values are read as text, so callers
+        should convert them with the dtypes argument of read_table(). '''
+
+    def list_fields(self, table):
+        with tmm_scoring.open_csv(table, 'r') as table_csv:
+            return next(csv.reader(table_csv))
+
+    def read_columns(self, table, fields):
+        with tmm_scoring.open_csv(table, 'r') as table_csv:
+            reader = csv.reader(table_csv)
+            csv_fields = next(reader)
+            rows = [row for row in reader if row]
+        if rows:
+            values = np.array(rows, dtype='U')
+        else:
+            values = np.zeros((0, len(csv_fields)), dtype='U1')
+        return dict((field, values[:, csv_fields.index(field)]) for field in fields)
+
+    def write_columns(self, table, fields, columns):
+        with tmm_scoring.open_csv(table, 'w') as table_csv:
+            writer = csv.writer(table_csv)
+            writer.writerow(fields)
+            writer.writerows(zip(*[columns[field].tolist() for field in fields]))
+        return table
+
+
+class GDBBackend(object):
+    ''' File geodatabase tables & feature classes, read & written with arcpy's
+        NumPy conversion tools. '''
+
+    def list_fields(self, table):
+        arcpy = TMM.import_arcpy()
+        return [field.name for field in arcpy.ListFields(table) if field.type != 'Geometry']
+
+    def read_columns(self, table, fields):
+        arcpy = TMM.import_arcpy()
+        array = arcpy.da.TableToNumPyArray(table, list(fields), null_value=0)
+        return dict((field, array[field]) for field in fields)
+
+    def update_rows(self, table, key_field, ids, fields, values):
+        ''' Update rows with an UpdateCursor. Small selections are queried in
+            chunks of query_chunk_size IDs, so that no where clause grows
+            without limit; large selections are found in a single pass over
+            the whole table. '''
+        arcpy = TMM.import_arcpy()
+        ids = set(ids)
+        row_count = int(arcpy.GetCount_management(table).getOutput(0))
+        if len(ids) > full_scan_fraction * row_count:
+            where_clauses = [None]
+        else:
+            key_delim = arcpy.AddFieldDelimiters(table, key_field)
+            sorted_ids = sorted(ids)
+            where_clauses = [
+                '{0} IN ({1})'.format(key_delim, ','.join(_sql_literal(row_id) for row_id in sorted_ids[i:i+query_chunk_size]))
+                for i in range(0, len(sorted_ids), query_chunk_size)
+            ]
+        updated = 0
+        for where_clause in where_clauses:
+            with arcpy.da.UpdateCursor(table, [key_field] + list(fields), where_clause) as cursor:
+                for row in cursor:
+                    if row[0] in ids:
+                        cursor.updateRow([row[0]] + list(values))
+                        updated += 1
+        return updated
+
+    def update_values(self, table, key_field, ids, fields, columns):
+        ''' Update rows with a single UpdateCursor pass, looking up each row's
+            new values by its ID. '''
+        arcpy = TMM.import_arcpy()
+        new_values = dict(zip(ids, zip(*[np.asarray(columns[field]).tolist() for field in fields])))
+        updated = 0
+        with arcpy.da.UpdateCursor(table, [key_field] + list(fields)) as cursor:
+            for row in cursor:
+                if row[0] in new_values:
+                    cursor.updateRow([row[0]] + list(new_values[row[0]]))
+                    updated += 1
+        return updated
+
+    def write_columns(self, table, fields, columns):
+        arcpy = TMM.import_arcpy()
+        if arcpy.Exists(table):
+            arcpy.Delete_management(table)
+        array = np.empty(len(columns[fields[0]]), dtype=[(field, _gdb_dtype(columns[field])) for field in fields])
+        for field in fields:
+            array[field] = columns[field]
+        arcpy.da.NumPyArrayToTable(array, table)
+        return table
+
+
+class SQLiteBackend(object):
+    ''' Tables in a SQLite database or a GeoPackage, which is a SQLite
+        database that registers its tables in gpkg_contents. '''
+
+    def list_fields(self, table):
+        db_path, table_name = split_table_path(table)
+        connection = sqlite3.connect(db_path)
+        try:
+            return [row[1] for row in connection.execute('PRAGMA table_info("{0}")'.format(table_name))]
+        finally:
+            connection.close()
+
+    def read_columns(self, table, fields):
+        db_path, table_name = split_table_path(table)
+        connection = sqlite3.connect(db_path)
+        try:
+            query = 'SELECT {0} FROM "{1}"'.format(', '.join('"{0}"'.format(field) for field in fields), table_name)
+            rows = connection.execute(query).fetchall()
+        finally:
+            connection.close()
+        if rows:
+            return dict((field, np.array(values)) for field, values in zip(fields, zip(*rows)))
+        return dict((field, np.array([])) for field in fields)
+
+    def update_rows(self, table, key_field, ids, fields, values):
+        ''' Update rows by joining the table to a temporary table of IDs. '''
+        db_path, table_name = split_table_path(table)
+        assignments = ', '.join('"{0}" = ?'.format(field) for field in fields)
+        connection = sqlite3.connect(db_path)
+        try:
+            with connection:
+                connection.execute('CREATE TEMP TABLE selected_ids (id PRIMARY KEY)')
+                connection.executemany('INSERT OR IGNORE INTO selected_ids VALUES (?)', [(row_id,) for row_id in ids])
+                cursor = connection.execute(
+                    'UPDATE "{0}" SET {1} WHERE "{2}" IN (SELECT id FROM selected_ids)'.format(table_name, assignments, key_field),
+                    list(values),
+                )
+                updated = cursor.rowcount
+                connection.execute('DROP TABLE selected_ids')
+        finally:
+            connection.close()
+        return updated
+
+    def update_values(self, table, key_field, ids, fields, columns):
+        ''' Update rows by joining the table to a temporary table of IDs and
+            their new values. '''
+        db_path, table_name = split_table_path(table)
+        value_fields = ['value_{0}'.format(i) for i in range(len(fields))]
+        assignments = ', '.join(
+            '"{0}" = (SELECT {1} FROM new_values WHERE id = "{2}"."{3}")'.format(field, value_field, table_name, key_field)
+            for field, value_field in zip(fields, value_fields)
+        )
+        connection = sqlite3.connect(db_path)
+        try:
+            with connection:
+                connection.execute('CREATE TEMP TABLE new_values (id PRIMARY KEY, {0})'.format(', '.join(value_fields)))
+                connection.executemany(
+                    'INSERT OR REPLACE INTO new_values VALUES ({0})'.format(', '.join('?' for field in ['id'] + value_fields)),
+                    zip(list(ids), *[np.asarray(columns[field]).tolist() for field in fields]),
+                )
+                cursor = connection.execute(
+                    'UPDATE "{0}" SET {1} WHERE "{2}" IN (SELECT id FROM new_values)'.format(table_name, assignments, key_field)
+                )
+                updated = cursor.rowcount
+                connection.execute('DROP TABLE new_values')
+        finally:
+            connection.close()
+        return updated
+
+    def write_columns(self, table, fields, columns):
+        db_path, table_name = split_table_path(table)
+        field_types = ', '.join('"{0}" {1}'.format(field, _sqlite_type(columns[field])) for field in fields)
+        placeholders = ', '.join('?' for field in fields)
+        connection = sqlite3.connect(db_path)
+        try:
+            with connection:
+                connection.execute('DROP TABLE IF EXISTS "{0}"'.format(table_name))
+                connection.execute('CREATE TABLE "{0}" ({1})'.format(table_name, field_types))
+                connection.executemany(
+                    'INSERT INTO "{0}" VALUES ({1})'.format(table_name, placeholders),
+                    zip(*[columns[field].tolist() for field in fields]),
+                )
+                gpkg_contents = connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'gpkg_contents'"
+                ).fetchone()
+                if gpkg_contents:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO gpkg_contents (table_name, data_type, identifier) VALUES (?, 'attributes', ?)",
+                        (table_name, table_name),
+                    )
+        finally:
+            connection.close()
+        return table
+
+
+# -----------------------------------------------------------------------------
+#  2. METHODS
+# -----------------------------------------------------------------------------
+def apply_policy(table, key_field, ids, fields, values, ignore_zeroes=False):
+    ''' Set policy values for the rows of a policy table with the specified
+        IDs. If ignore_zeroes is True, fields with a value of 0 are left
+        unchanged. Returns the number of rows updated. '''
+    write_fields = [field for field, value in zip(fields, values) if value != 0 or not ignore_zeroes]
+    write_values = [value for field, value in zip(fields, values) if value != 0 or not ignore_zeroes]
+    if not write_fields or len(ids) == 0:
+        return 0
+    return get_backend(table).update_rows(table, key_field, ids, write_fields, write_values)
+
+
+def create_policy_table(table, key_field, ids, fields, id_is_tline=False):
+    ''' Create (or replace) a policy table with a row for each unique ID and
+        every policy field set to 0, in a single write. The IDs are stored as
+        text (TLINE_ID) or 32-bit integers (NODE_ID), and the policy fields as
+        16-bit integers (like GDB SHORT fields). Returns the table. '''
+    array = _policy_array(key_field, ids, fields, id_is_tline)
+    columns = dict((name, array[name]) for name in array.dtype.names)
+    return write_table(table, array.dtype.names, columns)
+
+
+def get_backend(table):
+    ''' Return the backend that can read & write the specified table path. '''
+    container = split_table_path(table)[0]
+    ext = os.path.splitext(container)[1].lower()
+    if ext in gdb_exts:
+        return GDBBackend()
+    elif ext in sqlite_exts:
+        return SQLiteBackend()
+    elif ext == '.csv':
+        return CSVBackend()
+    elif ext in ('.parquet', '.feather'):
+        return ArrowBackend()
+    raise ValueError('No table backend for "{0}".'.format(table))
+
+
+def read_policy_table(table, key_field, fields, id_is_tline=False):
+    ''' Read a policy table into a tmm_scoring.AttributeStore, with the
+        policy fields stored as 16-bit integers (like GDB SHORT fields). '''
+    dtypes = dict((field, np.int16) for field in fields)
+    dtypes[key_field] = 'U' if id_is_tline else np.int32
+    columns = read_table(table, [key_field] + list(fields), dtypes)
+    return tmm_scoring.AttributeStore.from_columns(key_field, fields, columns)
+
+
+def read_table(table, fields, dtypes=None):
+    ''' Read the specified fields of a table into a dictionary of arrays,
+        converting any fields listed in the optional dtypes dictionary. '''
+    columns = get_backend(table).read_columns(table, fields)
+    for field, dtype in (dtypes or {}).items():
+        columns[field] = columns[field].astype(dtype)
+    return columns
+
+
+def split_table_path(table):
+    ''' Split a table path into the path of its file/database and the name of
+        the table within it (None for single-table files). '''
+    parts = os.path.normpath(table).split(os.sep)
+    for i, part in enumerate(parts):
+        if os.path.splitext(part)[1].lower() in gdb_exts + sqlite_exts and i < len(parts) - 1:
+            return os.sep.join(parts[:i+1]), '/'.join(parts[i+1:])
+    return table, None
+
+
+def write_table(table, fields, columns):
+    ''' Write a dictionary of arrays to a new table, replacing any existing
+        table at the same path. '''
+    return get_backend(table).write_columns(table, list(fields), columns)
+
+
+def update_policy(table, key_field, ids, fields, columns):
+    ''' Set each policy table row with one of the specified IDs to its own
+        values, from a dictionary of columns aligned with ids, in a single
+        update. Returns the number of rows updated. '''
+    if not fields or len(ids) == 0:
+        return 0
+    return get_backend(table).update_values(table, key_field, list(ids), fields, columns)
+
+
+def write_sparse_policy(table, key_field, policy, id_is_tline=False):
+    ''' Create (or replace) a policy table holding only the rows of a policy
+        AttrTable with a policy set (see tmm_scoring.policy_overlay()), stored
+        as by create_policy_table(), for tmm_gdb2csv.py --sparse. Returns the
+        table. '''
+    overlay = tmm_scoring.policy_overlay(policy)
+    array = _policy_array(key_field, overlay.ids, overlay.fields, id_is_tline)
+    for field in overlay.fields:
+        array[field] = overlay.columns[field]
+    columns = dict((name, array[name]) for name in array.dtype.names)
+    return write_table(table, array.dtype.names, columns)
+
+
+def _gdb_dtype(column):
+    ''' Choose a NumPy dtype that arcpy can convert into a GDB field type. '''
+    if column.dtype.kind == 'U':
+        return 'U{0}'.format(max(column.dtype.itemsize // 4, 1))
+    elif column.dtype.kind in ('S', 'O'):
+        return 'U{0}'.format(max([len(value) for value in column.tolist()] or [1]))
+    elif column.dtype.kind in ('i', 'u', 'b') and column.dtype.itemsize <= 2:
+        return np.int16  # SHORT
+    elif column.dtype.kind in ('i', 'u', 'b'):
+        return np.int32  # LONG
+    return np.float64  # DOUBLE
+
+
+def _policy_array(key_field, ids, fields, id_is_tline):
+    ''' Return a structured array with a row for each unique ID (sorted) and
+        every policy field set to 0. '''
+    ids = np.unique(tmm_scoring.id_array(list(ids), id_is_tline))
+    if id_is_tline:
+        ids = ids.astype('U{0}'.format(max(tline_id_length, ids.dtype.itemsize // 4)))
+    else:
+        ids = ids.astype(np.int32)
+    array = np.zeros(len(ids), dtype=[(key_field, ids.dtype)] + [(field, np.int16) for field in fields])
+    array[key_field] = ids
+    return array
+
+
+def _sql_literal(value):
+    ''' Format an ID for use in a where clause. '''
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return str(value)
+    return "'{0}'".format(value.replace("'", "''"))
+
+
+def _sqlite_type(column):
+    ''' Choose a SQLite column type for an array. '''
+    if column.dtype.kind in ('i', 'u', 'b'):
+        return 'INTEGER'
+    elif column.dtype.kind == 'f':
+        return 'REAL'
+    return 'TEXT'
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+'''
+    tmm_batch.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This script will build the batchin CSVs for any number of policy
+    scenarios in a single run. The baseline CSVs and the policy tables are
+    read once, shared read-only with a pool of worker processes, and each
+    scenario is scored and written to its own output directory. (The
+    baseline CSVs are shared as memory-mapped columns from tmm_cache.py.)
+
+    Scenarios are described in a JSON manifest, e.g.:
+
+    {
+        "scenarios": [
+            {
+                "name": "wifi_metra",
+                "tline_policies": [
+                    {"prefix": "m", "values": {"ADD_WIFI": 1}}
+                ]
+            },
+            {
+                "name": "shelters_info",
+                "output_dir": "C:\\TMM\\output\\shelters_info",
+                "node_table": "C:\\TMM\\Alt_1.gdb\\extra_attr_nodes",
+                "node_policies": [
+                    {"ids": [12345, 12346], "values": {"ADD_SHELTER": 5, "ADD_INFO": 1}}
+                ]
+            }
+        ]
+    }
+
+    Each scenario starts from its node_table/tline_table (by default the
+    tables in TMM_GIS.gdb, or a table in any format supported by
+    tmm_backends.py). Its node_policies/tline_policies are then applied
+    in order, setting the specified fields for the rows whose IDs are listed
+    in "ids", or begin with "prefix" (tline policies only, as node IDs are
+    numbers), or for every row if neither is given.
+    Output is written to output_dir (by default a subdirectory of
+    TMM.output_dir named for the scenario).
+
+    Usage: python tmm_batch.py <manifest.json> [--processes N]
+
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import numpy as np
+import TMM
+import tmm_backends
+import tmm_cache
+import tmm_scoring
+
+# Read-only inputs shared by every scenario in a worker process:
+_shared = {}
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def apply_overrides(policy, overrides):
+    ''' Return a copy of a policy AttrTable with a list of override specs
+        applied in order. Only the overridden columns are copied. Raises
+        ValueError for an ID not in the policy table or an unknown field. '''
+    policy = policy.copy()
+    for override in overrides:
+        if 'ids' in override:
+            ids = tmm_scoring.id_array(override['ids'], policy.ids.dtype.kind == 'U')
+            found, pos = tmm_scoring.match_ids(ids, policy.ids)
+            if not found.all():
+                raise ValueError('IDs not in the policy table: {0}.'.format(', '.join(str(id) for id in ids[~found])))
+            rows = pos
+        elif 'prefix' in override:
+            if policy.ids.dtype.kind != 'U':
+                raise ValueError('"prefix" overrides only apply to tline policies, whose IDs are text.')
+            rows = np.flatnonzero(np.char.startswith(policy.ids, override['prefix']))
+        else:
+            rows = slice(None)
+        for field, value in override['values'].items():
+            if field not in policy.columns:
+                raise ValueError('"{0}" is not a policy field.'.format(field))
+            column = policy.columns[field].copy()
+            column[rows] = value
+            policy.columns[field] = column
+    return policy
+
+
+def build_batch_scenario(spec):
+    ''' Score and write a single scenario from a manifest, using the inputs
+        shared with this process. Returns the scenario name and output
+        directory. '''
+    node_policy = apply_overrides(_shared['policies'][spec['node_table']], spec.get('node_policies', []))
+    tline_policy = apply_overrides(_shared['policies'][spec['tline_table']], spec.get('tline_policies', []))
+    scenario = tmm_scoring.score_scenario(_shared['baseline'], node_policy, tline_policy)
+    tmm_scoring.write_scenario(scenario, TMM.ensure_dir(spec['output_dir']))
+    return spec['name'], spec['output_dir']
+
+
+def read_manifest(manifest_path):
+    ''' Read a scenario manifest, filling in the default tables and output
+        directory of each scenario. Raises ValueError for a duplicate scenario
+        name or a node policy set by prefix. '''
+    with open(manifest_path, 'r') as manifest_file:
+        specs = json.load(manifest_file)['scenarios']
+    names = set()
+    for spec in specs:
+        if spec['name'] in names:
+            raise ValueError('Scenario "{0}" is listed more than once.'.format(spec['name']))
+        names.add(spec['name'])
+        if any('prefix' in override for override in spec.get('node_policies', [])):
+            raise ValueError('Scenario "{0}" sets node policies by "prefix", but node IDs are numbers; list their "ids" instead.'.format(spec['name']))
+        spec.setdefault('node_table', os.path.join(TMM.gdb, 'extra_attr_nodes'))
+        spec.setdefault('tline_table', os.path.join(TMM.gdb, 'extra_attr_tlines'))
+        spec.setdefault('output_dir', os.path.join(TMM.output_dir, spec['name']))
+    return specs
+
+
+def run_batch(specs, input_dir=TMM.input_dir, processes=None):
+    ''' Build every scenario in a list of manifest specs, fanning them out
+        over a pool of processes. Returns a list of (name, output_dir) for the
+        scenarios built, in manifest order. '''
+    tmm_cache.read_baseline(input_dir)  # Build the cache for the workers to map
+
+    # Read each distinct policy table once, no matter how many scenarios use it
+    policies = {}
+    for spec in specs:
+        for table, key_field, fields, id_is_tline in (
+                (spec['node_table'], 'NODE_ID', TMM.node_fields, False),
+                (spec['tline_table'], 'TLINE_ID', TMM.tline_fields, True)):
+            if table not in policies:
+                policies[table] = tmm_backends.read_policy_table(table, key_field, fields, id_is_tline)
+
+    if processes is None:
+        processes = min(len(specs), multiprocessing.cpu_count())
+    if processes <= 1:
+        _init_worker(input_dir, policies)
+        return [build_batch_scenario(spec) for spec in specs]
+
+    pool = multiprocessing.Pool(processes, _init_worker, (input_dir, policies))
+    try:
+        results = pool.map(build_batch_scenario, specs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def _init_worker(input_dir, policies):
+    ''' Store the read-only inputs shared by all scenarios in a process,
+        mapping the cached baseline CSVs. '''
+    _shared['baseline'] = tmm_cache.read_baseline(input_dir)
+    _shared['policies'] = policies
+
+
+# -----------------------------------------------------------------------------
+#  Build the scenarios.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build batchin CSVs for a manifest of TMM scenarios.')
+    parser.add_argument('manifest', help='JSON file listing the scenarios to build')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    for name, scen_output_dir in run_batch(read_manifest(args.manifest), processes=args.processes):
+        print('{0}: {1}'.format(name, scen_output_dir))
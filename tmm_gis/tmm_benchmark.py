@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+'''
+    tmm_benchmark.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This script benchmarks the stages of tmm_gdb2csv.py and the ID dedup of
+    tmm_shp2gdb.py against synthetic networks (see tmm_synthetic.py) at one
+    or more multiples of CMAP's network size, e.g.:
+
+        python tmm_benchmark.py --scales 1 10 100 --repeat 3
+
+    Each stage is timed over the specified number of repetitions (reporting
+    the fastest), then run once more to measure its peak memory allocation.
+    Peak memory is measured with tracemalloc where available, or else as the
+    growth of the process' peak RSS (which can only be seen to increase).
+
+    The synthetic networks are written to --workdir (by default a temporary
+    directory, which is deleted afterwards). Results are printed as a table,
+    and can also be written to a JSON file with --json.
+
+'''
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import TMM
+import tmm_backends
+import tmm_cache
+import tmm_incremental
+import tmm_instrument
+import tmm_network
+import tmm_scoring
+import tmm_streaming
+import tmm_synthetic
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+changed_share = 0.01  # Share of policy rows changed before an incremental build
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def benchmark_scale(work_dir, scale, repeat=1, seed=0):
+    ''' Generate a synthetic network of the specified scale in work_dir and
+        benchmark every stage against it. Returns a list of result
+        dictionaries, in stage order. '''
+    paths = tmm_synthetic.generate_network(os.path.join(work_dir, 'network'), scale, seed)
+    input_dir = paths['input_dir']
+    output_dir = TMM.ensure_dir(os.path.join(work_dir, 'output'))
+    stream_dir = TMM.ensure_dir(os.path.join(work_dir, 'output_stream'))
+    results = []
+
+    def run(stage, func, setup=None, rows=None):
+        result, seconds, peak_bytes = measure(func, setup, repeat)
+        results.append({
+            'scale': scale,
+            'stage': stage,
+            'rows': rows(result) if rows else None,
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+        })
+        return result
+
+    # tmm_gdb2csv.py
+    node_policy = run('load node policy', lambda: tmm_backends.read_policy_table(
+        paths['node_table'], 'NODE_ID', TMM.node_fields), rows=len)
+    tline_policy = run('load tline policy', lambda: tmm_backends.read_policy_table(
+        paths['tline_table'], 'TLINE_ID', TMM.tline_fields, id_is_tline=True), rows=len)
+    baseline = run('read baseline', lambda: tmm_scoring.read_baseline(input_dir),
+                   rows=lambda tables: sum(len(table) for table in tables.values()))
+    run('build baseline cache', lambda: tmm_cache.read_baseline(input_dir),
+        setup=lambda: shutil.rmtree(tmm_cache.default_cache_dir(input_dir), ignore_errors=True),
+        rows=lambda tables: sum(len(table) for table in tables.values()))
+    run('read cached baseline', lambda: tmm_cache.read_baseline(input_dir),
+        rows=lambda tables: sum(len(table) for table in tables.values()))
+    scenario = {}
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        scenario[key] = run('score {0}'.format(key), lambda: tmm_scoring.score_table(
+            key, baseline[key], node_policy, tline_policy), rows=len)
+    run('write scenario', lambda: tmm_scoring.write_scenario(scenario, output_dir),
+        rows=lambda csv_files: sum(len(table) for table in scenario.values()))
+    run('stream scenario', lambda: tmm_streaming.stream_scenario(
+        input_dir, stream_dir, node_policy, tline_policy),
+        rows=lambda csv_files: sum(len(table) for table in baseline.values()))
+
+    # Incremental build, after changing a share of each policy table
+    changed_node_policy = _change_policy(node_policy)
+    changed_tline_policy = _change_policy(tline_policy)
+    def reset_outputs():
+        tmm_scoring.write_scenario(scenario, output_dir)
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            tmm_incremental.cache_output(os.path.join(output_dir, filename), scenario[key], id_is_tline)
+        tmm_incremental.save_build_state(input_dir, output_dir, node_policy, tline_policy)
+    run('incremental build', lambda: tmm_incremental.patch_outputs(
+        input_dir, output_dir, changed_node_policy, changed_tline_policy),
+        setup=reset_outputs, rows=lambda scored_rows: sum(scored_rows))
+
+    # tmm_shp2gdb.py
+    tod_ids = [tmm_synthetic.read_tod_ids(paths['itinerary_dir'], tod) for tod in tmm_synthetic.tod_periods]
+    run('merge TOD ids', lambda: merge_all_tods(tod_ids),
+        rows=lambda tod_ids: sum(len(ids['tseg_line_ids']) for ids in tod_ids))
+    return results
+
+
+def measure(func, setup=None, repeat=1):
+    ''' Call func() repeat times, then once more to measure its peak memory
+        allocation, calling setup() before each call. Returns func()'s result,
+        the fastest time in seconds, and the peak allocation in bytes (None
+        if it couldn't be measured). '''
+    seconds = None
+    for i in range(max(repeat, 1)):
+        if setup:
+            setup()
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+
+    if setup:
+        setup()
+    peak_bytes = None
+    if tracemalloc:
+        tracemalloc.start()
+        try:
+            result = func()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    else:
+        start_rss = tmm_instrument.peak_rss()
+        result = func()
+        if start_rss is not None:
+            peak_bytes = tmm_instrument.peak_rss() - start_rss
+    return result, seconds, peak_bytes
+
+
+def merge_all_tods(tod_ids):
+    ''' Dedup the IDs of every TOD in order, as tmm_shp2gdb.py does. Returns
+        the list of TOD IDs merged. '''
+    unique_tlines = set()
+    unique_nodes = set()
+    for ids in tod_ids:
+        tmm_network.merge_tod_ids(ids, unique_tlines, unique_nodes)
+    return tod_ids
+
+
+def print_results(results):
+    ''' Print a table of benchmark results. '''
+    print('{0:>6}  {1:<20} {2:>10} {3:>10} {4:>10}'.format('scale', 'stage', 'rows', 'seconds', 'peak MB'))
+    for result in results:
+        print('{0:>6g}  {1:<20} {2:>10} {3:>10.3f} {4:>10}'.format(
+            result['scale'], result['stage'],
+            result['rows'] if result['rows'] is not None else '',
+            result['seconds'],
+            '{0:.1f}'.format(result['peak_bytes'] / 1048576.0) if result['peak_bytes'] is not None else '',
+        ))
+
+
+def _change_policy(policy):
+    ''' Return a copy of a policy AttrTable with its first policy field
+        incremented in an evenly spaced share of its rows. '''
+    changed = policy.copy()
+    field = policy.fields[0]
+    column = policy.columns[field].copy()
+    step = max(int(1 / changed_share), 1)
+    column[::step] += 1
+    changed.columns[field] = column
+    return changed
+
+
+# -----------------------------------------------------------------------------
+#  Run the benchmarks.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the TMM scripts against synthetic networks.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1], help='network sizes, as multiples of CMAP\'s (default: 1)')
+    parser.add_argument('--repeat', type=int, default=1, help='timed repetitions of each stage (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic networks')
+    parser.add_argument('--workdir', help='directory to write the synthetic networks to (default: a temporary directory)')
+    parser.add_argument('--json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    work_root = args.workdir or tempfile.mkdtemp(prefix='tmm_benchmark_')
+    results = []
+    try:
+        for scale in args.scales:
+            scale_dir = TMM.ensure_dir(os.path.join(work_root, 'scale_{0:g}'.format(scale)))
+            results.extend(benchmark_scale(scale_dir, scale, args.repeat, args.seed))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'repeat': args.repeat, 'seed': args.seed, 'results': results}, json_file, indent=2)
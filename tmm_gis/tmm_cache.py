@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+'''
+    tmm_cache.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module caches the parsed baseline batchin CSVs as binary columns,
+    so that they only need to be parsed once rather than on every build.
+
+    Each CSV is cached in its own subdirectory of the cache directory (by
+    default input\\tmm_cache), as a .npy file per column plus one for the
+    parsed IDs, and a JSON file recording the CSV's size, mtime and SHA-1
+    content hash. The .npy files are memory-mapped when read, so any number
+    of runs and worker processes can share them without copying them. A
+    cache is rebuilt in a temporary directory named for the process, and
+    the cache it replaces is moved aside until no run still has it mapped.
+
+    A cached CSV is used as long as its size & mtime are unchanged, or its
+    content hash is (e.g. if it was merely touched or copied). Otherwise it
+    is re-parsed and its cache rebuilt automatically. If the cache can't be
+    written (e.g. the input directory is read-only), the parsed CSV is used
+    uncached.
+
+    Each CSV's neutral scoring (every row scored with no policy set; see
+    tmm_scoring.neutral_table()) is cached the same way, in a neutral_
+    subdirectory, and is also rebuilt whenever tmm_scoring.py changes. A
+    scenario's sparse policy overlay is then applied to it by re-scoring
+    only the rows in the overlay.
+
+    Finished scenario outputs are also stored, by default in
+    input\\tmm_cache\\scenarios, in a subdirectory named by the scenario's
+    fingerprint: a SHA-1 hash of its policy tables' contents, the baseline
+    CSVs' content hashes, and the scoring parameters & formulas in
+    tmm_scoring.py. When a scenario with the same fingerprint is built
+    again, its stored outputs are copied into the output directory instead
+    of being recomputed. (They are copied rather than linked, so that
+    editing an output in place can never alter the stored scenario.) The
+    least recently used scenarios are evicted whenever the store grows
+    beyond its size cap.
+
+'''
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import tmm_scoring
+
+cache_dir_name = 'tmm_cache'
+meta_file_name = 'meta.json'
+hash_block_size = 1048576  # Bytes read at a time when hashing a CSV
+store_dir_name = 'scenarios'
+neutral_dir_prefix = 'neutral_'  # Cache subdirectories of neutral-scored CSVs
+default_store_bytes = 2 * 1024 ** 3  # Size cap of the scenario store
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def baseline_digests(input_dir, cache_dir=None):
+    ''' Return the SHA-1 digest of each baseline CSV in a directory, keyed as
+        in tmm_scoring.baseline_csvs, taken from the cache where it's still
+        valid rather than re-reading the CSV. '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir(input_dir)
+    digests = {}
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        csv_file_path = os.path.join(input_dir, filename)
+        meta = _valid_meta(csv_file_path, os.path.join(cache_dir, os.path.splitext(filename)[0]), id_is_tline)
+        digests[key] = meta['sha1'] if meta else file_digest(csv_file_path)
+    return digests
+
+
+def default_cache_dir(input_dir):
+    ''' Return the default cache directory for a directory of baseline
+        CSVs. '''
+    return os.path.join(input_dir, cache_dir_name)
+
+
+def default_store_dir(input_dir):
+    ''' Return the default scenario store for a directory of baseline
+        CSVs. '''
+    return os.path.join(default_cache_dir(input_dir), store_dir_name)
+
+
+def evict_scenarios(store_dir, max_bytes=default_store_bytes, keep=None):
+    ''' Delete the least recently used scenarios in a store until its total
+        size is at most max_bytes, never deleting the scenario whose
+        fingerprint is keep. Abandoned partial entries are also deleted.
+        Returns a list of the fingerprints evicted. '''
+    entries = _store_entries(store_dir)
+    total_bytes = sum(entry_bytes for used, fingerprint, entry_bytes in entries)
+    evicted = []
+    for used, fingerprint, entry_bytes in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        if fingerprint == keep:
+            continue
+        shutil.rmtree(os.path.join(store_dir, fingerprint), ignore_errors=True)
+        total_bytes -= entry_bytes
+        evicted.append(fingerprint)
+    return evicted
+
+
+def file_digest(file_path):
+    ''' Return the SHA-1 hex digest of a file's contents. '''
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as in_file:
+        block = in_file.read(hash_block_size)
+        while block:
+            digest.update(block)
+            block = in_file.read(hash_block_size)
+    return digest.hexdigest()
+
+
+def materialize_scenario(store_dir, fingerprint, output_dir):
+    ''' Copy a stored scenario's batchin CSVs into output_dir, replacing any
+        existing outputs, and mark it as recently used. Returns a list of the
+        CSVs written, or None if the scenario isn't stored. '''
+    entry_dir = os.path.join(store_dir, fingerprint)
+    meta = _read_meta(entry_dir)
+    if meta is None:
+        return None
+    csv_files = []
+    for filename in meta['files']:
+        csv_file = os.path.join(output_dir, filename)
+        csv_files.append(csv_file)
+        temp_file = csv_file + '.tmp'
+        if os.path.exists(temp_file):
+            os.remove(temp_file)  # Never write through a leftover link to another file
+        shutil.copy2(os.path.join(entry_dir, filename), temp_file)
+        tmm_scoring.replace_file(temp_file, csv_file)
+    try:
+        os.utime(os.path.join(entry_dir, meta_file_name), None)
+    except OSError:
+        pass
+    return csv_files
+
+
+def read_baseline(input_dir, cache_dir=None):
+    ''' Read all of the baseline batchin CSVs in a directory into a dictionary
+        of AttrTables, keyed as in tmm_scoring.baseline_csvs, using (and
+        updating) the cache. The columns are read-only memory maps. '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir(input_dir)
+    baseline = {}
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        baseline[key] = read_cached_table(os.path.join(input_dir, filename), id_is_tline, cache_dir)
+    return baseline
+
+
+def read_cached_table(csv_file_path, id_is_tline=False, cache_dir=None):
+    ''' Read a CSV into an AttrTable as tmm_scoring.read_csv_table() does,
+        from its cache if it's still valid, or else parsing it and caching
+        the result. '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir(os.path.dirname(csv_file_path))
+    table_dir = os.path.join(cache_dir, os.path.splitext(os.path.basename(csv_file_path))[0])
+    meta = _valid_meta(csv_file_path, table_dir, id_is_tline)
+    if meta is None:
+        table = tmm_scoring.read_csv_table(csv_file_path, id_is_tline)
+        try:
+            write_cached_table(csv_file_path, table, id_is_tline, table_dir)
+        except (IOError, OSError):
+            return table
+        meta = _read_meta(table_dir)
+    return _load_table(table_dir, meta)
+
+
+def read_neutral_table(key, csv_file_path, id_is_tline=False, cache_dir=None):
+    ''' Return the tmm_scoring.neutral_table() of a baseline CSV (identified
+        by its key in tmm_scoring.baseline_csvs) from its cache if it's still
+        valid for the CSV and the scoring formulas, or else score the cached
+        baseline and cache the result. '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir(os.path.dirname(csv_file_path))
+    table_dir = os.path.join(cache_dir, neutral_dir_prefix + os.path.splitext(os.path.basename(csv_file_path))[0])
+    scoring = scoring_digest()
+    meta = _valid_meta(csv_file_path, table_dir, id_is_tline)
+    if meta is None or meta.get('scoring') != scoring:
+        table = tmm_scoring.neutral_table(key, read_cached_table(csv_file_path, id_is_tline, cache_dir))
+        try:
+            write_cached_table(csv_file_path, table, id_is_tline, table_dir, {'scoring': scoring})
+        except (IOError, OSError):
+            return table
+        meta = _read_meta(table_dir)
+    return _load_table(table_dir, meta)
+
+
+def scenario_fingerprint(node_policy, tline_policy, digests, sparse=False):
+    ''' Return the SHA-1 hex fingerprint of a scenario: the contents of its
+        (node_policy, tline_policy) AttrTables, whether they are sparse (see
+        tmm_gdb2csv.py --sparse), the baseline CSV digests (from
+        baseline_digests()), and the scoring parameters and source code. '''
+    fingerprint = hashlib.sha1()
+    if sparse:
+        fingerprint.update(b'sparse')
+    for policy in (node_policy, tline_policy):
+        fingerprint.update(json.dumps(list(policy.fields)).encode('utf-8'))
+        if policy.ids.dtype.kind in ('U', 'S', 'O'):
+            fingerprint.update(u'\n'.join(u'{0}'.format(row_id) for row_id in policy.ids.tolist()).encode('utf-8'))
+        else:
+            fingerprint.update(policy.ids.astype('<i8').tobytes())
+        for field in policy.fields:
+            fingerprint.update(policy.columns[field].astype('<i8').tobytes())
+    fingerprint.update(json.dumps(digests, sort_keys=True).encode('utf-8'))
+    fingerprint.update(repr((
+        tmm_scoring.baseline_csvs,
+        tmm_scoring.type_fwv, tmm_scoring.max_type_value,
+        tmm_scoring.easeb_fwv, tmm_scoring.max_easeb_value,
+        tmm_scoring.prof_fwv,
+    )).encode('utf-8'))
+    fingerprint.update(scoring_digest().encode('ascii'))
+    return fingerprint.hexdigest()
+
+
+def score_cached_table(key, table, node_policy, tline_policy, input_dir, sparse=False):
+    ''' Apply a scenario's policies to one baseline AttrTable read from
+        input_dir (identified by its key in tmm_scoring.baseline_csvs). If
+        every row's ID is in the policy table, the CSV's cached neutral
+        scoring is used and only the rows with a policy set are re-scored;
+        otherwise every row is. If the policy tables are sparse, only the
+        rows in them are scored, and every other row is left as it is (as
+        scoring the full table would). Returns the adjusted AttrTable and the
+        number of rows scored. '''
+    filename, id_is_tline = dict((csv_key, (csv_filename, is_tline)) for csv_key, csv_filename, is_tline in tmm_scoring.baseline_csvs)[key]
+    policy = tline_policy if id_is_tline else node_policy
+    if sparse:
+        return tmm_scoring.score_overlay(key, table, table, policy, policy), len(policy)
+    if not tmm_scoring.match_ids(table.ids, policy.ids)[0].all():
+        return tmm_scoring.score_table(key, table, node_policy, tline_policy), len(table)
+    overlay = tmm_scoring.policy_overlay(policy)
+    neutral = read_neutral_table(key, os.path.join(input_dir, filename), id_is_tline)
+    return tmm_scoring.score_overlay(key, table, neutral, overlay, overlay), len(overlay)
+
+
+def scenario_stored(store_dir, fingerprint):
+    ''' Return whether a scenario's outputs are in a store. '''
+    return _read_meta(os.path.join(store_dir, fingerprint)) is not None
+
+
+def scoring_digest():
+    ''' Return the SHA-1 hex digest of tmm_scoring.py, which holds the scoring
+        parameters and formulas. '''
+    return file_digest(os.path.splitext(tmm_scoring.__file__)[0] + '.py')
+
+
+def store_scenario(store_dir, fingerprint, output_dir, max_bytes=default_store_bytes):
+    ''' Store the batchin CSVs in output_dir under a scenario's fingerprint
+        (unless it's already stored), then evict the least recently used
+        scenarios to keep the store within max_bytes. The CSVs are copied to
+        a temporary directory first, so a partly stored scenario is never
+        used. Returns the scenario's directory in the store. '''
+    entry_dir = os.path.join(store_dir, fingerprint)
+    if not scenario_stored(store_dir, fingerprint):
+        temp_dir = '{0}.{1}.tmp'.format(entry_dir, os.getpid())
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        try:
+            files = [filename for key, filename, id_is_tline in tmm_scoring.baseline_csvs]
+            for filename in files:
+                shutil.copy2(os.path.join(output_dir, filename), os.path.join(temp_dir, filename))
+            entry_bytes = sum(os.path.getsize(os.path.join(temp_dir, filename)) for filename in files)
+            _write_meta(temp_dir, {'files': files, 'bytes': entry_bytes, 'stored': time.time()})
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.rename(temp_dir, entry_dir)
+        except (IOError, OSError):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not scenario_stored(store_dir, fingerprint):  # Unless another run stored it first
+                raise
+    evict_scenarios(store_dir, max_bytes, keep=fingerprint)
+    return entry_dir
+
+
+def write_cached_table(csv_file_path, table, id_is_tline, table_dir, extra_meta=None):
+    ''' Cache a CSV's parsed (or scored) AttrTable in a directory, replacing
+        any previous cache of it, along with any extra_meta to be recorded.
+        The cache is written to a temporary directory (named for this
+        process) first, so a partly-written cache is never read, and the
+        cache it replaces is only deleted once no run is using it. Raises
+        IOError or OSError if the cache can't be swapped into place. '''
+    csv_stat = os.stat(csv_file_path)
+    meta = {
+        'size': csv_stat.st_size,
+        'mtime': csv_stat.st_mtime,
+        'sha1': file_digest(csv_file_path),
+        'id_is_tline': id_is_tline,
+        'fields': list(table.fields),
+        'rows': len(table),
+    }
+    meta.update(extra_meta or {})
+    _remove_stale_dirs(table_dir)
+    temp_dir = '{0}.{1}.tmp'.format(table_dir, os.getpid())
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+    old_dir = '{0}.{1}.old'.format(table_dir, os.getpid())
+    try:
+        np.save(os.path.join(temp_dir, 'ids.npy'), table.ids)
+        for i, field in enumerate(table.fields):
+            np.save(os.path.join(temp_dir, 'column_{0}.npy'.format(i)), table.columns[field])
+        _write_meta(temp_dir, meta)
+
+        # Move the old cache aside rather than deleting it, since other runs
+        # may still have its columns mapped (which Windows won't delete)
+        if os.path.exists(table_dir):
+            os.rename(table_dir, old_dir)
+        os.rename(temp_dir, table_dir)
+    except (IOError, OSError):
+        # e.g. another run swapped in its own cache first: keep whichever
+        # cache is in place, and let the caller use its table uncached
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if os.path.exists(old_dir) and not os.path.exists(table_dir):
+            os.rename(old_dir, table_dir)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)  # Or on a later write, once it's released
+    return table_dir
+
+
+def _load_table(table_dir, meta):
+    ''' Memory-map a cached AttrTable. (Empty arrays can't be mapped, so they
+        are simply read.) '''
+    mmap_mode = 'r' if meta['rows'] else None
+    ids = np.load(os.path.join(table_dir, 'ids.npy'), mmap_mode=mmap_mode)
+    columns = {}
+    for i, field in enumerate(meta['fields']):
+        columns[field] = np.load(os.path.join(table_dir, 'column_{0}.npy'.format(i)), mmap_mode=mmap_mode)
+    return tmm_scoring.AttrTable(ids, list(meta['fields']), columns)
+
+
+def _read_meta(table_dir):
+    ''' Read a cached table's metadata, or return None if there is none (or
+        it can't be read). '''
+    meta_file = os.path.join(table_dir, meta_file_name)
+    if not os.path.exists(meta_file):
+        return None
+    try:
+        with open(meta_file, 'r') as json_file:
+            return json.load(json_file)
+    except ValueError:
+        return None
+
+
+def _remove_stale_dirs(table_dir):
+    ''' Delete the caches moved aside by earlier writes of a cached table, if
+        they are no longer in use, and any temporary directories abandoned by
+        runs that failed. '''
+    parent_dir, name = os.path.split(table_dir)
+    if not os.path.isdir(parent_dir):
+        return
+    for sibling in os.listdir(parent_dir):
+        sibling_dir = os.path.join(parent_dir, sibling)
+        if not sibling.startswith(name + '.'):
+            continue
+        if sibling.endswith('.old'):
+            shutil.rmtree(sibling_dir, ignore_errors=True)
+        elif sibling.endswith('.tmp') and os.path.getmtime(sibling_dir) < time.time() - 86400:  # Not still being written
+            shutil.rmtree(sibling_dir, ignore_errors=True)
+
+
+def _store_entries(store_dir):
+    ''' List the scenarios in a store as (last used, fingerprint, bytes)
+        tuples, deleting any abandoned temporary directories. '''
+    if not os.path.isdir(store_dir):
+        return []
+    entries = []
+    for name in os.listdir(store_dir):
+        entry_dir = os.path.join(store_dir, name)
+        if name.endswith('.tmp'):
+            if os.path.getmtime(entry_dir) < time.time() - 86400:  # Not still being written
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            continue
+        meta = _read_meta(entry_dir)
+        if meta is not None:
+            entries.append((os.path.getmtime(os.path.join(entry_dir, meta_file_name)), name, meta['bytes']))
+    return entries
+
+
+def _valid_meta(csv_file_path, table_dir, id_is_tline):
+    ''' Return the metadata of a CSV's cache if it's still valid, or else
+        None. If only the CSV's mtime has changed, its cache is still valid
+        and its recorded mtime is updated, if it can be. '''
+    meta = _read_meta(table_dir)
+    if meta is None or meta['id_is_tline'] != id_is_tline:
+        return None
+    csv_stat = os.stat(csv_file_path)
+    if csv_stat.st_size != meta['size']:
+        return None
+    if csv_stat.st_mtime != meta['mtime']:
+        if file_digest(csv_file_path) != meta['sha1']:
+            return None
+        meta['mtime'] = csv_stat.st_mtime
+        try:
+            _write_meta(table_dir, meta)
+        except (IOError, OSError):
+            pass
+    return meta
+
+
+def _write_meta(table_dir, meta):
+    ''' Write a cached table's metadata, via a temporary file so that a
+        reader never sees it partly written. '''
+    meta_file = os.path.join(table_dir, meta_file_name)
+    temp_file = '{0}.{1}.tmp'.format(meta_file, os.getpid())
+    with open(temp_file, 'w') as json_file:
+        json.dump(meta, json_file, indent=2, sort_keys=True)
+    try:
+        tmm_scoring.replace_file(temp_file, meta_file)
+    except (IOError, OSError):
+        os.remove(temp_file)
+        raise
+    return table_dir
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+'''
+    tmm_diff.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This script summarizes how one or more scenarios' batchin CSVs differ
+    from the baseline CSVs, e.g.:
+
+        python tmm_diff.py output\\wifi_metra output\\shelters_info
+
+    Each scenario CSV is joined to its baseline CSV on their IDs (sorted,
+    then matched by binary search), and the change in every extra attribute
+    (@bstyp, @rsinf, @rspac, @easeb, @prof1-3, @relim, etc.) is calculated
+    for every node or tline. The changes are then totalled:
+      - for all rows ('all');
+      - by mode ('mode'): the first character of a tline ID, or 'bus'/'rail'
+        for nodes;
+      - by tline ID prefix ('prefix'), of --prefix-length characters;
+      - by TOD ('tod'), if the scenario directory contains the TOD outputs
+        written by tmm_gdb2csv.py --tod (Scenario_101 - Scenario_108).
+
+    The summary has a row per scenario, CSV, attribute and group, with the
+    number of rows compared, the number changed, and the total, mean, minimum
+    and maximum change. Rows that were added or removed are counted in the
+    'all' rows. The summary is printed, or written to a CSV with --out.
+
+'''
+import argparse
+import csv
+import os
+import numpy as np
+import TMM
+import tmm_cache
+import tmm_scoring
+import tmm_tod
+
+summary_fields = (
+    'scenario', 'table', 'attribute', 'group_by', 'group',
+    'rows', 'changed', 'total_change', 'mean_change', 'min_change', 'max_change',
+    'added', 'removed',
+)
+default_prefix_length = 3
+tod_periods = (1, 2, 3, 4, 5, 6, 7, 8)  # As in tmm_shp2gdb.py
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def diff_scenario(baseline, scenario_dir, prefix_length=default_prefix_length, scen=100):
+    ''' Compare a scenario's CSVs with a dictionary of baseline AttrTables.
+        Returns a list of summary rows (dictionaries keyed by
+        summary_fields). '''
+    scenario_name = os.path.basename(os.path.normpath(scenario_dir))
+    tod_ids = read_tod_ids(scenario_dir, scen)
+    summary = []
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        scenario_table = tmm_scoring.read_csv_table(os.path.join(scenario_dir, filename), id_is_tline)
+        ids, changes, added, removed = diff_table(baseline[key], scenario_table)
+        groupings = group_labels(key, ids, id_is_tline, prefix_length)
+        for attribute in sorted(changes):
+            rows = summarize_changes(changes[attribute], groupings)
+            for tod in sorted(tod_ids):
+                in_tod, _ = tmm_scoring.match_ids(ids, tod_ids[tod][key])
+                tod_rows = summarize_changes(changes[attribute][in_tod], {'tod': np.array([str(tod)] * in_tod.sum())})
+                rows.extend(tod_rows)
+            for row in rows:
+                row.update({'scenario': scenario_name, 'table': key, 'attribute': attribute})
+                if row['group_by'] == 'all':
+                    row.update({'added': added, 'removed': removed})
+            summary.extend(rows)
+    return summary
+
+
+def diff_table(baseline_table, scenario_table):
+    ''' Join a scenario AttrTable to its baseline AttrTable on their IDs,
+        by sorting both (a stable sort, near-linear for CSVs already in ID
+        order) and finding each scenario ID in the baseline's with a binary
+        search. Returns the joined IDs (sorted), a dictionary of the change in
+        each numeric attribute for the joined rows, and the numbers of
+        scenario rows added and baseline rows removed. '''
+    base_order = np.argsort(baseline_table.ids, kind='mergesort')
+    scen_order = np.argsort(scenario_table.ids, kind='mergesort')
+    base_ids = baseline_table.ids[base_order]
+    scen_ids = scenario_table.ids[scen_order]
+
+    found, pos = tmm_scoring.match_ids(scen_ids, base_ids)
+    ids = scen_ids[found]
+    scen_rows = scen_order[found]
+    base_rows = base_order[pos[found]]
+    added = int(len(scen_ids) - found.sum())
+    removed = int(len(base_ids) - found.sum())
+
+    changes = {}
+    id_field = baseline_table.fields[0]
+    for field in baseline_table.fields:
+        if field == id_field or field not in scenario_table.columns:
+            continue
+        base_values = _numeric(baseline_table.columns[field][base_rows])
+        scen_values = _numeric(scenario_table.columns[field][scen_rows])
+        if base_values is not None and scen_values is not None:
+            changes[field] = scen_values - base_values
+    return ids, changes, added, removed
+
+
+def group_labels(key, ids, id_is_tline, prefix_length=default_prefix_length):
+    ''' Return a dictionary of the group labels of each ID, by grouping. '''
+    groupings = {'all': np.array(['all'] * len(ids))}
+    if id_is_tline:
+        ids = ids.astype('U')
+        groupings['mode'] = ids.astype('U1')
+        groupings['prefix'] = ids.astype('U{0}'.format(prefix_length))
+    else:
+        groupings['mode'] = np.array([key] * len(ids))
+    return groupings
+
+
+def print_summary(summary):
+    ''' Print a summary's non-zero rows as a table. '''
+    print('{0:<16} {1:<6} {2:<8} {3:<7} {4:<8} {5:>7} {6:>7} {7:>10} {8:>9}'.format(
+        'scenario', 'table', 'attr', 'by', 'group', 'rows', 'changed', 'total', 'mean'))
+    for row in summary:
+        if row['changed'] or row['added'] or row['removed']:
+            print('{0:<16} {1:<6} {2:<8} {3:<7} {4:<8} {5:>7} {6:>7} {7:>10.2f} {8:>9.4f}'.format(
+                row['scenario'][:16], row['table'], row['attribute'], row['group_by'], row['group'][:8],
+                row['rows'], row['changed'], row['total_change'], row['mean_change']))
+
+
+def read_tod_ids(scenario_dir, scen=100):
+    ''' Read the IDs of each TOD's outputs in a scenario directory (see
+        tmm_tod.py), if there are any. Returns a dictionary keyed by TOD of
+        dictionaries of sorted ID arrays, keyed as in
+        tmm_scoring.baseline_csvs. '''
+    tod_ids = {}
+    for tod in tod_periods:
+        tod_dir = tmm_tod.tod_output_dir(scenario_dir, scen, tod)
+        if not os.path.isdir(tod_dir):
+            continue
+        tod_ids[tod] = {}
+        for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+            with tmm_scoring.open_csv(os.path.join(tod_dir, filename), 'r') as tod_csv:
+                reader = csv.reader(tod_csv)
+                next(reader)
+                ids = [row[0] for row in reader if row]
+            tod_ids[tod][key] = np.unique(tmm_scoring.id_array(ids, id_is_tline))
+    return tod_ids
+
+
+def summarize_changes(changes, groupings):
+    ''' Total an array of changes by each grouping of group labels. Returns a
+        list of summary rows, in order of grouping and then group. '''
+    rows = []
+    for group_by in sorted(groupings, key=lambda group_by: (group_by != 'all', group_by)):
+        labels = groupings[group_by]
+        groups, inverse = np.unique(labels, return_inverse=True)
+        if not len(groups):
+            continue
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse, minlength=len(groups))
+        changed = np.bincount(inverse, weights=(changes != 0), minlength=len(groups))
+        totals = np.bincount(inverse, weights=changes, minlength=len(groups))
+
+        # Min & max of each group, from the changes sorted by group
+        order = np.argsort(inverse, kind='mergesort')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        mins = np.minimum.reduceat(changes[order], starts)
+        maxes = np.maximum.reduceat(changes[order], starts)
+
+        for i, group in enumerate(groups.tolist()):
+            rows.append({
+                'group_by': group_by,
+                'group': group,
+                'rows': int(counts[i]),
+                'changed': int(changed[i]),
+                'total_change': round(float(totals[i]), 6),
+                'mean_change': round(float(totals[i]) / int(counts[i]), 6),
+                'min_change': round(float(mins[i]), 6),
+                'max_change': round(float(maxes[i]), 6),
+                'added': '',
+                'removed': '',
+            })
+    return rows
+
+
+def write_summary(summary, csv_file):
+    ''' Write a list of summary rows to a CSV. '''
+    with tmm_scoring.open_csv(csv_file, 'w') as summary_csv:
+        writer = csv.writer(summary_csv)
+        writer.writerow(summary_fields)
+        for row in summary:
+            writer.writerow([row[field] for field in summary_fields])
+    return csv_file
+
+
+def _numeric(column):
+    ''' Convert a text column to floats, or return None if any of its values
+        aren't numbers. '''
+    try:
+        return column.astype(float)
+    except ValueError:
+        return None
+
+
+# -----------------------------------------------------------------------------
+#  Compare the scenarios.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize how scenario batchin CSVs differ from the baseline CSVs.')
+    parser.add_argument('scenario_dirs', nargs='+', help='directories of scenario CSVs')
+    parser.add_argument('--baseline', default=TMM.input_dir, help='directory of baseline CSVs (default: TMM input directory)')
+    parser.add_argument('--prefix-length', type=int, default=default_prefix_length, help='characters of tline ID to group by (default: {0})'.format(default_prefix_length))
+    parser.add_argument('--out', help='CSV to write the summary to (default: print it)')
+    args = parser.parse_args()
+
+    baseline = tmm_cache.read_baseline(args.baseline)
+    summary = []
+    for scenario_dir in args.scenario_dirs:
+        summary.extend(diff_scenario(baseline, scenario_dir, args.prefix_length))
+
+    if args.out:
+        write_summary(summary, args.out)
+    else:
+        print_summary(summary)
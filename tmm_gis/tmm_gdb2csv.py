@@ -2,306 +2,269 @@
 '''
     tmm_gdb2csv.py
     Author: npeterson
-    Revised: 4/9/2015
+    Revised: 10/17/2026
     ---------------------------------------------------------------------------
     This script will use the extra attribute tables in TMM_GIS.gdb to create
     updated versions of the batchin CSVs used to construct the transit network
     for the Transit Modernization Model. A new network can then be constructed
     using the altered batchin files to model the transit improvements.
 
+    The scoring formulas are stored in tmm_scoring.py. Outputs are patched
+    rather than rebuilt when only a few policies have changed (see
+    tmm_incremental.py), and reused from the scenario store when an
+    identical scenario was built before (see tmm_cache.py). Run with --help
+    for the options, e.g. for other policy tables or TOD outputs.
+
 '''
+import argparse
 import os
 import sys
-import arcpy
-import csv
+from multiprocessing.pool import ApplyResult, ThreadPool
 import TMM
+import tmm_backends
+import tmm_cache
+import tmm_incremental
+import tmm_instrument
+import tmm_scoring
+import tmm_streaming
+import tmm_tod
 
 # -----------------------------------------------------------------------------
 #  Set parameters.
 # -----------------------------------------------------------------------------
-input_dir = TMM.input_dir
-output_dir = TMM.ensure_dir(TMM.output_dir)
-
 scen = 100  # Year 2010
 tod_periods = range(1, 9)  # 1-8
-
-tline_table = os.path.join(TMM.gdb, 'extra_attr_tlines')
-node_table = os.path.join(TMM.gdb, 'extra_attr_nodes')
-
-bus_node_attr_csv_in = os.path.join(input_dir, 'bus_node_extra_attributes.csv')
-rail_node_attr_csv_in = os.path.join(input_dir, 'rail_node_extra_attributes.csv')
-tline_easeb_csv_in = os.path.join(input_dir, 'boarding_ease_by_line_id.csv')
-tline_prof_csv_in = os.path.join(input_dir, 'productivity_bonus_by_line_id.csv')
-tline_relim_csv_in = os.path.join(input_dir, 'relim_by_line_id.csv')
-
-bus_node_attr_csv_out = bus_node_attr_csv_in.replace(input_dir, output_dir)
-rail_node_attr_csv_out = rail_node_attr_csv_in.replace(input_dir, output_dir)
-tline_easeb_csv_out = tline_easeb_csv_in.replace(input_dir, output_dir)
-tline_prof_csv_out = tline_prof_csv_in.replace(input_dir, output_dir)
-tline_relim_csv_out = tline_relim_csv_in.replace(input_dir, output_dir)
+load_threads = 7  # Inputs read at once: 2 policy tables & 5 baseline CSVs
 
 
 # -----------------------------------------------------------------------------
 #  Define functions.
 # -----------------------------------------------------------------------------
-def adjust_easeb_value(tline_id, tline_dict, csv_dict):
-    ''' Create a composite score from a subset of the GDB tline table's fields,
-        to provide a boost to the @easeb extra attribute. '''
-    # Get current easeb value
-    current_easeb_value = float(csv_dict[tline_id]['@easeb'])
-    max_easeb_value = 4.0  # 3 = 'level w/ platform'
-
-    # Update easeb values for tlines in GDB that could be improved
-    if tline_id in tline_dict and current_easeb_value < max_easeb_value:
-
-        # Set field scale factors (1 / maximum field value) & score weights
-        field_fwv = {
-            'ADD_STAND_CAP': {'f': 1.0/5, 'w': 1.0},
-            'LOWER_FLOOR':   {'f': 1.0/3, 'w': 1.0},
-            'NEW_VEHICLES':  {'f': 1.0/5, 'w': 1.0},
-        }
-
-        # Get current field values
-        for attr in field_fwv.iterkeys():
-            field_fwv[attr]['v'] = float(tline_dict[tline_id][attr])
-
-        # Calculate node's improvement score (0-2)
-        node_improvement = sum([field_fwv[attr]['v'] * field_fwv[attr]['f'] * field_fwv[attr]['w'] for attr in field_fwv.iterkeys()])
-        max_improvement = sum([field_fwv[attr]['w'] for attr in field_fwv.iterkeys()])
-        pct_improvement = node_improvement / max_improvement
-
-        # Calculate adjusted easeb value
-        max_adjustment = max_easeb_value - current_easeb_value
-        adjustment = max_adjustment * pct_improvement  # The higher the current @easeb, the harder it is to improve
-        adjusted_easeb_value = round(current_easeb_value + adjustment, 2)  # NOT AN INTEGER
-
-        # Set adjusted easeb value
-        csv_dict[tline_id]['@easeb'] = str(adjusted_easeb_value)
-        return str(adjusted_easeb_value)
-
-    # Ignore tlines not in GDB and maxed-out-@easeb tlines
-    else:
-        return str(current_easeb_value)
-
-
-def adjust_info_value(node_id, node_dict, csv_dict, info_field):
-    ''' Check existing real-time info value and update if appropriate. '''
-    # Get current real-time info (@bsinf/@rsinf) value
-    current_info_value = csv_dict[node_id][info_field]
-
-    # Update info values for nodes in GDB w/o real-time info already
-    if node_id in node_dict and current_info_value != '2':
-        add_info = node_dict[node_id]['ADD_INFO']
-        add_pa = node_dict[node_id]['ADD_PA']
-        if add_info + add_pa > 0:
-            adjusted_info_value = '2'
+def build_outputs(input_dir, output_dir, node_table, tline_table, full_build=False, stream=False, tod=False, report=None, store_dir=None, threads=load_threads, sparse=False):
+    ''' Build a scenario's batchin CSVs in output_dir from the baseline CSVs in
+        input_dir and a pair of policy tables, reusing the stored outputs of
+        an identical scenario or patching the previous outputs if possible
+        (unless full_build), streaming the baseline CSVs if stream, and also
+        writing the TOD CSVs if tod. Outputs are stored in store_dir (by
+        default the input directory's scenario store), or not if it's False.
+        All seven inputs are read at once by a pool of up to threads threads
+        (see load_inputs()), except the baseline CSVs if stream. If sparse,
+        the policy tables need only hold the rows with a policy set, and
+        every other node & tline keeps its baseline values.
+        Returns the number of (node, tline) CSV rows re-scored if the outputs
+        were patched (or (0, 0) if they were reused), or else None. '''
+    if sparse and stream:
+        raise ValueError('Sparse policy tables cannot be streamed.')
+    pool = ThreadPool(max(threads, 1))
+    try:
+        # Read every input at once. The baseline CSVs are memory-mapped from
+        # their cache, so they cost next to nothing if the outputs are then
+        # reused or patched (which a stale cache would rule out anyway)
+        inputs = load_inputs(input_dir, node_table, tline_table, pool, read_baseline=not stream, report=report)
+        return _build_outputs(input_dir, output_dir, pool, inputs, full_build, stream, tod, report, store_dir, sparse)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def build_scenario(policy_tables, baseline, out_dir, report=None, input_dir=None, sparse=False):
+    ''' Apply a scenario's (node_policy, tline_policy) AttrTables to a
+        dictionary of baseline AttrTables (e.g. from tmm_cache.read_baseline)
+        and write its batchin CSVs to out_dir. Any of the tables may instead
+        be the pending result of load_inputs(), in which case each CSV is
+        scored as soon as the tables it needs are loaded (the node CSVs
+        first). If the baseline was read from input_dir, each CSV whose IDs
+        are all in its policy table is built from its cached neutral scoring,
+        re-scoring only the rows with a policy set (or if the policy tables
+        are sparse, only the rows in them). Returns the dictionary of
+        adjusted AttrTables. '''
+    node_policy, tline_policy = policy_tables
+    scenario = {}
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        # Each CSV is adjusted by one policy table: wait for only that one
+        if id_is_tline:
+            tline_policy = _resolve(tline_policy)
         else:
-            adjusted_info_value = current_info_value
-
-        # Set adjusted info value
-        csv_dict[node_id][info_field] = adjusted_info_value
-        adjusted_info_value = current_info_value
-        return adjusted_info_value
-
-    # Ignore nodes not in GDB or w/ real-time info already
-    else:
-        return current_info_value
-
-
-def adjust_prof_values(tline_id, tline_dict, csv_dict):
-    ''' Check existing productivity bonus values and update if appropriate. '''
-    # Get current @prof1-3 values
-    current_prof1_value = float(csv_dict[tline_id]['@prof1'])
-    current_prof2_value = float(csv_dict[tline_id]['@prof2'])
-    current_prof3_value = float(csv_dict[tline_id]['@prof3'])
-    current_prof_values = (str(current_prof1_value), str(current_prof2_value), str(current_prof3_value))
-
-    # Update @prof1-3 values for tlines in GDB
-    if tline_id in tline_dict:
-
-        # Set field scale factors (1 / maximum field value) & bonus weights
-        field_fwv = {
-            'ADD_WIFI':  {'f': 1.0/1, 'w': 0.05},
-            'IMP_SEATS': {'f': 1.0/5, 'w': 0.05},
-        }
-
-        # Get current field values
-        for attr in field_fwv.iterkeys():
-            field_fwv[attr]['v'] = int(tline_dict[tline_id][attr])
-
-        # Calculate productivity bonuses
-        wifi_bonus = field_fwv['ADD_WIFI']['v'] * field_fwv['ADD_WIFI']['f'] * field_fwv['ADD_WIFI']['w']
-        seat_bonus = field_fwv['IMP_SEATS']['v'] * field_fwv['IMP_SEATS']['f'] * field_fwv['IMP_SEATS']['w']
-        productivity_bonus = wifi_bonus + seat_bonus
-
-        # Set adjusted @prof1-3 values
-        adjusted_prof1_value = round(current_prof1_value - productivity_bonus, 2)
-        adjusted_prof2_value = round(current_prof2_value - productivity_bonus, 2)
-        adjusted_prof3_value = round(current_prof3_value - productivity_bonus, 2)
-        csv_dict[tline_id]['@prof1'] = str(adjusted_prof1_value)
-        csv_dict[tline_id]['@prof2'] = str(adjusted_prof2_value)
-        csv_dict[tline_id]['@prof3'] = str(adjusted_prof3_value)
-        adjusted_prof_values = (str(adjusted_prof1_value), str(adjusted_prof2_value), str(adjusted_prof3_value))
-
-        return adjusted_prof_values
-
-    # Ignore tlines not in GDB
-    else:
-        return current_prof_values
-
-
-def adjust_relim_value(tline_id, tline_dict, csv_dict):
-    ''' Decrease reliability impact in proportion to specified reliability improvement. '''
-    # Get current reliability impact (@relim) value
-    current_relim_value = float(csv_dict[tline_id]['@relim'])
-
-    # Caluclate the updated value for tlines in GDB
-    if tline_id in tline_dict:
-        imp_rel_int = tline_dict[tline_id]['IMP_RELIABILITY']
-        imp_rel_pct = imp_rel_int / 100.0
-        adjusted_relim_value = round(current_relim_value * (1.0 - imp_rel_pct), 2)
-        csv_dict[tline_id]['@relim'] = adjusted_relim_value
-
-        return str(adjusted_relim_value)
-
-    # Ignore tlines not in GDB
-    else:
-        return str(current_relim_value)
-
-
-def adjust_rspac_value(node_id, node_dict, csv_dict):
-    ''' Add new parking spaces to nodes. RAIL STATIONS ONLY! '''
-    # Get current parking spaces (@rspac) count
-    current_rspac_value = int(csv_dict[node_id]['@rspac'])
-
-    # Caluclate the updated value for nodes in GDB
-    if node_id in node_dict:
-        new_parking = node_dict[node_id]['ADD_PARKING']
-        adjusted_rspac_value = max(current_rspac_value + new_parking, 0)  # Don't allow net-negative values
-        csv_dict[node_id]['@rspac'] = adjusted_rspac_value
-
-        return str(adjusted_rspac_value)
-
-    # Ignore nodes not in GDB
-    else:
-        return str(current_rspac_value)
-
-
-def adjust_type_value(node_id, node_dict, csv_dict, type_field):
-    ''' Create a composite score from a subset of the GDB node table's fields,
-        to provide a boost to the @bstyp/@rstyp extra attributes. '''
-    # Get current type value
-    current_type_value = float(csv_dict[node_id][type_field])
-    max_type_value = 6.0  # 5 = 'major terminal'
-
-    # Update station/stop type (@bstyp/@rstyp) values for nodes in GDB that could be improved
-    if node_id in node_dict and current_type_value < max_type_value:
-
-        # Set field scale factors (1 / maximum field value) & score weights
-        field_fwv = {
-            'ADD_ADA':      {'f': 1.0/1, 'w': 1.0},
-            'ADD_RETAIL':   {'f': 1.0/1, 'w': 1.0},
-            'ADD_SEATS':    {'f': 1.0/5, 'w': 1.0},
-            'ADD_SEC_CAM':  {'f': 1.0/5, 'w': 1.0},
-            'ADD_SHELTER':  {'f': 1.0/5, 'w': 1.0},
-            'ADD_WALKWAY':  {'f': 1.0/1, 'w': 1.0},
-            'ENLARGE_AREA': {'f': 1.0/5, 'w': 1.0},
-            'FACELIFT':     {'f': 1.0/5, 'w': 1.0},
-            'IMP_LIGHTING': {'f': 1.0/5, 'w': 1.0},
-            'IMP_WARMING':  {'f': 1.0/5, 'w': 1.0},
-        }
-
-        # Get current field values
-        for attr in field_fwv.iterkeys():
-            field_fwv[attr]['v'] = float(node_dict[node_id][attr])
-
-        # Calculate node's improvement score (0-4)
-        node_improvement = sum([field_fwv[attr]['v'] * field_fwv[attr]['f'] * field_fwv[attr]['w'] for attr in field_fwv.iterkeys()])
-        max_improvement = sum([field_fwv[attr]['w'] for attr in field_fwv.iterkeys()])
-        pct_improvement = node_improvement / max_improvement
-
-        # Calculate adjusted type value
-        max_adjustment = max_type_value - current_type_value
-        adjustment = max_adjustment * pct_improvement  # The higher the current type, the harder it is to improve
-        adjusted_type_value = round(current_type_value + adjustment, 2)  # NOT AN INTEGER
-
-        # Set adjusted type value
-        csv_dict[node_id][type_field] = str(adjusted_type_value)
-        return str(adjusted_type_value)
-
-    # Ignore nodes not in GDB and maxed-out-@bstyp/@rstyp nodes
-    else:
-        return str(current_type_value)
-
-
-def make_dict_from_csv(csv_file_path, id_is_tline=False):
-    ''' Read a CSV and construct a dictionary whose keys are the first value in
-        each row and whose values are a dictionary of all row values stored by
-        fieldname keys. Also returns a list of CSV's fieldnames, in order. '''
-    csv_dict = {}
-    csv_fields = []
-    with open(csv_file_path, 'r') as attr_csv:
-        dict_reader = csv.DictReader(attr_csv)
-        csv_fields.extend(dict_reader.fieldnames)
-        id_field = csv_fields[0]
-        for row_dict in dict_reader:
-            dict_id = row_dict[id_field] if id_is_tline else int(row_dict[id_field])
-            csv_dict[dict_id] = row_dict.copy()
-    return csv_dict, csv_fields
-
-
-def write_dict_to_csv(csv_file, csv_dict, csv_fields, id_is_tline=False):
-    ''' Write one of the modified CSV dictionaries and write out an updated
-        CSV file with its values. '''
-    with open(csv_file, 'wb') as attr_csv:
-        dict_writer = csv.DictWriter(attr_csv, csv_fields)
-        dict_writer.writeheader()
-        sorted_keys = sorted(csv_dict.iterkeys())
-        for dict_id in sorted_keys:
-            dict_writer.writerow(csv_dict[dict_id])
-    return csv_file
-
-
-# -----------------------------------------------------------------------------
-#  Load input GDB tables & CSVs into dictionaries.
-# -----------------------------------------------------------------------------
-tline_gdb_dict = TMM.make_attribute_dict(tline_table, 'TLINE_ID', TMM.tline_fields)
-node_gdb_dict = TMM.make_attribute_dict(node_table, 'NODE_ID', TMM.node_fields)
-
-bus_csv_dict, bus_csv_fields = make_dict_from_csv(bus_node_attr_csv_in)
-rail_csv_dict, rail_csv_fields = make_dict_from_csv(rail_node_attr_csv_in)
-easeb_csv_dict, easeb_csv_fields = make_dict_from_csv(tline_easeb_csv_in, id_is_tline=True)
-prof_csv_dict, prof_csv_fields = make_dict_from_csv(tline_prof_csv_in, id_is_tline=True)
-relim_csv_dict, relim_csv_fields = make_dict_from_csv(tline_relim_csv_in, id_is_tline=True)
-
-
-# -----------------------------------------------------------------------------
-#  Update dictionary values to reflect GDB scenario.
-# -----------------------------------------------------------------------------
-for node_id in bus_csv_dict.iterkeys():
-    adjust_type_value(node_id, node_gdb_dict, bus_csv_dict, '@bstyp')
-    adjust_info_value(node_id, node_gdb_dict, bus_csv_dict, '@bsinf')
-
-for node_id in rail_csv_dict.iterkeys():
-    adjust_type_value(node_id, node_gdb_dict, rail_csv_dict, '@rstyp')
-    adjust_info_value(node_id, node_gdb_dict, rail_csv_dict, '@rsinf')
-    adjust_rspac_value(node_id, node_gdb_dict, rail_csv_dict)
-
-for tline_id in easeb_csv_dict.iterkeys():
-    adjust_easeb_value(tline_id, tline_gdb_dict, easeb_csv_dict)
-
-for tline_id in prof_csv_dict.iterkeys():
-    adjust_prof_values(tline_id, tline_gdb_dict, prof_csv_dict)
-
-for tline_id in relim_csv_dict.iterkeys():
-    adjust_relim_value(tline_id, tline_gdb_dict, relim_csv_dict)
+            node_policy = _resolve(node_policy)
+        table = _resolve(baseline[key])
+        with tmm_instrument.stage(report, 'score {0}'.format(key), rows_in=len(table)) as stage:
+            if input_dir:
+                scenario[key], stage['rows_scored'] = tmm_cache.score_cached_table(key, table, node_policy, tline_policy, input_dir, sparse)
+            else:
+                scenario[key] = tmm_scoring.score_table(key, table, node_policy, tline_policy)
+            stage['rows_modified'] = tmm_instrument.changed_rows(table, scenario[key])
+
+    with tmm_instrument.stage(report, 'write scenario', rows_in=sum(len(table) for table in scenario.values())):
+        tmm_scoring.write_scenario(scenario, TMM.ensure_dir(out_dir))
+    return scenario
+
+
+def load_inputs(input_dir, node_table, tline_table, pool, read_baseline=True, report=None):
+    ''' Start reading the node & tline policy tables (in any tmm_backends
+        format) and, if read_baseline, the baseline CSVs (via tmm_cache) on a
+        thread pool, node inputs first. Returns a dictionary of their pending
+        results, keyed 'node_policy', 'tline_policy' and as in
+        tmm_scoring.baseline_csvs, each of which is read in its own stage. '''
+    inputs = {
+        'node_policy': pool.apply_async(_load_input, (
+            report, 'load node policy', tmm_backends.read_policy_table, (node_table, 'NODE_ID', TMM.node_fields))),
+        'tline_policy': pool.apply_async(_load_input, (
+            report, 'load tline policy', tmm_backends.read_policy_table, (tline_table, 'TLINE_ID', TMM.tline_fields, True))),
+    }
+    if read_baseline:
+        inputs.update(load_baseline(input_dir, pool, report))
+    return inputs
+
+
+def load_baseline(input_dir, pool, report=None):
+    ''' Start reading the baseline CSVs (via tmm_cache) on a thread pool,
+        node CSVs first. Returns a dictionary of their pending results, keyed
+        as in tmm_scoring.baseline_csvs, each of which is read in its own
+        stage. '''
+    cache_dir = tmm_cache.default_cache_dir(input_dir)
+    baseline = {}
+    for key, filename, id_is_tline in sorted(tmm_scoring.baseline_csvs, key=lambda csv_info: csv_info[2]):
+        baseline[key] = pool.apply_async(_load_input, (
+            report, 'read {0}'.format(key), tmm_cache.read_cached_table,
+            (os.path.join(input_dir, filename), id_is_tline, cache_dir)))
+    return baseline
+
+
+def load_policy_tables(node_table, tline_table, report=None):
+    ''' Load the node & tline policy tables (in any tmm_backends format) into
+        columnar tables. Returns (node_policy, tline_policy). '''
+    with tmm_instrument.stage(report, 'load tline policy') as stage:
+        tline_policy = tmm_backends.read_policy_table(tline_table, 'TLINE_ID', TMM.tline_fields, id_is_tline=True)
+        stage['rows_in'] = len(tline_policy)
+
+    with tmm_instrument.stage(report, 'load node policy') as stage:
+        node_policy = tmm_backends.read_policy_table(node_table, 'NODE_ID', TMM.node_fields)
+        stage['rows_in'] = len(node_policy)
+    return node_policy, tline_policy
+
+
+def _build_outputs(input_dir, output_dir, pool, inputs, full_build, stream, tod, report, store_dir, sparse):
+    ''' Run build_outputs() on inputs that are still being loaded, reading
+        any more inputs that are needed on the pool. '''
+    if store_dir is None:
+        store_dir = tmm_cache.default_store_dir(input_dir)
+
+    # Every path but a full build without the store needs both policy tables
+    # first, to check the store & build state before any baseline CSV is read
+    if store_dir or not full_build or stream:
+        node_policy, tline_policy = _resolve(inputs['node_policy']), _resolve(inputs['tline_policy'])
+    if store_dir:
+        with tmm_instrument.stage(report, 'fingerprint scenario'):
+            fingerprint = tmm_cache.scenario_fingerprint(node_policy, tline_policy, tmm_cache.baseline_digests(input_dir), sparse)
+
+    # Reuse the stored outputs of an identical scenario, if possible
+    patched_ids = None
+    if store_dir and not full_build:
+        if tmm_cache.scenario_stored(store_dir, fingerprint):
+            with tmm_instrument.stage(report, 'reuse stored scenario'):
+                tmm_incremental.clear_build_state(output_dir)
+                tmm_cache.materialize_scenario(store_dir, fingerprint, TMM.ensure_dir(output_dir))
+                tmm_incremental.save_build_state(input_dir, output_dir, node_policy, tline_policy)
+                patched_ids = (0, 0)
+        if patched_ids is not None:
+            TMM.add_message('Reused the stored outputs of scenario {0}.'.format(fingerprint[:12]))
+
+    # Otherwise, patch outputs for changed policies only, if possible
+    if patched_ids is None and not full_build:
+        with tmm_instrument.stage(report, 'incremental patch') as stage:
+            read_table = lambda key: _baseline_table(input_dir, inputs, key, report)
+            patched_ids = tmm_incremental.patch_outputs(input_dir, output_dir, node_policy, tline_policy, read_table)
+            if patched_ids is not None:
+                stage['rows_scored'] = sum(patched_ids)
+        if patched_ids is not None:
+            TMM.add_message('Re-scored {0} node CSV rows and {1} tline CSV rows.'.format(*patched_ids))
+
+    # Otherwise, update column values to reflect GDB scenario and write output CSVs
+    if patched_ids is None and stream:
+        tmm_incremental.clear_build_state(output_dir)
+        with tmm_instrument.stage(report, 'stream scenario'):
+            tmm_streaming.stream_scenario(input_dir, output_dir, node_policy, tline_policy)
+        tmm_incremental.save_build_state(input_dir, output_dir, node_policy, tline_policy)
+
+    elif patched_ids is None:
+        # Score each CSV as soon as its inputs are loaded, nodes first
+        baseline = dict((key, inputs[key]) for key, filename, id_is_tline in tmm_scoring.baseline_csvs)
+        tmm_incremental.clear_build_state(output_dir)
+        scenario = build_scenario((inputs['node_policy'], inputs['tline_policy']), baseline, output_dir, report, input_dir, sparse)
+        node_policy, tline_policy = _resolve(inputs['node_policy']), _resolve(inputs['tline_policy'])
+        with tmm_instrument.stage(report, 'cache outputs'):
+            for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+                tmm_incremental.cache_output(os.path.join(output_dir, filename), scenario[key], id_is_tline)
+        tmm_incremental.save_build_state(input_dir, output_dir, node_policy, tline_policy)
+
+    if store_dir:
+        with tmm_instrument.stage(report, 'store scenario'):
+            try:
+                tmm_cache.store_scenario(store_dir, fingerprint, output_dir)
+            except (IOError, OSError):
+                TMM.add_message('Could not store the outputs of scenario {0}.'.format(fingerprint[:12]))
+
+    # Write TOD-specific outputs, if requested
+    if tod:
+        if patched_ids is not None or stream:
+            scenario = tmm_scoring.read_baseline(output_dir)  # The outputs just written
+
+        with tmm_instrument.stage(report, 'read TOD ids') as stage:
+            tod_ids = dict((tod_period, tmm_tod.read_tod_ids(TMM.gdb, tod_period)) for tod_period in tod_periods)
+            stage['rows_in'] = sum(len(node_ids) + len(tline_ids) for node_ids, tline_ids in tod_ids.values())
+
+        with tmm_instrument.stage(report, 'write TOD scenarios'):
+            tmm_tod.write_tod_scenarios(scenario, tod_ids, output_dir, scen)
+    return patched_ids
+
+
+def _baseline_table(input_dir, inputs, key, report=None):
+    ''' Return a baseline AttrTable, waiting for it if it is being loaded, or
+        else reading it. '''
+    if key in inputs:
+        return _resolve(inputs[key])
+    filename, id_is_tline = dict((csv_key, (csv_filename, is_tline)) for csv_key, csv_filename, is_tline in tmm_scoring.baseline_csvs)[key]
+    return _load_input(report, 'read {0}'.format(key), tmm_cache.read_cached_table, (os.path.join(input_dir, filename), id_is_tline))
+
+
+def _load_input(report, name, read_function, args):
+    ''' Read an input (a policy table or baseline CSV) in its own stage. '''
+    with tmm_instrument.stage(report, name) as stage:
+        table = read_function(*args)
+        stage['rows_in'] = len(table)
+    return table
+
+
+def _resolve(value):
+    ''' Wait for & return the result of a pending load, or return an input
+        that was already loaded. '''
+    if isinstance(value, ApplyResult):
+        return value.get()
+    return value
 
 
 # -----------------------------------------------------------------------------
-#  Write output CSVs.
+#  Build the scenario.
 # -----------------------------------------------------------------------------
-write_dict_to_csv(bus_node_attr_csv_out, bus_csv_dict, bus_csv_fields)
-write_dict_to_csv(rail_node_attr_csv_out, rail_csv_dict, rail_csv_fields)
-write_dict_to_csv(tline_easeb_csv_out, easeb_csv_dict, easeb_csv_fields, id_is_tline=True)
-write_dict_to_csv(tline_prof_csv_out, prof_csv_dict, prof_csv_fields, id_is_tline=True)
-write_dict_to_csv(tline_relim_csv_out, relim_csv_dict, relim_csv_fields, id_is_tline=True)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Create scenario batchin CSVs from the TMM policy tables.',
+        epilog='The time taken and rows read & changed by each stage are written to tmm_gdb2csv_report.json in the output directory.')
+    parser.add_argument('--full', action='store_true', help='rebuild every output, instead of reusing stored outputs or patching the previous ones')
+    parser.add_argument('--stream', action='store_true', help='stream the baseline CSVs through in chunks instead of loading them whole, to bound memory use')
+    parser.add_argument('--node-table', default=os.path.join(TMM.gdb, 'extra_attr_nodes'), help='node policy table, in any tmm_backends format, e.g. GeoPackage, SQLite, CSV or Parquet (default: in TMM_GIS.gdb)')
+    parser.add_argument('--tline-table', default=os.path.join(TMM.gdb, 'extra_attr_tlines'), help='tline policy table, in any tmm_backends format (default: in TMM_GIS.gdb)')
+    parser.add_argument('--no-store', action='store_true', help="neither reuse nor store outputs in the scenario store (input\\tmm_cache\\scenarios)")
+    parser.add_argument('--tod', action='store_true', help="also write the CSVs for each TOD period to Scenario_101-108, each with only the nodes & tlines in that TOD's network")
+    parser.add_argument('--sparse', action='store_true', help='the policy tables hold only the nodes & tlines with a policy set (e.g. as exported by tmm_versions.py); all others keep their baseline values')
+    parser.add_argument('--threads', type=int, default=load_threads, help='maximum inputs to read at once (default: {0}, one per input)'.format(load_threads))
+    parser.add_argument('--profile', choices=tmm_instrument.profilers, help='profile the run, writing the profile alongside the run report')
+    args = parser.parse_args()
+
+    input_dir = TMM.input_dir
+    output_dir = TMM.ensure_dir(TMM.output_dir)
+
+    report = tmm_instrument.RunReport('tmm_gdb2csv', args.profile)
+    build_outputs(input_dir, output_dir, args.node_table, args.tline_table, args.full, args.stream, args.tod, report,
+                  store_dir=False if args.no_store else None, threads=args.threads, sparse=args.sparse)
+    report.write(output_dir)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+'''
+    tmm_incremental.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module allows tmm_gdb2csv.py to update an existing set of output
+    CSVs when only a few policies have changed, instead of rebuilding them.
+
+    Every build records a state file next to its outputs, holding a content
+    hash of each extra_attr_nodes/extra_attr_tlines row and the size & mtime
+    of every baseline input and output CSV. On the next build, the node and
+    tline IDs whose hashes changed (or that were added to or removed from the
+    policy tables) are identified, and only the output CSVs adjusted by a
+    changed table are rewritten: e.g. if only node policies changed, the
+    three tline CSVs are neither read nor written. In each rewritten CSV,
+    only the rows of the changed IDs are re-scored, and are patched into the
+    previous outputs. These are read from a binary cache of each output (in
+    output\\tmm_cache, see tmm_cache.py), so they are only parsed if the
+    cache is missing. If the baseline CSVs or the outputs have changed in
+    any other way, a full rebuild is required.
+
+'''
+import json
+import os
+import numpy as np
+import tmm_cache
+import tmm_scoring
+
+state_file_name = 'tmm_build_state.npz'
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def cache_output(csv_file, table, id_is_tline=False):
+    ''' Cache the AttrTable just written to an output CSV (see
+        tmm_cache.read_cached_table()), so that the next patch needn't parse
+        the CSV. A cache that can't be written is simply skipped. '''
+    if len(table) > 1 and not (table.ids[1:] >= table.ids[:-1]).all():
+        table = table.take(np.argsort(table.ids, kind='mergesort'))  # As written
+    table_dir = os.path.join(tmm_cache.default_cache_dir(os.path.dirname(csv_file)), os.path.splitext(os.path.basename(csv_file))[0])
+    try:
+        tmm_cache.write_cached_table(csv_file, table, id_is_tline, table_dir)
+    except (IOError, OSError):
+        pass
+    return table_dir
+
+
+def changed_ids(old_ids, old_hashes, policy, fields):
+    ''' Identify the policy table IDs that were added, removed or modified
+        since the hashes recorded in a previous build. Returns a sorted array
+        of IDs. '''
+    new_hashes = row_hashes(policy, fields)
+    found, pos = tmm_scoring.match_ids(policy.ids, old_ids)
+    modified = ~found
+    modified[found] = new_hashes[found] != old_hashes[pos[found]]
+    still_found, _ = tmm_scoring.match_ids(old_ids, policy.ids)
+    return np.union1d(policy.ids[modified], old_ids[~still_found])
+
+
+def clear_build_state(output_dir):
+    ''' Delete the build state of an output directory, which must be done
+        before its outputs are rewritten. '''
+    state_file = os.path.join(output_dir, state_file_name)
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    return state_file
+
+
+def file_stats(file_paths):
+    ''' Return a list of [size, mtime] for each of a list of files, or None
+        for any that don't exist. '''
+    stats = []
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            file_stat = os.stat(file_path)
+            stats.append([file_stat.st_size, file_stat.st_mtime])
+        else:
+            stats.append(None)
+    return stats
+
+
+def load_build_state(input_dir, output_dir, node_policy, tline_policy):
+    ''' Load the build state of an output directory, if it is still valid for
+        the current baseline CSVs, outputs and policy fields. Returns a
+        dictionary of state arrays, or None. '''
+    state_file = os.path.join(output_dir, state_file_name)
+    if not os.path.exists(state_file):
+        return None
+    with np.load(state_file) as state_npz:
+        state = dict((key, state_npz[key]) for key in state_npz.files)
+    meta = json.loads(str(state['meta']))
+    if meta != _state_meta(input_dir, output_dir, node_policy, tline_policy):
+        return None
+    return state
+
+
+def patch_outputs(input_dir, output_dir, node_policy, tline_policy, read_table=None):
+    ''' Re-score only the rows of the output CSVs in output_dir whose node or
+        tline policies changed since the last build there, patching them into
+        the previous outputs. read_table is a function returning the baseline
+        AttrTable for a key in tmm_scoring.baseline_csvs (by default, reading
+        it from input_dir's cache), and is only called for the CSVs being
+        rewritten. Returns the number of (node, tline) CSV rows re-scored, or
+        None if the outputs could not be patched and a full build is needed. '''
+    state = load_build_state(input_dir, output_dir, node_policy, tline_policy)
+    if state is None:
+        return None
+
+    node_ids = changed_ids(state['node_ids'], state['node_hashes'], node_policy, node_policy.fields)
+    tline_ids = changed_ids(state['tline_ids'], state['tline_hashes'], tline_policy, tline_policy.fields)
+    if len(node_ids) + len(tline_ids) == 0:
+        return 0, 0
+
+    # Re-score the changed rows of the CSVs adjusted by a changed table,
+    # leaving the other CSVs as they are
+    patched = {}
+    scored_rows = [0, 0]
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        ids = tline_ids if id_is_tline else node_ids
+        if len(ids) == 0:
+            continue
+        if read_table is None:
+            table = tmm_cache.read_cached_table(os.path.join(input_dir, filename), id_is_tline)
+        else:
+            table = read_table(key)
+        previous = tmm_cache.read_cached_table(os.path.join(output_dir, filename), id_is_tline)
+        changed_table = table.take(np.flatnonzero(tmm_scoring.match_ids(table.ids, ids)[0]))
+        scored_table = tmm_scoring.score_table(key, changed_table, node_policy, tline_policy)
+        found, pos = tmm_scoring.match_ids(scored_table.ids, previous.ids)
+        if not found.all() or previous.fields != scored_table.fields:
+            return None  # The outputs don't match the baseline CSVs
+        patched[filename] = (previous.copy(), id_is_tline)
+        for field in previous.fields[1:]:
+            patched[filename][0].columns[field] = tmm_scoring.patch_rows(previous.columns[field], pos, scored_table.columns[field])
+        scored_rows[id_is_tline] += len(scored_table)
+
+    clear_build_state(output_dir)
+    for filename, (table, id_is_tline) in patched.items():
+        csv_file = tmm_scoring.write_table_csv(os.path.join(output_dir, filename), table)
+        cache_output(csv_file, table, id_is_tline)
+    save_build_state(input_dir, output_dir, node_policy, tline_policy)
+    return tuple(scored_rows)
+
+
+def row_hashes(policy, fields):
+    ''' Calculate a 64-bit content hash of every row of a policy AttrTable,
+        from the values of the specified fields (FNV-1a, applied to whole
+        values instead of bytes). '''
+    hashes = np.empty(len(policy), dtype=np.uint64)
+    hashes.fill(np.uint64(14695981039346656037))
+    for field in fields:
+        hashes ^= policy.columns[field].astype(np.int64).view(np.uint64)
+        hashes *= np.uint64(1099511628211)
+    return hashes
+
+
+def save_build_state(input_dir, output_dir, node_policy, tline_policy):
+    ''' Record the state of a completed build in its output directory. '''
+    state_file = os.path.join(output_dir, state_file_name)
+    meta = _state_meta(input_dir, output_dir, node_policy, tline_policy)
+    with open(state_file + '.tmp', 'wb') as state_npz:
+        np.savez(
+            state_npz,
+            meta=np.array(json.dumps(meta, sort_keys=True)),
+            node_ids=node_policy.ids,
+            node_hashes=row_hashes(node_policy, node_policy.fields),
+            tline_ids=tline_policy.ids,
+            tline_hashes=row_hashes(tline_policy, tline_policy.fields),
+        )
+    clear_build_state(output_dir)
+    os.rename(state_file + '.tmp', state_file)
+    return state_file
+
+
+def _state_meta(input_dir, output_dir, node_policy, tline_policy):
+    ''' Describe everything besides the policy rows that a build depends on. '''
+    filenames = [filename for key, filename, id_is_tline in tmm_scoring.baseline_csvs]
+    return {
+        'inputs': file_stats([os.path.join(input_dir, filename) for filename in filenames]),
+        'outputs': file_stats([os.path.join(output_dir, filename) for filename in filenames]),
+        'node_fields': list(node_policy.fields),
+        'tline_fields': list(tline_policy.fields),
+    }
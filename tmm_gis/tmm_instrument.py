@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+'''
+    tmm_instrument.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module records how long each stage of a TMM script takes and how
+    many rows it read and changed, e.g.:
+
+        report = tmm_instrument.RunReport('tmm_gdb2csv')
+        with report.stage('read baseline') as stage:
+            baseline = tmm_scoring.read_baseline(input_dir)
+            stage['rows_in'] = sum(len(table) for table in baseline.values())
+        ...
+        report.write(output_dir)
+
+    For each stage it records the wall & CPU time in seconds, the rows read
+    ('rows_in') and changed ('rows_modified'), as set by the script, and the
+    peak resident set size of the process at the end of the stage. A stage's
+    CPU time is that of the thread running it (so stages run concurrently in
+    a thread pool don't count each other's work), except on Python 2, where
+    it can only be measured for the whole process; 'cpu_scope' records which.
+    The run's total CPU time always covers the whole process. The report is
+    written as JSON to <script>_report.json.
+
+    A run can also be profiled by setting the TMM_PROFILE environment variable
+    (or the profiler argument) to 'cprofile' or 'pyinstrument' (which must be
+    installed). The profile is written alongside the report, as
+    <script>_report.prof (for pstats/snakeviz) or <script>_report.html.
+
+'''
+import contextlib
+import ctypes
+import datetime
+import json
+import os
+import sys
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+profilers = ('cprofile', 'pyinstrument')
+cpu_scope = 'thread' if hasattr(time, 'thread_time') else 'process'  # Of stage CPU times
+
+
+# -----------------------------------------------------------------------------
+#  Define classes.
+# -----------------------------------------------------------------------------
+class RunReport(object):
+    ''' A record of the stages of one run of a script, with an optional
+        profile of the whole run. '''
+
+    def __init__(self, script, profiler=None):
+        self.script = script
+        self.started = datetime.datetime.now()
+        self.stages = []
+        self._start_wall = time.time()
+        self._start_cpu = cpu_time()
+        self._profiler = None
+        self._profiler_name = (profiler or os.environ.get('TMM_PROFILE') or '').lower() or None
+        if self._profiler_name:
+            self._start_profiler()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None, rows_modified=None):
+        ''' Time a stage of the run. Yields the stage's record, a dictionary
+            whose 'rows_in' and 'rows_modified' the stage can set. A stage
+            that raises an exception is recorded as failed. Its CPU time is
+            that of the calling thread where possible (see thread_cpu_time()). '''
+        record = {
+            'stage': name,
+            'rows_in': rows_in,
+            'rows_modified': rows_modified,
+        }
+        self.stages.append(record)
+        start_wall = time.time()
+        start_cpu = thread_cpu_time()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            record['wall_seconds'] = time.time() - start_wall
+            record['cpu_seconds'] = thread_cpu_time() - start_cpu
+            record['cpu_scope'] = cpu_scope
+            record['peak_rss_bytes'] = peak_rss()
+
+    def to_dict(self):
+        ''' Summarize the run and its stages so far as a dictionary. '''
+        return {
+            'script': self.script,
+            'started': self.started.isoformat(),
+            'argv': sys.argv,
+            'python': sys.version.split()[0],
+            'wall_seconds': time.time() - self._start_wall,
+            'cpu_seconds': cpu_time() - self._start_cpu,
+            'peak_rss_bytes': peak_rss(),
+            'profiler': self._profiler_name,
+            'stages': self.stages,
+        }
+
+    def write(self, report_dir):
+        ''' Write the report (and profile, if any) to report_dir. Returns the
+            path of the JSON report. '''
+        report_base = os.path.join(report_dir, '{0}_report'.format(self.script))
+        if self._profiler:
+            self._stop_profiler(report_base)
+        report_file = report_base + '.json'
+        with open(report_file, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=2, default=_json_default)
+        return report_file
+
+    def _start_profiler(self):
+        if self._profiler_name == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self._profiler_name == 'pyinstrument':
+            import pyinstrument
+            self._profiler = pyinstrument.Profiler()
+            self._profiler.start()
+        else:
+            raise ValueError('Unknown profiler "{0}" (expected one of: {1}).'.format(
+                self._profiler_name, ', '.join(profilers)))
+
+    def _stop_profiler(self, report_base):
+        if self._profiler_name == 'cprofile':
+            self._profiler.disable()
+            self._profiler.dump_stats(report_base + '.prof')
+        else:
+            self._profiler.stop()
+            with open(report_base + '.html', 'w') as html_file:
+                html_file.write(self._profiler.output_html())
+        self._profiler = None
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def changed_rows(table, adjusted_table):
+    ''' Count the rows of an AttrTable whose text differs in any field from
+        the same row of an adjusted copy of it. '''
+    changed = np.zeros(len(table), dtype=bool)
+    for field in table.fields:
+        changed |= table.columns[field] != adjusted_table.columns[field]
+    return int(changed.sum())
+
+
+def cpu_time():
+    ''' Return the CPU time (user + system) used by this process so far, in
+        seconds. '''
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss():
+    ''' Return the peak resident set size of this process in bytes, or None
+        if it isn't available on this platform. '''
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024  # KB on Linux
+    if sys.platform == 'win32':
+        return _windows_peak_working_set()
+    return None
+
+
+def stage(report, name, rows_in=None, rows_modified=None):
+    ''' Time a stage of a run with report.stage(), or if report is None (e.g.
+        when a script's functions are called by another), yield a record of
+        it that is simply discarded. '''
+    if report is None:
+        return _unrecorded_stage(name, rows_in, rows_modified)
+    return report.stage(name, rows_in, rows_modified)
+
+
+def thread_cpu_time():
+    ''' Return the CPU time used by the calling thread so far, in seconds,
+        or by the whole process if per-thread CPU time isn't available
+        (before Python 3.7). '''
+    if hasattr(time, 'thread_time'):
+        return time.thread_time()
+    return cpu_time()
+
+
+def _json_default(value):
+    ''' Convert NumPy scalars in a report to plain numbers. '''
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{0!r} is not JSON serializable'.format(value))
+
+
+@contextlib.contextmanager
+def _unrecorded_stage(name, rows_in=None, rows_modified=None):
+    ''' Yield a stage record that isn't kept. '''
+    yield {'stage': name, 'rows_in': rows_in, 'rows_modified': rows_modified}
+
+
+def _windows_peak_working_set():
+    ''' Return the peak working set of this process in bytes, on Windows. '''
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', ctypes.c_ulong),
+            ('PageFaultCount', ctypes.c_ulong),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    get_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_process.restype = ctypes.c_void_p
+    get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_memory_info.argtypes = [ctypes.c_void_p, ctypes.POINTER(ProcessMemoryCounters), ctypes.c_ulong]
+    if not get_memory_info(get_process(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize
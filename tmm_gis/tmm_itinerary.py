@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+'''
+    tmm_itinerary.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module indexes which nodes are in each transit line's itinerary, and
+    which transit lines serve each node, for every TOD, so node policies can
+    be applied to every stop of a route (e.g. shelters at all stops of the
+    #9 Ashland bus) without selecting the stops by hand in ArcMap.
+
+    The index is built by tmm_shp2gdb.py from the emme_tsegs_N INODE/JNODE
+    pairs it already reads (see tmm_network.py), and saved as
+    TMM_GIS_itineraries.npz alongside TMM_GIS.gdb. For each TOD, it stores
+    two compressed sparse row (CSR) arrays:
+      - tline -> stops:  stop_start_N[i]:stop_start_N[i+1] is the range of
+                         stop_nodes_N holding the ordered itinerary of
+                         tline_ids[i]
+      - node -> tlines:  line_start_N[j]:line_start_N[j+1] is the range of
+                         line_items_N holding the indices (in tline_ids) of
+                         the tlines serving node_ids[j]
+    Both ID arrays are sorted, so a lookup is a binary search and a slice.
+
+    Policies can then be applied to the stops of a set of tlines, which may
+    be given as fnmatch patterns (e.g. 'bX9*' for every variant of a route):
+
+        python tmm_itinerary.py <tline ID/pattern> [...] --set FIELD=VALUE
+            [--set FIELD=VALUE ...] [--tod N]
+
+'''
+import argparse
+import fnmatch
+import os
+import numpy as np
+import TMM
+import tmm_backends
+
+index_file_name = '{0}_itineraries.npz'.format(TMM.gdb_name)
+
+
+# -----------------------------------------------------------------------------
+#  Define classes.
+# -----------------------------------------------------------------------------
+class ItineraryIndex(object):
+    ''' A two-way index of tline itineraries, for each TOD. '''
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.tline_ids = arrays['tline_ids']
+        self.node_ids = arrays['node_ids']
+        self.tods = [int(tod) for tod in arrays['tods']]
+
+    @classmethod
+    def from_tod_ids(cls, tod_ids):
+        ''' Index a dictionary, keyed by TOD, of the tseg IDs read by
+            tmm_shp2gdb.read_tod_ids(). Tsegs are assumed to be in itinerary
+            order within each tline. '''
+        tods = sorted(tod_ids)
+        itineraries = dict((tod, _tod_itineraries(tod_ids[tod])) for tod in tods)
+        tline_ids = np.unique(np.concatenate(
+            [np.zeros(0, dtype='U')] +
+            [np.asarray(tod_ids[tod]['tline_ids'], dtype='U') for tod in tods] +
+            [lines for lines, stops in itineraries.values()]
+        ))
+        node_ids = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [stops for lines, stops in itineraries.values()]))
+
+        arrays = {'tline_ids': tline_ids, 'node_ids': node_ids, 'tods': np.array(tods, dtype=np.int64)}
+        for tod in tods:
+            lines, stops = itineraries[tod]
+            line_index = np.searchsorted(tline_ids, lines)
+            arrays['stop_start_{0}'.format(tod)] = _csr_start(line_index, len(tline_ids))
+            arrays['stop_nodes_{0}'.format(tod)] = stops
+
+            # Invert to node -> tlines, counting each tline once per node
+            node_index = np.searchsorted(node_ids, stops)
+            pairs = np.unique(node_index * max(len(tline_ids), 1) + line_index)
+            arrays['line_start_{0}'.format(tod)] = _csr_start(pairs // max(len(tline_ids), 1), len(node_ids))
+            arrays['line_items_{0}'.format(tod)] = pairs % max(len(tline_ids), 1)
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, index_file):
+        ''' Load an index saved by save(). '''
+        with np.load(index_file) as index_npz:
+            return cls(dict((name, index_npz[name]) for name in index_npz.files))
+
+    def save(self, index_file):
+        ''' Save the index to a .npz file. '''
+        with open(index_file, 'wb') as index_npz:
+            np.savez(index_npz, **self.arrays)
+        return index_file
+
+    def match_tlines(self, patterns):
+        ''' Return the indexed tline IDs matching any of a list of IDs or
+            fnmatch patterns. '''
+        return [
+            tline_id for tline_id in self.tline_ids.tolist()
+            if any(fnmatch.fnmatchcase(tline_id, pattern) for pattern in patterns)
+        ]
+
+    def route_stops(self, tline_ids, tod=None):
+        ''' Return the sorted, unique node IDs in the itineraries of a list of
+            tlines, in one TOD or (by default) any TOD. '''
+        stops = [np.zeros(0, dtype=self.node_ids.dtype)]
+        for tod in self._tods(tod):
+            for tline_id in tline_ids:
+                stops.append(self.stops(tline_id, tod))
+        return np.unique(np.concatenate(stops))
+
+    def serving_tlines(self, node_id, tod=None):
+        ''' Return the sorted IDs of the tlines serving a node, in one TOD or
+            (by default) any TOD. '''
+        j = _find(self.node_ids, node_id)
+        items = [np.zeros(0, dtype=np.int64)]
+        if j is not None:
+            for tod in self._tods(tod):
+                line_start = self.arrays['line_start_{0}'.format(tod)]
+                items.append(self.arrays['line_items_{0}'.format(tod)][line_start[j]:line_start[j + 1]])
+        return self.tline_ids[np.unique(np.concatenate(items))]
+
+    def stops(self, tline_id, tod):
+        ''' Return the node IDs of a tline's itinerary in a TOD, in order. '''
+        i = _find(self.tline_ids, tline_id)
+        if i is None or tod not in self.tods:
+            return np.zeros(0, dtype=self.node_ids.dtype)
+        stop_start = self.arrays['stop_start_{0}'.format(tod)]
+        return self.arrays['stop_nodes_{0}'.format(tod)][stop_start[i]:stop_start[i + 1]]
+
+    def _tods(self, tod):
+        return self.tods if tod is None else [tod]
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def apply_route_stops_policy(index, tline_patterns, values, table=None, tod=None, ignore_zeroes=False):
+    ''' Set node policy values (a dictionary keyed by field) for every stop
+        of the tlines matching a list of IDs or patterns, in one TOD or any
+        TOD, in a node policy table (by default in TMM_GIS.gdb). Returns the
+        number of stops selected and rows updated. '''
+    table = table or os.path.join(TMM.gdb, 'extra_attr_nodes')
+    for field in values:
+        if field not in TMM.node_fields:
+            raise ValueError('"{0}" is not a node policy field.'.format(field))
+    tline_ids = index.match_tlines(tline_patterns)
+    if not tline_ids:
+        raise ValueError('No tlines match: {0}.'.format(', '.join(tline_patterns)))
+    node_ids = index.route_stops(tline_ids, tod)
+    fields = [field for field in TMM.node_fields if field in values]
+    updated = tmm_backends.apply_policy(table, 'NODE_ID', node_ids.tolist(), fields, [values[field] for field in fields], ignore_zeroes)
+    return len(node_ids), updated
+
+
+def default_index_file(gdb=TMM.gdb):
+    ''' Return the path of the itinerary index saved alongside a geodatabase. '''
+    return os.path.join(os.path.dirname(gdb), index_file_name)
+
+
+def _csr_start(rows, n_rows):
+    ''' Return the CSR start offsets (plus the end of the last row) of a
+        sorted array of row indices. '''
+    return np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_rows))]).astype(np.int64)
+
+
+def _find(sorted_ids, value):
+    ''' Return the position of a value in a sorted array, or None. '''
+    pos = np.searchsorted(sorted_ids, value)
+    if pos < len(sorted_ids) and sorted_ids[pos] == value:
+        return int(pos)
+    return None
+
+
+def _tod_itineraries(tod_ids):
+    ''' Return the tline ID of each stop in a TOD's itineraries, and the
+        stops' node IDs, sorted by tline and then by itinerary order: each
+        tseg's INODE, then the final tseg's JNODE. '''
+    lines = np.asarray(tod_ids['tseg_line_ids'], dtype='U')
+    inodes = np.array(tod_ids['tseg_inodes'], dtype=float)
+    jnodes = np.array(tod_ids['tseg_jnodes'], dtype=float)
+    order = np.argsort(lines, kind='mergesort')
+    lines, inodes, jnodes = lines[order], inodes[order], jnodes[order]
+    is_last = np.ones(len(lines), dtype=bool)
+    is_last[:-1] = lines[1:] != lines[:-1]
+
+    # Each tseg contributes its INODE, followed by its JNODE if it's the last
+    stop_lines = np.repeat(lines, 1 + is_last)
+    stop_nodes = np.empty(len(stop_lines))
+    inode_pos = np.arange(len(lines)) + np.cumsum(is_last) - is_last
+    stop_nodes[inode_pos] = inodes
+    stop_nodes[inode_pos[is_last] + 1] = jnodes[is_last]
+    found = ~np.isnan(stop_nodes)
+    return stop_lines[found], np.rint(stop_nodes[found]).astype(np.int64)
+
+
+# -----------------------------------------------------------------------------
+#  Apply a policy to the stops of a route.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply a TMM node policy to every stop of a set of routes.')
+    parser.add_argument('tlines', nargs='+', help='tline IDs, or fnmatch patterns of tline IDs')
+    parser.add_argument('--set', dest='values', action='append', required=True, help='policy value to set, as FIELD=VALUE')
+    parser.add_argument('--tod', type=int, help='only the stops served in this TOD (default: any TOD)')
+    parser.add_argument('--table', help='node policy table to update (default: the table in TMM_GIS.gdb)')
+    parser.add_argument('--ignore-zeroes', action='store_true', help='leave fields with a value of 0 unchanged')
+    args = parser.parse_args()
+
+    values = dict((field, int(value)) for field, value in (item.split('=', 1) for item in args.values))
+    index = ItineraryIndex.load(default_index_file())
+    selected, updated = apply_route_stops_policy(index, args.tlines, values, args.table, args.tod, args.ignore_zeroes)
+    print('Updated {0} of {1} stops.'.format(updated, selected))
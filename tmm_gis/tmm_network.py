@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+'''
+    tmm_network.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module identifies the unique nodes and transit lines across the 8
+    TOD networks, for use by tmm_shp2gdb.py. It works on plain sequences of
+    IDs read once from each TOD's feature classes, using in-memory sets
+    rather than ever-growing SQL IN clauses, so its cost grows linearly with
+    the size of the network. It doesn't require arcpy.
+
+    A TOD's IDs are passed as a dictionary of equal-length sequences:
+      - 'tline_oids', 'tline_ids':  OID & ID of each emme_tlines_N row
+      - 'tseg_line_ids', 'tseg_inodes', 'tseg_jnodes':  LINE_ID, INODE &
+        JNODE of each emme_tsegs_N row
+      - 'node_oids', 'node_ids':  OID & integer ID of each emme_nodes_N row
+
+'''
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def itinerary_nodes(tseg_line_ids, tseg_inodes, tseg_jnodes, tline_ids):
+    ''' Return the set of (integer) node IDs in the itineraries of the
+        specified tlines. '''
+    tline_ids = set(tline_ids)
+    nodes = set()
+    for line_id, inode, jnode in zip(tseg_line_ids, tseg_inodes, tseg_jnodes):
+        if line_id in tline_ids:
+            nodes.add(int(round(inode)))
+            nodes.add(int(round(jnode)))
+    return nodes
+
+
+def merge_tod_ids(tod_ids, unique_tlines, unique_nodes):
+    ''' Identify a TOD's tlines that haven't been seen in an earlier TOD, and
+        the nodes in their itineraries that haven't been seen either. The sets
+        of unique tline & node IDs are updated in place. Returns lists of the
+        OIDs of the new tline & node rows, which are the rows to append to the
+        all-day feature classes. '''
+    new_tline_oids = []
+    new_tlines = []
+    for oid, tline_id in zip(tod_ids['tline_oids'], tod_ids['tline_ids']):
+        if tline_id not in unique_tlines:
+            new_tline_oids.append(oid)
+            new_tlines.append(tline_id)
+
+    new_nodes = itinerary_nodes(tod_ids['tseg_line_ids'], tod_ids['tseg_inodes'], tod_ids['tseg_jnodes'], new_tlines)
+    new_nodes.difference_update(unique_nodes)
+    new_node_oids = [oid for oid, node_id in zip(tod_ids['node_oids'], tod_ids['node_ids']) if node_id in new_nodes]
+
+    unique_tlines.update(new_tlines)
+    unique_nodes.update(new_nodes)
+    return new_tline_oids, new_node_oids
@@ -2,19 +2,29 @@
 '''
     tmm_policy_nodes.py
     Author: npeterson
-    Revised: 4/9/2015
+    Revised: 10/17/2026
     ---------------------------------------------------------------------------
     This script will update the rows in the extra_attr_nodes table, which
     stores updated policies for all bus stops and train stations, for any that
     are currently selected. Must be run from within ArcMap.
 
+    Large selections are applied in chunks, or in one pass over the whole
+    table, rather than with a single where clause (see tmm_backends.py).
+
+    The time taken and rows selected & updated are written to
+    tmm_policy_nodes_report.json, alongside the geodatabase (see
+    tmm_instrument.py).
+
 '''
 import os
 import sys
-import arcpy
 import TMM
+import tmm_backends
+import tmm_instrument
+arcpy = TMM.import_arcpy()
 
 # Set parameters:
+report = tmm_instrument.RunReport('tmm_policy_nodes')
 nodes_lyr = arcpy.GetParameterAsText(0)
 policy_values = [arcpy.GetParameter(i+1) for i in xrange(len(TMM.node_fields))]
 ignore_zeroes = arcpy.GetParameter(len(policy_values)+1)
@@ -25,13 +35,14 @@ if not TMM.check_selection(nodes_lyr):
     TMM.die('You must select at least one feature from "{0}" before continuing. (If you want the policy changes to be regionwide, please select all features.)'.format(nodes_lyr))
 
 
-# Iterate through extra_attr_nodes table, updating rows for selected features:
-selected_nodes = [str(row[0]) for row in arcpy.da.SearchCursor(nodes_lyr, [TMM.node_id_int_field])]
+# Update rows in extra_attr_nodes table for selected features:
+with report.stage('read selection') as stage:
+    selected_nodes = [row[0] for row in arcpy.da.SearchCursor(nodes_lyr, [TMM.node_id_int_field])]
+    stage['rows_in'] = len(selected_nodes)
 
 node_table = os.path.join(TMM.gdb, 'extra_attr_nodes')
-with arcpy.da.UpdateCursor(node_table, TMM.node_fields, ''' "NODE_ID" IN ({0}) '''.format(",".join(selected_nodes))) as cursor:
-    for row in cursor:
-        for i in xrange(len(row)):
-            if policy_values[i] != 0 or not ignore_zeroes:
-                row[i] = policy_values[i]
-        cursor.updateRow(row)
+with report.stage('update policy table', rows_in=len(set(selected_nodes))) as stage:
+    updated_rows = tmm_backends.apply_policy(node_table, 'NODE_ID', selected_nodes, TMM.node_fields, policy_values, ignore_zeroes)
+    stage['rows_modified'] = updated_rows
+arcpy.AddMessage('Updated {0} of {1} selected nodes.'.format(updated_rows, len(set(selected_nodes))))
+report.write(TMM.gdb_dir)
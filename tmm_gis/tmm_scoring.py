@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+'''
+    tmm_scoring.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module stores the scoring formulas used by tmm_gdb2csv.py to adjust
+    the extra attributes in the batchin CSVs for a TMM scenario. Rather than
+    scoring one bus stop, rail station or transit line at a time, each CSV is
+    loaded into aligned columns and every adjusted attribute is calculated
+    with batched NumPy array operations.
+
+    The results are identical to the original per-row formulas, including
+    their rounding and the text of any values they left untouched. A
+    scenario can also be applied as a sparse overlay of only its non-zero
+    policies, re-scoring just those rows of a baseline CSV's neutral scoring.
+
+    Scenario CSVs are written a block of rows at a time, formatted from the
+    columns of text, to a temporary file that then replaces the output CSV,
+    so an interrupted run never leaves a partly written batchin CSV.
+
+'''
+import csv
+import os
+import sys
+import numpy as np
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# -----------------------------------------------------------------------------
+#  1. BASELINE CSVs
+# -----------------------------------------------------------------------------
+# (key, filename, id_is_tline) for each batchin CSV that a scenario adjusts.
+baseline_csvs = (
+    ('bus', 'bus_node_extra_attributes.csv', False),
+    ('rail', 'rail_node_extra_attributes.csv', False),
+    ('easeb', 'boarding_ease_by_line_id.csv', True),
+    ('prof', 'productivity_bonus_by_line_id.csv', True),
+    ('relim', 'relim_by_line_id.csv', True),
+)
+
+# Output CSVs are formatted in blocks of rows, written through a large buffer.
+csv_block_rows = 65536
+csv_buffer_size = 4 * 1024 * 1024
+csv_line_end = '\r\n'  # As written by csv.writer
+csv_special_chars = (',', '"', '\r', '\n')
+
+
+# -----------------------------------------------------------------------------
+#  2. SCORING PARAMETERS
+# -----------------------------------------------------------------------------
+# Field scale factors (1 / maximum field value) & score weights, listed in the
+# order that the weighted field values are summed.
+type_fwv = (
+    ('ADD_ADA',      1.0/1, 1.0),
+    ('ADD_RETAIL',   1.0/1, 1.0),
+    ('ADD_SEATS',    1.0/5, 1.0),
+    ('ADD_SEC_CAM',  1.0/5, 1.0),
+    ('ADD_SHELTER',  1.0/5, 1.0),
+    ('ADD_WALKWAY',  1.0/1, 1.0),
+    ('ENLARGE_AREA', 1.0/5, 1.0),
+    ('FACELIFT',     1.0/5, 1.0),
+    ('IMP_LIGHTING', 1.0/5, 1.0),
+    ('IMP_WARMING',  1.0/5, 1.0),
+)
+max_type_value = 6.0  # 5 = 'major terminal'
+
+easeb_fwv = (
+    ('ADD_STAND_CAP', 1.0/5, 1.0),
+    ('LOWER_FLOOR',   1.0/3, 1.0),
+    ('NEW_VEHICLES',  1.0/5, 1.0),
+)
+max_easeb_value = 4.0  # 3 = 'level w/ platform'
+
+prof_fwv = (
+    ('ADD_WIFI',  1.0/1, 0.05),
+    ('IMP_SEATS', 1.0/5, 0.05),
+)
+
+# Policy fields read by the node & tline formulas.
+node_policy_fields = tuple(field for field, f, w in type_fwv) + ('ADD_INFO', 'ADD_PA', 'ADD_PARKING')
+tline_policy_fields = tuple(field for field, f, w in easeb_fwv + prof_fwv) + ('IMP_RELIABILITY',)
+
+
+# -----------------------------------------------------------------------------
+#  3. COLUMNAR TABLES
+# -----------------------------------------------------------------------------
+class AttrTable(object):
+    ''' A table stored as columns: an array of row IDs, the fieldnames in
+        order, and a dictionary of equal-length arrays keyed by fieldname.
+        Batchin CSV columns hold the original text of each value; policy
+        table columns hold the integer policy values. '''
+
+    def __init__(self, ids, fields, columns):
+        self.ids = ids
+        self.fields = list(fields)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copy(self):
+        ''' Return a shallow copy, whose columns can be replaced without
+            affecting this table. '''
+        return AttrTable(self.ids, self.fields, dict(self.columns))
+
+    def take(self, rows):
+        ''' Return a new table of the rows selected by an index array. '''
+        columns = dict((field, column[rows]) for field, column in self.columns.items())
+        return AttrTable(self.ids[rows], self.fields, columns)
+
+
+class AttributeStore(AttrTable, Mapping):
+    ''' A GDB table (e.g. extra_attr_nodes) stored as typed columns sorted by
+        a unique key field, with no per-row objects. It can be used in place
+        of an AttrTable, or like the dictionary of row dictionaries formerly
+        returned by TMM.make_attribute_dict, e.g. store[node_id]['ADD_INFO'].
+        Rows are located by a binary search of the sorted IDs. '''
+
+    def __init__(self, ids, fields, columns, key_field):
+        AttrTable.__init__(self, ids, fields, columns)
+        self.key_field = key_field
+
+    @classmethod
+    def from_columns(cls, key_field, fields, columns):
+        ''' Create a store from a dictionary of unsorted columns, including
+            key_field. As with a dictionary, the last row of any duplicated
+            key is kept. '''
+        ids = columns[key_field]
+        order = np.argsort(ids, kind='mergesort')
+        sorted_ids = ids[order]
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = sorted_ids[1:] != sorted_ids[:-1]
+        order = order[last]
+        fields = [field for field in fields if field != key_field]
+        store_columns = dict((field, columns[field][order]) for field in fields)
+        return cls(ids[order], fields, store_columns, key_field)
+
+    def __contains__(self, row_id):
+        return self._row(row_id) is not None
+
+    def __getitem__(self, row_id):
+        row = self._row(row_id)
+        if row is None:
+            raise KeyError(row_id)
+        return _RowView(self, row)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def copy(self):
+        return AttributeStore(self.ids, self.fields, dict(self.columns), self.key_field)
+
+    def take(self, rows):
+        columns = dict((field, column[rows]) for field, column in self.columns.items())
+        return AttributeStore(self.ids[rows], self.fields, columns, self.key_field)
+
+    def _row(self, row_id):
+        ''' Return the position of a row ID, or None if it isn't present. '''
+        try:
+            pos = int(np.searchsorted(self.ids, row_id))
+        except (TypeError, ValueError):
+            return None
+        if pos < len(self.ids) and self.ids[pos] == row_id:
+            return pos
+        return None
+
+
+class _RowView(Mapping):
+    ''' Read-only dictionary-style view of one row of an AttributeStore. '''
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field):
+        if field == self._store.key_field:
+            return self._store.ids[self._row].item()
+        return self._store.columns[field][self._row].item()
+
+    def __iter__(self):
+        return iter([self._store.key_field] + self._store.fields)
+
+    def __len__(self):
+        return len(self._store.fields) + 1
+
+
+# -----------------------------------------------------------------------------
+#  4. METHODS
+# -----------------------------------------------------------------------------
+def adjust_easeb_values(table, tline_policy):
+    ''' Create a composite score from a subset of the tline policy fields, to
+        provide a boost to the @easeb extra attribute of every tline. '''
+    current = table.columns['@easeb']
+    current_values = current.astype(float)
+    found, pos = match_ids(table.ids, tline_policy.ids)
+
+    # Update easeb values for tlines in GDB that could be improved
+    update = found & (current_values < max_easeb_value)
+    current_values = current_values[update]
+    pct_improvement = _weighted_score(tline_policy, easeb_fwv, pos[update])
+    max_adjustment = max_easeb_value - current_values
+    adjusted_values = current_values + max_adjustment * pct_improvement
+
+    # Ignore tlines not in GDB and maxed-out-@easeb tlines, but note that
+    # updated values are rewritten as floats (e.g. '3' -> '3.0')
+    return patch_rows(current, update, format_rounded(adjusted_values))
+
+
+def adjust_info_values(table, node_policy, info_field):
+    ''' Set the real-time info value (@bsinf/@rsinf) of every node receiving
+        real-time info or a PA system. '''
+    current = table.columns[info_field]
+    found, pos = match_ids(table.ids, node_policy.ids)
+
+    # Update info values for nodes in GDB w/o real-time info already
+    update = found & (current != '2')
+    add_info = node_policy.columns['ADD_INFO'][pos[update]]
+    add_pa = node_policy.columns['ADD_PA'][pos[update]]
+    update[update] = (add_info + add_pa > 0)
+    return patch_rows(current, update, np.array(['2'] * update.sum(), dtype='U'))
+
+
+def adjust_prof_values(table, tline_policy):
+    ''' Subtract the productivity bonus of every tline from its @prof1-3
+        values. Returns a dictionary of the three adjusted columns. '''
+    found, pos = match_ids(table.ids, tline_policy.ids)
+
+    # Calculate productivity bonuses for tlines in GDB
+    productivity_bonus = 0
+    for field, f, w in prof_fwv:
+        productivity_bonus = productivity_bonus + tline_policy.columns[field][pos[found]] * f * w
+
+    # Set adjusted @prof1-3 values
+    adjusted_columns = {}
+    for prof_field in ('@prof1', '@prof2', '@prof3'):
+        current = table.columns[prof_field]
+        current_values = current.astype(float)[found]
+        adjusted_values = format_rounded(current_values - productivity_bonus)
+        adjusted_columns[prof_field] = patch_rows(current, found, adjusted_values)
+    return adjusted_columns
+
+
+def adjust_relim_values(table, tline_policy):
+    ''' Decrease the reliability impact (@relim) of every tline in proportion
+        to its specified reliability improvement. '''
+    current = table.columns['@relim']
+    current_values = current.astype(float)
+    found, pos = match_ids(table.ids, tline_policy.ids)
+
+    # Calculate the updated value for tlines in GDB
+    imp_rel_pct = tline_policy.columns['IMP_RELIABILITY'][pos[found]] / 100.0
+    adjusted_values = current_values[found] * (1.0 - imp_rel_pct)
+
+    # Updated values were stored as floats, which the CSV writer repr()s
+    return patch_rows(current, found, format_rounded(adjusted_values, repr))
+
+
+def adjust_rspac_values(table, node_policy):
+    ''' Add new parking spaces to every node. RAIL STATIONS ONLY! '''
+    current = table.columns['@rspac']
+    current_values = current.astype(np.int64)
+    found, pos = match_ids(table.ids, node_policy.ids)
+
+    # Calculate the updated value for nodes in GDB
+    new_parking = node_policy.columns['ADD_PARKING'][pos[found]].astype(np.int64)
+    adjusted_values = np.maximum(current_values[found] + new_parking, 0)  # Don't allow net-negative values
+    return patch_rows(current, found, adjusted_values.astype('U'))
+
+
+def adjust_type_values(table, node_policy, type_field):
+    ''' Create a composite score from a subset of the node policy fields, to
+        provide a boost to the @bstyp/@rstyp extra attribute of every node. '''
+    current = table.columns[type_field]
+    current_values = current.astype(float)
+    found, pos = match_ids(table.ids, node_policy.ids)
+
+    # Update station/stop type values for nodes in GDB that could be improved
+    update = found & (current_values < max_type_value)
+    current_values = current_values[update]
+    pct_improvement = _weighted_score(node_policy, type_fwv, pos[update])
+    max_adjustment = max_type_value - current_values
+    adjusted_values = current_values + max_adjustment * pct_improvement  # The higher the current type, the harder it is to improve
+
+    # Ignore nodes not in GDB and maxed-out-@bstyp/@rstyp nodes
+    return patch_rows(current, update, format_rounded(adjusted_values))
+
+
+def format_rounded(values, to_text=str):
+    ''' Round an array of floats to 2 decimal places and convert them to text.
+        The built-in round() is used so that ties are resolved exactly as the
+        per-row formulas resolved them. '''
+    return np.array([to_text(round(value, 2)) for value in values.tolist()], dtype='U')
+
+
+def format_csv_rows(columns):
+    ''' Format aligned columns of text as CSV rows, exactly as csv.writer
+        would (quoting only values that contain a delimiter, quote or line
+        break), with every column formatted at once rather than row by row. '''
+    columns = [column.tolist() if isinstance(column, np.ndarray) else list(column) for column in columns]
+    if not columns or not columns[0]:
+        return ''
+    for i, column in enumerate(columns):
+        column_text = ''.join(column)
+        if any(char in column_text for char in csv_special_chars):
+            columns[i] = [_quote_csv_value(value) for value in column]
+    if len(columns) == 1:
+        columns[0] = [value if value else '""' for value in columns[0]]  # As csv.writer writes an empty row
+    return csv_line_end.join(','.join(row) for row in zip(*columns)) + csv_line_end
+
+
+def id_array(ids, id_is_tline=False):
+    ''' Convert a sequence of node (integer) or tline (text) IDs into an array
+        that can be sorted and searched. '''
+    if id_is_tline:
+        return np.array(ids, dtype='U')
+    return np.array(ids, dtype=np.int64)
+
+
+def match_ids(table_ids, policy_ids):
+    ''' Locate table IDs within a sorted array of policy table IDs. Returns a
+        boolean array flagging the table IDs that are in the policy table and
+        an array of their positions in it. '''
+    if len(policy_ids) == 0:
+        return np.zeros(len(table_ids), dtype=bool), np.zeros(len(table_ids), dtype=np.intp)
+    pos = np.searchsorted(policy_ids, table_ids)
+    pos[pos == len(policy_ids)] = 0
+    found = policy_ids[pos] == table_ids
+    return found, pos
+
+
+def neutral_table(key, table):
+    ''' Score a baseline AttrTable as if every row were in the policy tables
+        with no policy set. Rows outside a policy overlay (see score_overlay())
+        are scored as this, since the formulas still rewrite many of their
+        values (e.g. @easeb '3' -> '3.0'). '''
+    ids = np.unique(table.ids)
+    node_policy = AttrTable(ids, node_policy_fields, dict((field, np.zeros(len(ids), dtype=np.int16)) for field in node_policy_fields))
+    tline_policy = AttrTable(ids, tline_policy_fields, dict((field, np.zeros(len(ids), dtype=np.int16)) for field in tline_policy_fields))
+    return score_table(key, table, node_policy, tline_policy)
+
+
+def open_csv(csv_file_path, mode='r', buffer_size=-1):
+    ''' Open a CSV file in the mode the csv module expects, in Python 2 or 3. '''
+    if sys.version_info[0] < 3:
+        return open(csv_file_path, mode + 'b', buffer_size)
+    return open(csv_file_path, mode, buffer_size, newline='')
+
+
+def patch_rows(column, rows, values):
+    ''' Return a copy of a column, with the rows selected by a boolean mask or
+        an index array replaced by new values (widening a text column if any
+        new value is longer). '''
+    patched = np.empty(len(column), dtype=np.result_type(column, values))
+    patched[:] = column
+    patched[rows] = values
+    return patched
+
+
+def policy_overlay(policy):
+    ''' Return the rows of a policy AttrTable with a non-zero value in any
+        field: the sparse overlay that score_overlay() applies. '''
+    nonzero = np.zeros(len(policy), dtype=bool)
+    for field in policy.fields:
+        nonzero |= policy.columns[field] != 0
+    return policy.take(np.flatnonzero(nonzero))
+
+
+def policy_table(attr_dict, fields, id_is_tline=False):
+    ''' Convert a dictionary of policy table rows into an AttrTable sorted by
+        ID. An AttributeStore (from TMM.make_attribute_dict) is already one. '''
+    if isinstance(attr_dict, AttrTable):
+        return attr_dict
+    ids = sorted(attr_dict)
+    columns = {}
+    for field in fields:
+        columns[field] = np.array([attr_dict[row_id][field] for row_id in ids], dtype=np.int64)
+    return AttrTable(id_array(ids, id_is_tline), fields, columns)
+
+
+def read_baseline(input_dir):
+    ''' Read all of the baseline batchin CSVs in a directory into a dictionary
+        of AttrTables, keyed as in baseline_csvs. '''
+    baseline = {}
+    for key, filename, id_is_tline in baseline_csvs:
+        baseline[key] = read_csv_table(os.path.join(input_dir, filename), id_is_tline)
+    return baseline
+
+
+def read_csv_table(csv_file_path, id_is_tline=False):
+    ''' Read a CSV into an AttrTable whose IDs are the first value in each row.
+        As with a dictionary keyed by ID, only the last row of any duplicated
+        ID is kept. '''
+    with open_csv(csv_file_path, 'r') as attr_csv:
+        reader = csv.reader(attr_csv)
+        fields = next(reader)
+        table = table_from_rows(fields, [row for row in reader if row], id_is_tline)
+
+    # Keep the last occurrence of any duplicate IDs, in file order
+    unique_ids, last_index = np.unique(table.ids[::-1], return_index=True)
+    if len(unique_ids) < len(table):
+        table = table.take(np.sort(len(table) - 1 - last_index))
+    return table
+
+
+def replace_file(temp_file, out_file):
+    ''' Move a completed temporary file into place, replacing any existing
+        file (atomically where the OS allows). '''
+    if hasattr(os, 'replace'):
+        os.replace(temp_file, out_file)
+    else:
+        if os.path.exists(out_file):
+            os.remove(out_file)
+        os.rename(temp_file, out_file)
+    return out_file
+
+
+def score_scenario(baseline, node_policy, tline_policy):
+    ''' Apply a scenario's node and tline policies to the baseline AttrTables.
+        Returns a new dictionary of adjusted AttrTables; the baseline tables are
+        never modified, so they can be shared by any number of scenarios. '''
+    return dict((key, score_table(key, table, node_policy, tline_policy)) for key, table in baseline.items())
+
+
+def score_overlay(key, table, base, node_overlay, tline_overlay):
+    ''' Apply a scenario's sparse policy overlays (see policy_overlay()) to
+        one baseline AttrTable. Only the rows in the overlay are scored; every
+        other row is taken from base: the table's neutral_table(), as if it
+        were in the policy table with no policy set, or the table itself, as
+        if it were not in the policy table at all. Returns a new, adjusted
+        AttrTable. '''
+    id_is_tline = dict((csv_key, is_tline) for csv_key, filename, is_tline in baseline_csvs)[key]
+    overlay = tline_overlay if id_is_tline else node_overlay
+    rows = np.flatnonzero(match_ids(table.ids, overlay.ids)[0])
+    changed_table = table.take(rows)
+    scored_table = score_table(key, changed_table, node_overlay, tline_overlay)
+    scenario = base.copy()
+    for field in table.fields:
+        if scored_table.columns[field] is not changed_table.columns[field]:  # An adjusted column
+            scenario.columns[field] = patch_rows(base.columns[field], rows, scored_table.columns[field])
+    return scenario
+
+
+def score_table(key, table, node_policy, tline_policy):
+    ''' Apply a scenario's policies to one baseline AttrTable (or any subset
+        of its rows), identified by its key in baseline_csvs. Returns a new,
+        adjusted AttrTable. '''
+    table = table.copy()
+    if key == 'bus':
+        table.columns['@bstyp'] = adjust_type_values(table, node_policy, '@bstyp')
+        table.columns['@bsinf'] = adjust_info_values(table, node_policy, '@bsinf')
+    elif key == 'rail':
+        table.columns['@rstyp'] = adjust_type_values(table, node_policy, '@rstyp')
+        table.columns['@rsinf'] = adjust_info_values(table, node_policy, '@rsinf')
+        table.columns['@rspac'] = adjust_rspac_values(table, node_policy)
+    elif key == 'easeb':
+        table.columns['@easeb'] = adjust_easeb_values(table, tline_policy)
+    elif key == 'prof':
+        table.columns.update(adjust_prof_values(table, tline_policy))
+    elif key == 'relim':
+        table.columns['@relim'] = adjust_relim_values(table, tline_policy)
+    return table
+
+
+def table_from_rows(fields, rows, id_is_tline=False):
+    ''' Create an AttrTable from a list of CSV rows (lists of text values),
+        whose IDs are the first value in each row. '''
+    if rows:
+        values = np.array(rows, dtype='U')
+    else:
+        values = np.zeros((0, len(fields)), dtype='U1')
+    if id_is_tline:
+        ids = values[:, 0]
+    else:
+        ids = values[:, 0].astype(np.int64)
+    columns = dict((field, values[:, i]) for i, field in enumerate(fields))
+    return AttrTable(ids, fields, columns)
+
+
+def write_csv_columns(csv_file, fields, columns):
+    ''' Write aligned text columns to a CSV file, formatting blocks of rows
+        at a time and writing them through a large buffer. The CSV is written
+        to a temporary file that then replaces it, so a failed write never
+        leaves a partial CSV behind. Returns the CSV. '''
+    temp_file = csv_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)  # Never write through a leftover link to another file
+    try:
+        with open_csv(temp_file, 'w', csv_buffer_size) as attr_csv:
+            attr_csv.write(format_csv_rows([[field] for field in fields]))
+            n_rows = len(columns[0]) if columns else 0
+            for start in range(0, n_rows, csv_block_rows):
+                attr_csv.write(format_csv_rows([column[start:start + csv_block_rows] for column in columns]))
+        replace_file(temp_file, csv_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    return csv_file
+
+
+def write_scenario(scenario, output_dir):
+    ''' Write each of a scenario's AttrTables to its batchin CSV in a
+        directory. Returns a list of the CSVs written. '''
+    csv_files = []
+    for key, filename, id_is_tline in baseline_csvs:
+        csv_files.append(write_table_csv(os.path.join(output_dir, filename), scenario[key]))
+    return csv_files
+
+
+def write_table_csv(csv_file, table):
+    ''' Write an AttrTable to a CSV file, with rows sorted by ID. '''
+    order = None
+    if len(table) > 1 and not (table.ids[1:] >= table.ids[:-1]).all():
+        order = np.argsort(table.ids, kind='mergesort')
+    columns = [table.columns[field] if order is None else table.columns[field][order] for field in table.fields]
+    return write_csv_columns(csv_file, table.fields, columns)
+
+
+def _quote_csv_value(value):
+    ''' Quote a CSV value if it needs to be, as csv.writer does. '''
+    if any(char in value for char in csv_special_chars):
+        return '"{0}"'.format(value.replace('"', '""'))
+    return value
+
+
+def _weighted_score(policy, fwv, pos):
+    ''' Calculate the percentage improvement score for the policy rows at the
+        specified positions, from a sequence of (field, f, w) parameters. '''
+    improvement = 0
+    for field, f, w in fwv:
+        improvement = improvement + policy.columns[field][pos].astype(float) * f * w
+    max_improvement = sum([w for field, f, w in fwv])
+    return improvement / max_improvement
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+'''
+    tmm_sensitivity.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This script tests how sensitive a scenario's adjusted attributes are to
+    the scoring parameters in tmm_scoring.py (the field scale factors 'f' and
+    weights 'w' of type_fwv, easeb_fwv & prof_fwv, and the maximum type and
+    easeb values), by drawing thousands of parameter sets from specified
+    distributions and scoring the scenario under every one of them at once.
+
+    The parameters to vary are described in a JSON spec, e.g.:
+
+    {
+        "draws": 5000,
+        "seed": 1,
+        "parameters": {
+            "type_fwv.ADD_SHELTER.w": {"uniform": [0.5, 1.5]},
+            "type_fwv.FACELIFT.f": {"triangular": [0.1, 0.2, 0.25]},
+            "easeb_fwv.LOWER_FLOOR.w": {"normal": [1.0, 0.2]},
+            "max_type_value": {"uniform": [5.5, 6.5]},
+            "prof_fwv.ADD_WIFI.w": 0.1
+        }
+    }
+
+    Parameters are named "<table>.<field>.<f|w>" or "max_type_value" /
+    "max_easeb_value", and are either a fixed number or a "uniform" [low,
+    high], "normal" [mean, sd] or "triangular" [left, mode, right]
+    distribution. Any other parameters keep their values in tmm_scoring.py.
+
+    For each draw, every weighted score is a row of a (rows x fields) policy
+    matrix times a column of a (fields x draws) parameter matrix, so all of
+    the draws are scored together with a single matrix product (in blocks of
+    rows, to bound memory use). The scores are not rounded. For each stop and
+    line, the mean, standard deviation, minimum, 5th/50th/95th percentiles and
+    maximum of each adjusted attribute (@bstyp, @rstyp, @easeb, @prof1-3)
+    across the draws are written to <output>\\sensitivity_<CSV name>.csv.
+
+    Usage: python tmm_sensitivity.py <spec.json> <output dir> [--input-dir D]
+               [--node-table T] [--tline-table T] [--draws N] [--seed N]
+
+'''
+import argparse
+import csv
+import json
+import os
+import numpy as np
+import TMM
+import tmm_cache
+import tmm_gdb2csv
+import tmm_scoring
+
+distributions = ('uniform', 'normal', 'triangular')
+arg_counts = {'uniform': 2, 'normal': 2, 'triangular': 3}
+stat_names = ('mean', 'std', 'min', 'p05', 'p50', 'p95', 'max')
+block_cells = 4000000  # Rows x draws scored at a time
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def draw_parameters(parameters, draws, seed=None):
+    ''' Draw sets of scoring parameters from a dictionary of distributions
+        (see above). Returns a dictionary of arrays with a column per draw:
+        (fields x draws) f*w products and (draws) sums of w for each fwv
+        table, and (draws) values of max_type_value & max_easeb_value.
+        Raises ValueError for an invalid distribution, or a draw whose
+        weights for any fwv table sum to 0 (leaving its scores undefined). '''
+    rng = np.random.RandomState(seed)
+    known = set(['max_type_value', 'max_easeb_value'])
+    fwv_tables = {
+        'type_fwv': tmm_scoring.type_fwv,
+        'easeb_fwv': tmm_scoring.easeb_fwv,
+        'prof_fwv': tmm_scoring.prof_fwv,
+    }
+    for table_name, fwv in fwv_tables.items():
+        for field, f, w in fwv:
+            known.update(['{0}.{1}.f'.format(table_name, field), '{0}.{1}.w'.format(table_name, field)])
+    for name in parameters:
+        if name not in known:
+            raise ValueError('"{0}" is not a scoring parameter.'.format(name))
+
+    def values(name, default):
+        if name in parameters:
+            try:
+                return sample(parameters[name], draws, rng)
+            except ValueError as error:
+                raise ValueError('"{0}": {1}'.format(name, error))
+        return np.repeat(float(default), draws)
+
+    # Draw parameters in a fixed order, so a seed always gives the same draws
+    drawn = {}
+    for table_name in sorted(fwv_tables):
+        fw = []
+        w_sum = np.zeros(draws)
+        for field, f, w in fwv_tables[table_name]:
+            f_values = values('{0}.{1}.f'.format(table_name, field), f)
+            w_values = values('{0}.{1}.w'.format(table_name, field), w)
+            fw.append(f_values * w_values)
+            w_sum += w_values
+        zero_draws = np.flatnonzero(w_sum == 0)
+        if len(zero_draws):
+            raise ValueError('The {0} weights sum to 0 in {1} of {2} draws (first: draw {3}).'.format(
+                table_name, len(zero_draws), draws, zero_draws[0]))
+        drawn[table_name] = np.array(fw)
+        drawn[table_name + '_w_sum'] = w_sum
+    drawn['max_easeb_value'] = values('max_easeb_value', tmm_scoring.max_easeb_value)
+    drawn['max_type_value'] = values('max_type_value', tmm_scoring.max_type_value)
+    return drawn
+
+
+def policy_matrix(table_ids, policy, fields):
+    ''' Return a (rows x fields) matrix of the policy values of each table ID,
+        with zeroes for IDs that aren't in the policy table. '''
+    found, pos = tmm_scoring.match_ids(table_ids, policy.ids)
+    matrix = np.zeros((len(table_ids), len(fields)))
+    for j, field in enumerate(fields):
+        matrix[found, j] = policy.columns[field][pos[found]]
+    return matrix
+
+
+def read_spec(spec_path):
+    ''' Read a sensitivity spec from a JSON file. '''
+    with open(spec_path, 'r') as spec_file:
+        spec = json.load(spec_file)
+    spec.setdefault('draws', 1000)
+    spec.setdefault('seed', None)
+    spec.setdefault('parameters', {})
+    return spec
+
+
+def sample(distribution, draws, rng):
+    ''' Draw values from a fixed number or a distribution, raising ValueError
+        if the distribution is invalid. '''
+    if isinstance(distribution, (int, float)):
+        return np.repeat(float(distribution), draws)
+    if len(distribution) != 1 or list(distribution)[0] not in distributions:
+        raise ValueError('Expected a number or one of: {0}.'.format(', '.join(distributions)))
+    name, args = list(distribution.items())[0]
+    if len(args) != arg_counts[name]:
+        raise ValueError('A {0} distribution takes {1} values.'.format(name, arg_counts[name]))
+    if name == 'uniform' and args[0] > args[1]:
+        raise ValueError('A uniform distribution needs low <= high.')
+    elif name == 'normal' and args[1] < 0:
+        raise ValueError('A normal distribution needs sd >= 0.')
+    elif name == 'triangular' and (not args[0] <= args[1] <= args[2] or args[0] == args[2]):
+        raise ValueError('A triangular distribution needs left <= mode <= right, and left < right.')
+    if name == 'uniform':
+        return rng.uniform(args[0], args[1], draws)
+    elif name == 'normal':
+        return rng.normal(args[0], args[1], draws)
+    return rng.triangular(args[0], args[1], args[2], draws)
+
+
+def summarize_draws(draws):
+    ''' Summarize a (rows x draws) array by row. Returns a dictionary of
+        arrays, keyed by stat_names. '''
+    p05, p50, p95 = np.percentile(draws, [5, 50, 95], axis=1)
+    return {
+        'mean': draws.mean(axis=1),
+        'std': draws.std(axis=1),
+        'min': draws.min(axis=1),
+        'p05': p05,
+        'p50': p50,
+        'p95': p95,
+        'max': draws.max(axis=1),
+    }
+
+
+def sweep_scenario(baseline, node_policy, tline_policy, drawn):
+    ''' Score a scenario under every drawn parameter set. Returns a dictionary
+        keyed as in tmm_scoring.baseline_csvs (for the CSVs with adjusted
+        attributes) of (ids, {attribute: stats}). '''
+    type_fields = [field for field, f, w in tmm_scoring.type_fwv]
+    easeb_fields = [field for field, f, w in tmm_scoring.easeb_fwv]
+    prof_fields = [field for field, f, w in tmm_scoring.prof_fwv]
+    sweeps = {}
+    for key, type_field in (('bus', '@bstyp'), ('rail', '@rstyp')):
+        table = baseline[key]
+        values = policy_matrix(table.ids, node_policy, type_fields)
+        sweeps[key] = (table.ids, {type_field: _sweep_capped(
+            table.columns[type_field].astype(float), values,
+            drawn['type_fwv'], drawn['type_fwv_w_sum'], drawn['max_type_value'],
+        )})
+
+    table = baseline['easeb']
+    values = policy_matrix(table.ids, tline_policy, easeb_fields)
+    sweeps['easeb'] = (table.ids, {'@easeb': _sweep_capped(
+        table.columns['@easeb'].astype(float), values,
+        drawn['easeb_fwv'], drawn['easeb_fwv_w_sum'], drawn['max_easeb_value'],
+    )})
+
+    table = baseline['prof']
+    values = policy_matrix(table.ids, tline_policy, prof_fields)
+    sweeps['prof'] = (table.ids, dict(
+        (prof_field, _sweep_bonus(table.columns[prof_field].astype(float), values, drawn['prof_fwv']))
+        for prof_field in ('@prof1', '@prof2', '@prof3')
+    ))
+    return sweeps
+
+
+def write_sensitivity(sweeps, baseline, output_dir):
+    ''' Write the stats of each swept CSV to
+        output_dir\\sensitivity_<CSV name>.csv, with rows sorted by ID.
+        Returns a list of the CSVs written. '''
+    csv_files = []
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        if key not in sweeps:
+            continue
+        ids, stats = sweeps[key]
+        attributes = sorted(stats)
+        order = np.argsort(ids, kind='mergesort')
+        columns = [ids[order].tolist()]
+        fields = [baseline[key].fields[0]]
+        for attribute in attributes:
+            for stat_name in stat_names:
+                fields.append('{0}_{1}'.format(attribute, stat_name))
+                columns.append(np.round(stats[attribute][stat_name][order], 4).tolist())
+        csv_file = os.path.join(output_dir, 'sensitivity_{0}'.format(filename))
+        with tmm_scoring.open_csv(csv_file, 'w') as out_csv:
+            writer = csv.writer(out_csv)
+            writer.writerow(fields)
+            writer.writerows(zip(*columns))
+        csv_files.append(csv_file)
+    return csv_files
+
+
+def _sweep_blocks(n_rows, n_draws):
+    ''' Split rows into blocks of at most block_cells rows x draws. '''
+    block_rows = max(block_cells // max(n_draws, 1), 1)
+    return [slice(i, i + block_rows) for i in range(0, n_rows, block_rows)]
+
+
+def _sweep_bonus(current, values, fw):
+    ''' Subtract a weighted bonus from an attribute, as adjust_prof_values()
+        does, for every draw. Returns the stats of each row's values. '''
+    stats = dict((stat_name, np.empty(len(current))) for stat_name in stat_names)
+    for block in _sweep_blocks(len(current), fw.shape[1]):
+        adjusted = current[block, np.newaxis] - values[block].dot(fw)
+        for stat_name, stat_values in summarize_draws(adjusted).items():
+            stats[stat_name][block] = stat_values
+    return stats
+
+
+def _sweep_capped(current, values, fw, w_sum, max_values):
+    ''' Raise an attribute towards a maximum value by a weighted score, as
+        adjust_type_values() & adjust_easeb_values() do, for every draw.
+        Returns the stats of each row's values. '''
+    stats = dict((stat_name, np.empty(len(current))) for stat_name in stat_names)
+    for block in _sweep_blocks(len(current), fw.shape[1]):
+        block_current = current[block, np.newaxis]
+        pct_improvement = values[block].dot(fw) / w_sum
+        adjusted = block_current + (max_values - block_current) * pct_improvement
+        adjusted = np.where(block_current < max_values, adjusted, block_current)  # Maxed-out values are untouched
+        for stat_name, stat_values in summarize_draws(adjusted).items():
+            stats[stat_name][block] = stat_values
+    return stats
+
+
+# -----------------------------------------------------------------------------
+#  Run the sensitivity sweep.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Test the sensitivity of a TMM scenario to the scoring parameters.')
+    parser.add_argument('spec', help='JSON file describing the parameter distributions')
+    parser.add_argument('output_dir', help='directory to write the sensitivity CSVs to')
+    parser.add_argument('--input-dir', default=TMM.input_dir, help='directory of baseline CSVs (default: TMM input directory)')
+    parser.add_argument('--node-table', default=os.path.join(TMM.gdb, 'extra_attr_nodes'), help='node policy table')
+    parser.add_argument('--tline-table', default=os.path.join(TMM.gdb, 'extra_attr_tlines'), help='tline policy table')
+    parser.add_argument('--draws', type=int, help='number of parameter draws (overrides the spec)')
+    parser.add_argument('--seed', type=int, help='random seed (overrides the spec)')
+    args = parser.parse_args()
+
+    spec = read_spec(args.spec)
+    draws = args.draws if args.draws is not None else spec['draws']
+    seed = args.seed if args.seed is not None else spec['seed']
+
+    node_policy, tline_policy = tmm_gdb2csv.load_policy_tables(args.node_table, args.tline_table)
+    baseline = tmm_cache.read_baseline(args.input_dir)
+    drawn = draw_parameters(spec['parameters'], draws, seed)
+    sweeps = sweep_scenario(baseline, node_policy, tline_policy, drawn)
+    for csv_file in write_sensitivity(sweeps, baseline, TMM.ensure_dir(args.output_dir)):
+        print(csv_file)
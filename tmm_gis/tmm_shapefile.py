@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+'''
+    tmm_shapefile.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module reads the shapefiles exported from Emme (via the "Export
+    Network As Shapefile" Modeller tool) without arcpy, and can build the TMM
+    policy tables and indexes from them directly, without a geodatabase.
+
+    The .shp, .shx and .dbf files are memory-mapped rather than read. Only
+    the DBF columns that are asked for are decoded, each straight into an
+    array (e.g. a tseg file's LINE_ID, INODE & JNODE), and geometry is only
+    decoded for the records whose shapes are needed.
+
+    Usage: python tmm_shapefile.py <shapefile root dir> <output dir>
+               [--policy-ext .sqlite|.gpkg|.csv|.parquet|.feather]
+
+    The shapefile root directory contains a Scenario_10N folder for each TOD,
+    as for tmm_shp2gdb.py. The unique nodes & tlines across the TODs are
+    found as tmm_shp2gdb.py finds them (see tmm_network.py), and written to:
+      - extra_attr_nodes & extra_attr_tlines policy tables, with every policy
+        set to 0, in TMM_GIS.sqlite (or another tmm_backends format);
+      - the itinerary & spatial indexes (see tmm_itinerary.py and
+        tmm_spatial.py);
+      - tmm_shapefile_report.json (see tmm_instrument.py).
+
+'''
+import argparse
+import os
+import numpy as np
+import TMM
+import tmm_backends
+import tmm_instrument
+import tmm_itinerary
+import tmm_network
+import tmm_spatial
+
+shapefile_names = ('emme_nodes', 'emme_tlines', 'emme_tsegs')
+tod_periods = (1, 2, 3, 4, 5, 6, 7, 8)  # As in tmm_shp2gdb.py
+default_encoding = 'latin-1'  # If there is no .cpg file
+
+# Shape types (and their Z & M variants) whose records start with x,y or parts
+point_types = (1, 11, 21)
+polyline_types = (3, 13, 23, 5, 15, 25)
+
+
+# -----------------------------------------------------------------------------
+#  Define classes.
+# -----------------------------------------------------------------------------
+class DBFTable(object):
+    ''' A memory-mapped dBASE table, whose columns are decoded on request. '''
+
+    def __init__(self, dbf_path):
+        self.path = dbf_path
+        self._data = _map_file(dbf_path)
+        header = self._data[:32]
+        n_records = int(header[4:8].view('<u4')[0])
+        header_length = int(header[8:10].view('<u2')[0])
+        record_length = int(header[10:12].view('<u2')[0])
+
+        # Field descriptors are 32 bytes each, up to a 0x0D terminator
+        self.fields = []
+        self.field_types = {}
+        self.field_decimals = {}
+        names, formats, offsets = ['_deleted'], ['S1'], [0]
+        offset = 1
+        for pos in range(32, header_length - 1, 32):
+            if self._data[pos] == 0x0D:
+                break
+            descriptor = self._data[pos:pos + 32].tobytes()
+            name = descriptor[:11].split(b'\x00')[0].decode('ascii')
+            length = descriptor[16] if isinstance(descriptor[16], int) else ord(descriptor[16])
+            decimals = descriptor[17] if isinstance(descriptor[17], int) else ord(descriptor[17])
+            self.fields.append(name)
+            self.field_types[name] = descriptor[11:12].decode('ascii').upper()
+            self.field_decimals[name] = decimals
+            names.append(name)
+            formats.append('S{0}'.format(length))
+            offsets.append(offset)
+            offset += length
+
+        # View the records as a structured array, without copying them
+        n_records = min(n_records, (len(self._data) - header_length) // max(record_length, 1))
+        record_dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': record_length})
+        self._records = self._data[header_length:header_length + n_records * record_length].view(record_dtype)
+        self.encoding = _read_encoding(dbf_path)
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def deleted(self):
+        ''' A boolean array flagging the records marked as deleted. '''
+        return self._records['_deleted'] == b'*'
+
+    def column(self, field):
+        ''' Decode a column: numbers as floats (or integers, for numeric
+            fields with no decimals and no blanks), logicals as booleans and
+            anything else as text. '''
+        raw = self._records[field]
+        field_type = self.field_types[field]
+        if field_type in ('N', 'F'):
+            values = np.char.strip(raw)
+            blank = (values == b'') | (np.char.find(values, b'*') >= 0)
+            if blank.any():
+                values = np.where(blank, b'nan', values)
+            values = values.astype(float)
+            if field_type == 'N' and self.field_decimals[field] == 0 and not blank.any():
+                return values.astype(np.int64)
+            return values
+        elif field_type == 'L':
+            first = raw.astype('S1')
+            return (first == b'T') | (first == b't') | (first == b'Y') | (first == b'y')
+        return np.char.rstrip(np.char.decode(raw, self.encoding), ' \x00')
+
+    def columns(self, fields):
+        ''' Decode several columns. Returns a dictionary of arrays. '''
+        return dict((field, self.column(field)) for field in fields)
+
+
+class ShapeFile(object):
+    ''' A memory-mapped shapefile (.shp & .shx, plus its .dbf attributes),
+        whose shapes are decoded on request. '''
+
+    def __init__(self, shp_path):
+        base_path = os.path.splitext(shp_path)[0]
+        self.path = shp_path
+        self._shp = _map_file(shp_path)
+        self.shape_type = int(self._shp[32:36].view('<i4')[0])
+        shx = _map_file(base_path + '.shx')
+        index = shx[100:100 + (len(shx) - 100) // 8 * 8].view('>i4').reshape(-1, 2)
+        self._offsets = index[:, 0].astype(np.int64) * 2  # 16-bit words
+        self.dbf = DBFTable(base_path + '.dbf')
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def columns(self, fields):
+        ''' Decode several attribute columns. Returns a dictionary of arrays. '''
+        return self.dbf.columns(fields)
+
+    def point_xy(self, records=None):
+        ''' Return an (n x 2) array of the x,y of every point (or of the
+            specified record numbers), with NaNs for null shapes. '''
+        if self.shape_type not in point_types:
+            raise ValueError('{0} is not a point shapefile.'.format(self.path))
+        offsets = self._offsets if records is None else self._offsets[np.asarray(records, dtype=np.int64)]
+        shape_types = self._shp[offsets[:, np.newaxis] + 8 + np.arange(4)].view('<i4').ravel()
+        xy_bytes = np.minimum(offsets[:, np.newaxis] + 12 + np.arange(16), len(self._shp) - 1)  # A null shape may end the file
+        xy = self._shp[xy_bytes].view('<f8').copy()
+        xy[shape_types == 0] = np.nan
+        return xy
+
+    def shape(self, record):
+        ''' Decode a record's shape: an (x, y) tuple for a point, a list of
+            parts (lists of (x, y) tuples) for a polyline or polygon, or None
+            for a null shape. '''
+        offset = int(self._offsets[record]) + 8
+        shape_type = int(self._shp[offset:offset + 4].view('<i4')[0])
+        if shape_type == 0:
+            return None
+        elif shape_type in point_types:
+            return tuple(self._shp[offset + 4:offset + 20].view('<f8').tolist())
+        elif shape_type in polyline_types:
+            n_parts, n_points = self._shp[offset + 36:offset + 44].view('<i4').tolist()
+            parts_start = offset + 44
+            points_start = parts_start + 4 * n_parts
+            part_starts = self._shp[parts_start:points_start].view('<i4').tolist() + [n_points]
+            points = self._shp[points_start:points_start + 16 * n_points].view('<f8').reshape(-1, 2)
+            return [[tuple(point) for point in points[start:end].tolist()] for start, end in zip(part_starts[:-1], part_starts[1:])]
+        raise ValueError('Shape type {0} is not supported.'.format(shape_type))
+
+    def shapes(self, records=None):
+        ''' Yield the shape of every record (or of the specified records). '''
+        for record in (range(len(self)) if records is None else records):
+            yield self.shape(record)
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def find_shapefiles(shp_dir):
+    ''' Find the Emme shapefiles (nodes, tlines & tsegs) in a directory or its
+        subdirectories. Returns a dictionary of paths keyed by name. '''
+    shapefiles = {}
+    for dirpath, dirnames, filenames in os.walk(shp_dir):
+        for filename in filenames:
+            name, ext = os.path.splitext(filename)
+            if ext.lower() == '.shp' and name in shapefile_names and name not in shapefiles:
+                shapefiles[name] = os.path.join(dirpath, filename)
+    missing = [name for name in shapefile_names if name not in shapefiles]
+    if missing:
+        raise ValueError('No {0} shapefile in {1}.'.format(', '.join(missing), shp_dir))
+    return shapefiles
+
+
+def ingest_network(shp_root_dir, out_dir, policy_ext='.sqlite', report=None):
+    ''' Build the policy tables and itinerary & spatial indexes for the
+        Scenario_10N shapefiles in shp_root_dir, in out_dir. Returns a
+        dictionary of the paths written: 'node_table', 'tline_table',
+        'itinerary_index' and 'spatial_index'. '''
+    with tmm_instrument.stage(report, 'read TOD shapefiles') as stage:
+        tod_files = {}
+        tod_ids = {}
+        for tod in tod_periods:
+            tod_files[tod] = find_shapefiles(os.path.join(shp_root_dir, 'Scenario_10{0}'.format(tod)))
+            tod_ids[tod] = read_tod_ids(tod_files[tod])
+        stage['rows_in'] = sum(
+            len(ids['tline_ids']) + len(ids['tseg_line_ids']) + len(ids['node_ids']) for ids in tod_ids.values()
+        )
+
+    # Identify unique node/tline IDs, in TOD order, as tmm_shp2gdb.py does
+    with tmm_instrument.stage(report, 'merge TODs') as stage:
+        unique_nodes = set()
+        unique_tlines = set()
+        new_oids = {}
+        for tod in tod_periods:
+            new_oids[tod] = tmm_network.merge_tod_ids(tod_ids[tod], unique_tlines, unique_nodes)
+        stage['rows_modified'] = len(unique_tlines) + len(unique_nodes)
+
+    paths = {}
+    if policy_ext in tmm_backends.sqlite_exts:
+        paths['node_table'] = os.path.join(out_dir, TMM.gdb_name + policy_ext, 'extra_attr_nodes')
+        paths['tline_table'] = os.path.join(out_dir, TMM.gdb_name + policy_ext, 'extra_attr_tlines')
+    else:
+        paths['node_table'] = os.path.join(out_dir, 'extra_attr_nodes' + policy_ext)
+        paths['tline_table'] = os.path.join(out_dir, 'extra_attr_tlines' + policy_ext)
+
+    with tmm_instrument.stage(report, 'write policy tables', rows_modified=len(unique_tlines) + len(unique_nodes)):
+        tmm_backends.create_policy_table(paths['tline_table'], 'TLINE_ID', unique_tlines, TMM.tline_fields, id_is_tline=True)
+        tmm_backends.create_policy_table(paths['node_table'], 'NODE_ID', unique_nodes, TMM.node_fields)
+
+    with tmm_instrument.stage(report, 'build itinerary index') as stage:
+        paths['itinerary_index'] = tmm_itinerary.ItineraryIndex.from_tod_ids(tod_ids).save(
+            os.path.join(out_dir, tmm_itinerary.index_file_name))
+        stage['rows_in'] = sum(len(ids['tseg_line_ids']) for ids in tod_ids.values())
+
+    # Decode the geometry of only the unique nodes & tlines
+    with tmm_instrument.stage(report, 'build spatial index') as stage:
+        node_ids, node_xy, tline_ids, seg_xy, seg_line = [], [], [], [], []
+        for tod in tod_periods:
+            new_tline_oids, new_node_oids = new_oids[tod]
+            tline_records = np.asarray(new_tline_oids, dtype=np.int64) - 1
+            node_records = np.asarray(new_node_oids, dtype=np.int64) - 1
+            tline_shp = ShapeFile(tod_files[tod]['emme_tlines'])
+            node_shp = ShapeFile(tod_files[tod]['emme_nodes'])
+
+            xy = node_shp.point_xy(node_records)
+            located = ~np.isnan(xy).any(axis=1)
+            node_ids.append(np.asarray(tod_ids[tod]['node_ids'], dtype=np.int64)[node_records[located]])
+            node_xy.append(xy[located])
+
+            for record, shape in zip(tline_records.tolist(), tline_shp.shapes(tline_records.tolist())):
+                line_index = len(tline_ids)
+                tline_ids.append(tod_ids[tod]['tline_ids'][record])
+                for part in shape or []:
+                    for start, end in zip(part[:-1], part[1:]):
+                        seg_xy.append(start + end)
+                        seg_line.append(line_index)
+        spatial_index = tmm_spatial.SpatialIndex.from_geometry(
+            np.concatenate([np.zeros(0, dtype=np.int64)] + node_ids), np.concatenate([np.zeros((0, 2))] + node_xy),
+            np.array(tline_ids, dtype='U'), seg_xy, seg_line,
+        )
+        paths['spatial_index'] = spatial_index.save(os.path.join(out_dir, tmm_spatial.index_file_name))
+        stage['rows_in'] = len(spatial_index.node_ids) + len(spatial_index.tline_ids)
+    return paths
+
+
+def read_tod_ids(shapefiles):
+    ''' Read the tline, tseg & node IDs of a TOD's shapefiles (from
+        find_shapefiles()) into the dictionary of lists expected by
+        tmm_network.merge_tod_ids(), as tmm_shp2gdb.read_tod_ids() reads them
+        from the TOD's feature classes. OIDs are record numbers, from 1.
+        Only the DBF files are read. '''
+    tod_ids = {}
+    for name, keys, fields in (
+            ('emme_tlines', ('tline_oids', 'tline_ids'), ['ID']),
+            ('emme_tsegs', ('tseg_line_ids', 'tseg_inodes', 'tseg_jnodes'), ['LINE_ID', 'INODE', 'JNODE']),
+            ('emme_nodes', ('node_oids', 'node_ids'), ['ID'])):
+        dbf = DBFTable(os.path.splitext(shapefiles[name])[0] + '.dbf')
+        records = np.flatnonzero(~dbf.deleted)
+        columns = [dbf.column(field)[records] for field in fields]
+        if name == 'emme_nodes':
+            columns[0] = np.rint(columns[0]).astype(np.int64)  # Emme node IDs are floats
+        if keys[0].endswith('_oids'):
+            columns.insert(0, records + 1)
+        for key, column in zip(keys, columns):
+            tod_ids[key] = column.tolist()
+    return tod_ids
+
+
+def _map_file(file_path):
+    ''' Memory-map a file as an array of bytes (or read an empty one). '''
+    if os.path.getsize(file_path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(file_path, dtype=np.uint8, mode='r')
+
+
+def _read_encoding(dbf_path):
+    ''' Read a DBF's encoding from its .cpg file, if it has one. '''
+    cpg_path = os.path.splitext(dbf_path)[0] + '.cpg'
+    if os.path.exists(cpg_path):
+        with open(cpg_path, 'r') as cpg_file:
+            encoding = cpg_file.read().strip()
+        try:
+            u''.encode(encoding)
+            return encoding
+        except LookupError:
+            pass
+    return default_encoding
+
+
+# -----------------------------------------------------------------------------
+#  Build the policy tables & indexes.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the TMM policy tables & indexes from Emme shapefiles, without arcpy.')
+    parser.add_argument('shp_root_dir', help='directory containing the Scenario_101-108 shapefile folders')
+    parser.add_argument('output_dir', help='directory to write the policy tables & indexes to')
+    parser.add_argument('--policy-ext', default='.sqlite', help='policy table format (default: .sqlite)')
+    args = parser.parse_args()
+
+    output_dir = TMM.ensure_dir(args.output_dir)
+    report = tmm_instrument.RunReport('tmm_shapefile')
+    for name, path in sorted(ingest_network(args.shp_root_dir, output_dir, args.policy_ext, report).items()):
+        print('{0}: {1}'.format(name, path))
+    report.write(output_dir)
@@ -2,7 +2,7 @@
 '''
     tmm_shp2gdb.py
     Author: npeterson
-    Revised: 3/19/2014
+    Revised: 10/17/2026
     ---------------------------------------------------------------------------
     This script will convert a set of shapefiles generated from all 8 TODs in
     an Emme network (via Emme's "Export Network As Shapefile" Modeller tool)
@@ -10,42 +10,76 @@
 
     This script will also iterate through TMM nodes and transit lines,
     creating tables to store specific policy-based extra attributes for each
-    unique feature.
+    unique feature. Each table is written in one pass from an array with
+    every policy field already set to 0 (see tmm_backends.py).
 
-'''
-import os
-import sys
-import arcpy
-import TMM
+    The shapefiles for each TOD are converted concurrently by a pool of
+    worker processes, each writing to its own scratch geodatabase. The TOD
+    feature datasets are then copied into the new geodatabase and merged
+    into the all-day feature classes in TOD order, so the results don't
+    depend on which worker finishes first. Unique nodes & tlines are found
+    with in-memory sets (see tmm_network.py) and appended by OID.
 
-# Set parameters:
-shp_root_dir = arcpy.GetParameterAsText(0)  # 'C:\\WorkSpace\\TransitModernizationModel\\TMM_Test\\Media'
+    The time taken and rows read & added by each stage are written to
+    tmm_shp2gdb_report.json, alongside the geodatabase (see
+    tmm_instrument.py).
 
+    The tline -> stop itineraries of each TOD (and the reverse, node ->
+    serving tlines) are indexed for applying node policies to every stop of
+    a route (see tmm_itinerary.py). Finally, the all-day nodes & tlines are
+    indexed by location, for applying policies to stops & lines near a point
+    or inside an area (see tmm_spatial.py).
 
-# Create geodatabase:
-arcpy.AddMessage('\nCreating geodatabase {0}...\n'.format(TMM.gdb))
-TMM.delete_if_exists(TMM.gdb)
-arcpy.CreateFileGDB_management(TMM.gdb_dir, TMM.gdb_name)
+    Where arcpy isn't available, or no geodatabase is needed, tmm_shapefile.py
+    builds the policy tables and indexes from the same shapefiles directly.
 
-
-# Create TOD-specific FDs and FCs from shapefiles and identify unique node/tline IDs:
-unique_nodes = set()
-unique_tlines = set()
-
-for tod in (1, 2, 3, 4, 5, 6, 7, 8):
-    arcpy.AddMessage('TOD {0}:'.format(tod))
+'''
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import TMM
+import tmm_backends
+import tmm_instrument
+import tmm_itinerary
+import tmm_network
+import tmm_spatial
+arcpy = TMM.import_arcpy()
+
+tod_periods = (1, 2, 3, 4, 5, 6, 7, 8)
+
+
+# Define functions:
+def append_rows(in_fc, out_fc, oids):
+    ''' Append the rows of a feature class with the specified OIDs to another
+        feature class with the same schema, selecting them by OID in memory
+        rather than with a where clause. Returns the number of rows actually
+        inserted. '''
+    in_fields = set(field.name for field in arcpy.ListFields(in_fc))
+    fields = ['SHAPE@'] + [
+        field.name for field in arcpy.ListFields(out_fc)
+        if field.editable and field.type not in ('OID', 'Geometry') and field.name in in_fields
+    ]
+    oids = set(oids)
+    inserted = 0
+    with arcpy.da.SearchCursor(in_fc, ['OID@'] + fields) as s_cursor, arcpy.da.InsertCursor(out_fc, fields) as i_cursor:
+        for row in s_cursor:
+            if row[0] in oids:
+                i_cursor.insertRow(row[1:])
+                inserted += 1
+    return inserted
+
+
+def convert_tod(shp_root_dir, tod, scratch_dir):
+    ''' Create a scratch geodatabase containing a TOD's feature dataset, with
+        a feature class for each of its shapefiles. Returns the path of the
+        feature dataset and its IDs (see read_tod_ids()). '''
     shp_dir = os.path.join(shp_root_dir, 'Scenario_10{0}'.format(tod))
     tod_fd_name = 'tod_{0}'.format(tod)
-    tod_fd = os.path.join(TMM.gdb, tod_fd_name)
-    day_fd_name = 'tod_all'
-    day_fd = os.path.join(TMM.gdb, day_fd_name)
+    scratch_gdb = arcpy.CreateFileGDB_management(scratch_dir, tod_fd_name).getOutput(0)
+    tod_fd = arcpy.CreateFeatureDataset_management(scratch_gdb, tod_fd_name, TMM.proj).getOutput(0)
 
-    arcpy.AddMessage('-- Creating feature dataset...')
-    arcpy.CreateFeatureDataset_management(TMM.gdb, tod_fd_name, TMM.proj)
-    if not arcpy.Exists(day_fd):
-        arcpy.CreateFeatureDataset_management(TMM.gdb, day_fd_name, TMM.proj)
-
-    arcpy.AddMessage('-- Creating feature classes from shapefiles...')
     for dirpath, dirnames, filenames in arcpy.da.Walk(shp_dir):
         for filename in filenames:
             if filename.endswith('.shp'):
@@ -54,91 +88,144 @@ for tod in (1, 2, 3, 4, 5, 6, 7, 8):
                 arcpy.DefineProjection_management(shp_file, TMM.proj)
                 arcpy.CopyFeatures_management(shp_file, gdb_fc)
 
+    # Create an integer version of the nodes 'ID' field (which is FLOAT):
     node_fc = os.path.join(tod_fd, 'emme_nodes_{0}'.format(tod))
+    arcpy.AddField_management(node_fc, TMM.node_id_int_field, 'LONG')
+    arcpy.CalculateField_management(node_fc, TMM.node_id_int_field, 'int(round(!ID!))', 'PYTHON_9.3')
+    return tod_fd, read_tod_ids(tod_fd, tod)
+
+
+def convert_tods(shp_root_dir, scratch_dir, processes=None):
+    ''' Convert every TOD's shapefiles concurrently. Returns a list of the
+        scratch feature datasets & their IDs, in TOD order. '''
+    if processes is None:
+        processes = min(len(tod_periods), multiprocessing.cpu_count())
+    if processes <= 1:
+        return [convert_tod(shp_root_dir, tod, scratch_dir) for tod in tod_periods]
+
+    # When run from ArcMap, sys.executable is ArcMap itself, not Python:
+    if not os.path.basename(sys.executable).lower().startswith('python'):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_convert_tod_args, [(shp_root_dir, tod, scratch_dir) for tod in tod_periods], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def read_tod_ids(tod_fd, tod):
+    ''' Read the tline, tseg & node IDs of a TOD feature dataset into the
+        dictionary of lists expected by tmm_network.merge_tod_ids(). '''
+    tod_ids = {}
     tline_fc = os.path.join(tod_fd, 'emme_tlines_{0}'.format(tod))
     tseg_fc = os.path.join(tod_fd, 'emme_tsegs_{0}'.format(tod))
+    node_fc = os.path.join(tod_fd, 'emme_nodes_{0}'.format(tod))
+    for fc, keys, fields in (
+            (tline_fc, ('tline_oids', 'tline_ids'), ['OID@', 'ID']),
+            (tseg_fc, ('tseg_line_ids', 'tseg_inodes', 'tseg_jnodes'), ['LINE_ID', 'INODE', 'JNODE']),
+            (node_fc, ('node_oids', 'node_ids'), ['OID@', TMM.node_id_int_field])):
+        with arcpy.da.SearchCursor(fc, fields) as cursor:
+            columns = list(zip(*cursor)) or [[] for field in fields]
+        for key, column in zip(keys, columns):
+            tod_ids[key] = list(column)
+    return tod_ids
 
-    # Create an integer version of the nodes 'ID' field (which is FLOAT):
-    arcpy.AddField_management(node_fc, TMM.node_id_int_field, 'LONG')
-    arcpy.CalculateField_management(node_fc, TMM.node_id_int_field, 'int(round(!ID!))', 'PYTHON_9.3')
 
-    # Append unique tlines to all-day fc:
-    arcpy.AddMessage('-- Identifying unique tlines...')
+def _convert_tod_args(args):
+    ''' Unpack convert_tod() arguments passed through Pool.map(). '''
+    return convert_tod(*args)
+
+
+if __name__ == '__main__':
+
+    # Set parameters:
+    shp_root_dir = arcpy.GetParameterAsText(0)  # 'C:\\WorkSpace\\TransitModernizationModel\\TMM_Test\\Media'
+    report = tmm_instrument.RunReport('tmm_shp2gdb')
+
+    # Create geodatabase:
+    arcpy.AddMessage('\nCreating geodatabase {0}...\n'.format(TMM.gdb))
+    with report.stage('create geodatabase'):
+        TMM.delete_if_exists(TMM.gdb)
+        arcpy.CreateFileGDB_management(TMM.gdb_dir, TMM.gdb_name)
+
+
+    # Create TOD-specific FDs and FCs from shapefiles, in parallel:
+    arcpy.AddMessage('Creating TOD feature datasets from shapefiles...\n')
+    scratch_dir = tempfile.mkdtemp(prefix='tmm_shp2gdb_', dir=TMM.gdb_dir)
+    with report.stage('convert TOD shapefiles') as stage:
+        converted_tods = convert_tods(shp_root_dir, scratch_dir)
+        stage['rows_in'] = sum(
+            len(tod_ids['tline_ids']) + len(tod_ids['tseg_line_ids']) + len(tod_ids['node_ids'])
+            for scratch_fd, tod_ids in converted_tods
+        )
+
+
+    # Merge TOD FDs into geodatabase and identify unique node/tline IDs, in TOD order:
+    unique_nodes = set()
+    unique_tlines = set()
+
+    day_fd_name = 'tod_all'
+    day_fd = os.path.join(TMM.gdb, day_fd_name)
+    arcpy.CreateFeatureDataset_management(TMM.gdb, day_fd_name, TMM.proj)
     day_tline_fc = os.path.join(day_fd, 'emme_tlines_all')
     day_node_fc = os.path.join(day_fd, 'emme_nodes_all')
 
-    new_tlines_lyr = 'new_tlines_lyr'
-    if not arcpy.Exists(day_tline_fc):
-        arcpy.MakeFeatureLayer_management(tline_fc, new_tlines_lyr)
-        arcpy.CopyFeatures_management(new_tlines_lyr, day_tline_fc)
-    else:
-        new_tlines_query = ''' "ID" NOT IN ('{0}') '''.format("','".join((tline_id for tline_id in unique_tlines)))
-        arcpy.MakeFeatureLayer_management(tline_fc, new_tlines_lyr, new_tlines_query)
-        arcpy.Append_management([new_tlines_lyr], day_tline_fc)
-
-    # Append new unique nodes from TOD's itineraries to all-day fc:
-    arcpy.AddMessage('-- Identifying unique nodes...\n')
-    new_tlines = [row[0] for row in arcpy.da.SearchCursor(new_tlines_lyr, ['ID'])]
-    new_tsegs_lyr = 'new_tsegs_lyr'
-    new_tsegs_query = ''' "LINE_ID" IN ('{0}') '''.format("','".join((tline_id for tline_id in new_tlines)))
-    arcpy.MakeFeatureLayer_management(tseg_fc, new_tsegs_lyr, new_tsegs_query)
-    new_tline_nodes = set()
-    with arcpy.da.SearchCursor(new_tsegs_lyr, ['INODE', 'JNODE']) as cursor:
-        for row in cursor:
-            new_tline_nodes.update(row)
-    new_nodes = new_tline_nodes.difference(unique_nodes)
-
-    if not arcpy.Exists(day_node_fc):
-        arcpy.CreateFeatureclass_management(os.path.split(day_node_fc)[0], os.path.split(day_node_fc)[1], 'POINT', node_fc)
-    new_nodes_lyr = 'new_nodes_lyr'
-    new_nodes_query = ''' "{0}" IN ({1}) '''.format(TMM.node_id_int_field, ','.join((str(node_id) for node_id in new_nodes)))
-    arcpy.MakeFeatureLayer_management(node_fc, new_nodes_lyr, new_nodes_query)
-    arcpy.Append_management([new_nodes_lyr], day_node_fc)
-
-    arcpy.Delete_management(new_tlines_lyr)
-    arcpy.Delete_management(new_tsegs_lyr)
-    arcpy.Delete_management(new_nodes_lyr)
-
-    # Update global list of unique IDs:
-    unique_tlines.update(new_tlines)
-    unique_nodes.update(new_nodes)
-
-
-# Create extra attribute tables:
-arcpy.AddMessage('Creating tline extra attribute table...')
-tline_table_name = 'extra_attr_tlines'
-tline_table = os.path.join(TMM.gdb, tline_table_name)
-arcpy.CreateTable_management(TMM.gdb, tline_table_name)
-
-arcpy.AddMessage('Creating node extra attribute table...\n')
-node_table_name = 'extra_attr_nodes'
-node_table = os.path.join(TMM.gdb, node_table_name)
-arcpy.CreateTable_management(TMM.gdb, node_table_name)
-
-
-# Populate extra attibute tables with unique IDs:
-arcpy.AddMessage('Populating tline table with IDs...')
-arcpy.AddField_management(tline_table, 'TLINE_ID', 'TEXT', field_length=20)
-with arcpy.da.InsertCursor(tline_table, ['TLINE_ID']) as cursor:
-    for tline_id in sorted(list(unique_tlines)):
-        cursor.insertRow([tline_id])
-
-arcpy.AddMessage('Populating node table with IDs...\n')
-arcpy.AddField_management(node_table, 'NODE_ID', 'LONG')
-with arcpy.da.InsertCursor(node_table, ['NODE_ID']) as cursor:
-    for node_id in sorted(list(unique_nodes)):
-        cursor.insertRow([node_id])
-
-
-# Add policy fields to node/tline tables:
-arcpy.AddMessage('Adding extra attribute fields to tline table...')
-for field_name in TMM.tline_fields:
-    arcpy.AddField_management(tline_table, field_name, 'SHORT')
-    arcpy.CalculateField_management(tline_table, field_name, '0', 'PYTHON')
-
-arcpy.AddMessage('Adding extra attribute fields to node table...\n')
-for field_name in TMM.node_fields:
-    arcpy.AddField_management(node_table, field_name, 'SHORT')
-    arcpy.CalculateField_management(node_table, field_name, '0', 'PYTHON')
-
-arcpy.AddMessage('All done!\n')
+    for tod, (scratch_fd, tod_ids) in zip(tod_periods, converted_tods):
+        arcpy.AddMessage('TOD {0}:'.format(tod))
+        tod_fd = os.path.join(TMM.gdb, 'tod_{0}'.format(tod))
+
+        with report.stage('copy TOD {0}'.format(tod)):
+            arcpy.AddMessage('-- Copying feature dataset...')
+            arcpy.Copy_management(scratch_fd, tod_fd)
+
+        scratch_node_fc = os.path.join(scratch_fd, 'emme_nodes_{0}'.format(tod))
+        scratch_tline_fc = os.path.join(scratch_fd, 'emme_tlines_{0}'.format(tod))
+        if not arcpy.Exists(day_tline_fc):
+            arcpy.CreateFeatureclass_management(day_fd, 'emme_tlines_all', 'POLYLINE', scratch_tline_fc)
+            arcpy.CreateFeatureclass_management(day_fd, 'emme_nodes_all', 'POINT', scratch_node_fc)
+
+        # Append new unique tlines, and new unique nodes from their itineraries, to all-day fcs:
+        with report.stage('merge TOD {0}'.format(tod)) as stage:
+            arcpy.AddMessage('-- Identifying unique tlines & nodes...\n')
+            new_tline_oids, new_node_oids = tmm_network.merge_tod_ids(tod_ids, unique_tlines, unique_nodes)
+            stage['rows_in'] = len(tod_ids['tline_ids']) + len(tod_ids['node_ids'])
+            stage['rows_modified'] = (
+                append_rows(scratch_tline_fc, day_tline_fc, new_tline_oids) +
+                append_rows(scratch_node_fc, day_node_fc, new_node_oids)
+            )
+
+    # Delete scratch geodatabases:
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+    # Index each TOD's tline itineraries, for policies applied to a route's stops:
+    with report.stage('build itinerary index') as stage:
+        arcpy.AddMessage('Building itinerary index...\n')
+        itinerary_index = tmm_itinerary.ItineraryIndex.from_tod_ids(
+            dict((tod, tod_ids) for tod, (scratch_fd, tod_ids) in zip(tod_periods, converted_tods))
+        )
+        itinerary_index.save(tmm_itinerary.default_index_file(TMM.gdb))
+        stage['rows_in'] = sum(len(tod_ids['tseg_line_ids']) for scratch_fd, tod_ids in converted_tods)
+
+
+    # Create extra attribute tables, with every policy field set to 0:
+    with report.stage('create policy tables', rows_modified=len(unique_tlines) + len(unique_nodes)):
+        arcpy.AddMessage('Creating tline extra attribute table...')
+        tline_table = os.path.join(TMM.gdb, 'extra_attr_tlines')
+        tmm_backends.create_policy_table(tline_table, 'TLINE_ID', unique_tlines, TMM.tline_fields, id_is_tline=True)
+
+        arcpy.AddMessage('Creating node extra attribute table...\n')
+        node_table = os.path.join(TMM.gdb, 'extra_attr_nodes')
+        tmm_backends.create_policy_table(node_table, 'NODE_ID', unique_nodes, TMM.node_fields)
+
+
+    # Index node & tline locations, for policies applied by location:
+    with report.stage('build spatial index') as stage:
+        arcpy.AddMessage('Building spatial index...\n')
+        spatial_index = tmm_spatial.build_index(TMM.gdb)
+        spatial_index.save(tmm_spatial.default_index_file(TMM.gdb))
+        stage['rows_in'] = len(spatial_index.node_ids) + len(spatial_index.tline_ids)
+
+    arcpy.AddMessage('All done!\n')
+    report.write(TMM.gdb_dir)
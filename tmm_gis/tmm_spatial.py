@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+'''
+    tmm_spatial.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module selects nodes and tlines by location, and applies policies to
+    them, without the ArcMap selections needed by tmm_policy_nodes.py and
+    tmm_policy_tlines.py (or any Select By Location round trips).
+
+    The node points of tod_all\\emme_nodes_all and the segments of the tline
+    polylines in tod_all\\emme_tlines_all are indexed on a uniform grid,
+    which is built by tmm_shp2gdb.py and saved as TMM_GIS_spatial.npz
+    alongside TMM_GIS.gdb. Queries only test the items in the grid cells
+    they overlap, so they take milliseconds even for the whole network:
+      - buffer:   nodes/tlines within a distance of any of a set of points,
+                  or of any of a set of nodes (e.g. Metra stations)
+      - polygon:  nodes inside, or tlines crossing, a polygon (e.g. the Loop)
+      - nearest:  the k nodes/tlines nearest to a point
+
+    Distances & coordinates are in the units of TMM_NAD27.prj. Queries are
+    described by dictionaries, e.g.:
+
+        {"buffer": {"node_ids": [30001, 30002], "distance": 1320}}
+        {"buffer": {"points": [[1176000, 1902000]], "distance": 2640}}
+        {"polygon": [[1173000, 1899000], [1180000, 1899000], [1180000, 1904000], [1173000, 1904000]]}
+        {"nearest": {"point": [1176000, 1902000], "k": 10}}
+
+    The IDs selected by a query can be written straight into the policy
+    tables with apply_spatial_policy(), or from the command line:
+
+        python tmm_spatial.py --build
+        python tmm_spatial.py <nodes|tlines> <query.json> FIELD=VALUE [...]
+
+'''
+import argparse
+import json
+import os
+import numpy as np
+import TMM
+import tmm_backends
+
+index_file_name = '{0}_spatial.npz'.format(TMM.gdb_name)
+items_per_cell = 4  # Average nodes per grid cell
+max_grid_cells = 4000000
+
+
+# -----------------------------------------------------------------------------
+#  Define classes.
+# -----------------------------------------------------------------------------
+class SpatialIndex(object):
+    ''' A uniform grid index of node points and tline segments. '''
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.node_ids = arrays['node_ids']
+        self.node_xy = arrays['node_xy']
+        self.tline_ids = arrays['tline_ids']
+        self.seg_xy = arrays['seg_xy']
+        self.seg_line = arrays['seg_line']
+        self.origin = arrays['origin']
+        self.cell_size = float(arrays['cell_size'])
+        self.shape = tuple(int(n) for n in arrays['shape'])
+        self._node_order = np.argsort(self.node_ids, kind='mergesort')
+
+    @classmethod
+    def from_geometry(cls, node_ids, node_xy, tline_ids, seg_xy, seg_line):
+        ''' Index nodes (IDs & an array of x,y) and tline segments (an array of
+            x1,y1,x2,y2 and the index in tline_ids of each one's tline). '''
+        node_xy = np.asarray(node_xy, dtype=float).reshape(-1, 2)
+        seg_xy = np.asarray(seg_xy, dtype=float).reshape(-1, 4)
+        all_xy = np.concatenate([node_xy, seg_xy[:, :2], seg_xy[:, 2:]])
+        if len(all_xy):
+            origin = all_xy.min(axis=0)
+            extent = np.maximum(all_xy.max(axis=0) - origin, 1.0)
+        else:
+            origin = np.zeros(2)
+            extent = np.ones(2)
+
+        # Size cells to hold a few nodes each, on average
+        cell_size = np.sqrt(extent[0] * extent[1] * items_per_cell / max(len(node_xy), 1))
+        cell_size = max(cell_size, np.sqrt(extent[0] * extent[1] / max_grid_cells))
+        shape = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+
+        arrays = {
+            'node_ids': np.asarray(node_ids),
+            'node_xy': node_xy,
+            'tline_ids': np.asarray(tline_ids),
+            'seg_xy': seg_xy,
+            'seg_line': np.asarray(seg_line, dtype=np.int64),
+            'origin': origin,
+            'cell_size': np.array(cell_size),
+            'shape': shape,
+        }
+        index = cls(arrays)
+        node_cells = index._cell_of(node_xy)
+        arrays['node_cell_start'], arrays['node_cell_items'] = index._cell_lists(np.arange(len(node_xy)), node_cells)
+        seg_items, seg_cells = index._bbox_cells(np.minimum(seg_xy[:, :2], seg_xy[:, 2:]), np.maximum(seg_xy[:, :2], seg_xy[:, 2:]))
+        arrays['seg_cell_start'], arrays['seg_cell_items'] = index._cell_lists(seg_items, seg_cells)
+        return index
+
+    @classmethod
+    def load(cls, index_file):
+        ''' Load an index saved by save(). '''
+        with np.load(index_file) as index_npz:
+            return cls(dict((name, index_npz[name]) for name in index_npz.files))
+
+    def save(self, index_file):
+        ''' Save the index to a .npz file. '''
+        with open(index_file, 'wb') as index_npz:
+            np.savez(index_npz, **self.arrays)
+        return index_file
+
+    def node_xy_of(self, node_ids):
+        ''' Return the x,y of each of a list of node IDs that are indexed. '''
+        node_ids = np.asarray(node_ids, dtype=self.node_ids.dtype)
+        sorted_ids = self.node_ids[self._node_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, node_ids), max(len(sorted_ids) - 1, 0))
+        found = sorted_ids[pos] == node_ids if len(sorted_ids) else np.zeros(len(node_ids), dtype=bool)
+        return self.node_xy[self._node_order[pos[found]]]
+
+    def nodes_within(self, points, distance):
+        ''' Return the IDs of the nodes within a distance of any point. '''
+        selected = np.zeros(len(self.node_ids), dtype=bool)
+        for x, y in np.asarray(points, dtype=float).reshape(-1, 2):
+            items = self._candidates('node', [x - distance, y - distance], [x + distance, y + distance])
+            near = np.hypot(self.node_xy[items, 0] - x, self.node_xy[items, 1] - y) <= distance
+            selected[items[near]] = True
+        return self.node_ids[selected]
+
+    def nodes_in_polygon(self, polygon):
+        ''' Return the IDs of the nodes inside a polygon (a list of x,y). '''
+        polygon = np.asarray(polygon, dtype=float).reshape(-1, 2)
+        items = self._candidates('node', polygon.min(axis=0), polygon.max(axis=0))
+        inside = _points_in_polygon(self.node_xy[items], polygon)
+        return self.node_ids[np.sort(items[inside])]
+
+    def nearest_nodes(self, point, k):
+        ''' Return the IDs of the k nodes nearest a point, nearest first. '''
+        x, y = point
+        for radius in self._search_radii():
+            items = self._candidates('node', [x - radius, y - radius], [x + radius, y + radius])
+            distances = np.hypot(self.node_xy[items, 0] - x, self.node_xy[items, 1] - y)
+            order = np.argsort(distances, kind='mergesort')[:k]
+            if len(order) == min(k, len(self.node_ids)) and (not len(order) or distances[order[-1]] <= radius):
+                return self.node_ids[items[order]]
+        return self.node_ids[:0]
+
+    def tlines_within(self, points, distance):
+        ''' Return the IDs of the tlines within a distance of any point. '''
+        selected = np.zeros(len(self.tline_ids), dtype=bool)
+        for x, y in np.asarray(points, dtype=float).reshape(-1, 2):
+            items = self._candidates('seg', [x - distance, y - distance], [x + distance, y + distance])
+            near = _segment_distances(self.seg_xy[items], x, y) <= distance
+            selected[self.seg_line[items[near]]] = True
+        return self.tline_ids[selected]
+
+    def tlines_in_polygon(self, polygon):
+        ''' Return the IDs of the tlines that cross or are inside a polygon. '''
+        polygon = np.asarray(polygon, dtype=float).reshape(-1, 2)
+        items = self._candidates('seg', polygon.min(axis=0), polygon.max(axis=0))
+        segs = self.seg_xy[items]
+        hit = _points_in_polygon(segs[:, :2], polygon) | _points_in_polygon(segs[:, 2:], polygon)
+        edges = np.hstack([polygon, np.roll(polygon, -1, axis=0)])
+        for edge in edges:
+            hit |= _segments_cross(segs, edge)
+        selected = np.zeros(len(self.tline_ids), dtype=bool)
+        selected[self.seg_line[items[hit]]] = True
+        return self.tline_ids[selected]
+
+    def nearest_tlines(self, point, k):
+        ''' Return the IDs of the k tlines nearest a point, nearest first. '''
+        x, y = point
+        for radius in self._search_radii():
+            items = self._candidates('seg', [x - radius, y - radius], [x + radius, y + radius])
+            line_distances = np.full(len(self.tline_ids), np.inf)
+            np.minimum.at(line_distances, self.seg_line[items], _segment_distances(self.seg_xy[items], x, y))
+            lines = np.flatnonzero(np.isfinite(line_distances))
+            order = lines[np.argsort(line_distances[lines], kind='mergesort')[:k]]
+            if len(order) == min(k, len(self.tline_ids)) and (not len(order) or line_distances[order[-1]] <= radius):
+                return self.tline_ids[order]
+        return self.tline_ids[:0]
+
+    def _bbox_cells(self, mins, maxes):
+        ''' Return (item, cell) pairs for every grid cell that each item's
+            bounding box overlaps. '''
+        lo = self._cell_xy(mins)
+        hi = self._cell_xy(maxes)
+        nx = hi[:, 0] - lo[:, 0] + 1
+        ny = hi[:, 1] - lo[:, 1] + 1
+        counts = nx * ny
+        items = np.repeat(np.arange(len(mins)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = lo[items, 0] + offsets % nx[items]
+        cell_y = lo[items, 1] + offsets // nx[items]
+        return items, cell_x * self.shape[1] + cell_y
+
+    def _candidates(self, kind, mins, maxes):
+        ''' Return the (unique) items of the cells overlapping a bounding box. '''
+        lo = self._cell_xy(np.asarray([mins], dtype=float))[0]
+        hi = self._cell_xy(np.asarray([maxes], dtype=float))[0]
+        cell_x, cell_y = np.meshgrid(np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1), indexing='ij')
+        cells = (cell_x * self.shape[1] + cell_y).ravel()
+        cell_start = self.arrays[kind + '_cell_start']
+        starts = cell_start[cells]
+        counts = cell_start[cells + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        items = self.arrays[kind + '_cell_items'][np.repeat(starts, counts) + offsets]
+        return np.unique(items) if kind == 'seg' else items
+
+    def _cell_lists(self, items, cells):
+        ''' Group items by grid cell. Returns the start of each cell's items
+            (plus the end of the last) and the items, sorted by cell. '''
+        order = np.argsort(cells, kind='mergesort')
+        counts = np.bincount(cells, minlength=self.shape[0] * self.shape[1])
+        cell_start = np.concatenate([[0], np.cumsum(counts)])
+        return cell_start, items[order]
+
+    def _cell_of(self, xy):
+        ''' Return the grid cell of each x,y. '''
+        cell_xy = self._cell_xy(xy)
+        return cell_xy[:, 0] * self.shape[1] + cell_xy[:, 1]
+
+    def _cell_xy(self, xy):
+        ''' Return the grid column & row of each x,y (clipped to the grid). '''
+        cell_xy = np.floor((np.asarray(xy, dtype=float).reshape(-1, 2) - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cell_xy, 0, np.array(self.shape) - 1)
+
+    def _search_radii(self):
+        ''' Yield increasing search radii, up to one covering the whole grid. '''
+        radius = self.cell_size
+        max_radius = self.cell_size * max(self.shape) * 2
+        while radius < max_radius:
+            yield radius
+            radius *= 2
+        yield max_radius
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def apply_spatial_policy(index, layer, query, values, table=None, ignore_zeroes=False):
+    ''' Set policy values (a dictionary keyed by field) for the 'nodes' or
+        'tlines' selected by a query, in their policy table (by default in
+        TMM_GIS.gdb). Returns the number of IDs selected and rows updated. '''
+    if layer == 'nodes':
+        table = table or os.path.join(TMM.gdb, 'extra_attr_nodes')
+        key_field, policy_fields = 'NODE_ID', TMM.node_fields
+    else:
+        table = table or os.path.join(TMM.gdb, 'extra_attr_tlines')
+        key_field, policy_fields = 'TLINE_ID', TMM.tline_fields
+    for field in values:
+        if field not in policy_fields:
+            raise ValueError('"{0}" is not a {1} policy field.'.format(field, layer))
+    ids = query_ids(index, layer, query)
+    fields = [field for field in policy_fields if field in values]
+    updated = tmm_backends.apply_policy(table, key_field, ids.tolist(), fields, [values[field] for field in fields], ignore_zeroes)
+    return len(ids), updated
+
+
+def build_index(gdb=TMM.gdb):
+    ''' Build a SpatialIndex of a geodatabase's all-day nodes & tlines. '''
+    arcpy = TMM.import_arcpy()
+    node_fc = os.path.join(gdb, 'tod_all', 'emme_nodes_all')
+    tline_fc = os.path.join(gdb, 'tod_all', 'emme_tlines_all')
+
+    with arcpy.da.SearchCursor(node_fc, [TMM.node_id_int_field, 'SHAPE@XY']) as cursor:
+        node_rows = [(node_id, xy) for node_id, xy in cursor if xy is not None]
+    node_ids = [node_id for node_id, xy in node_rows]
+    node_xy = [xy for node_id, xy in node_rows]
+
+    tline_ids = []
+    seg_xy = []
+    seg_line = []
+    with arcpy.da.SearchCursor(tline_fc, ['ID', 'SHAPE@']) as cursor:
+        for tline_id, shape in cursor:
+            line_index = len(tline_ids)
+            tline_ids.append(tline_id)
+            if shape is None:
+                continue
+            for part in shape:
+                points = [(point.X, point.Y) for point in part if point is not None]
+                for start, end in zip(points[:-1], points[1:]):
+                    seg_xy.append(start + end)
+                    seg_line.append(line_index)
+    return SpatialIndex.from_geometry(
+        np.array(node_ids, dtype=np.int64), node_xy,
+        np.array(tline_ids, dtype='U'), seg_xy, seg_line,
+    )
+
+
+def default_index_file(gdb=TMM.gdb):
+    ''' Return the path of the spatial index saved alongside a geodatabase. '''
+    return os.path.join(os.path.dirname(gdb), index_file_name)
+
+
+def query_ids(index, layer, query):
+    ''' Return the IDs of the 'nodes' or 'tlines' selected by a query (see
+        above). '''
+    if layer not in ('nodes', 'tlines'):
+        raise ValueError('Expected "nodes" or "tlines", not "{0}".'.format(layer))
+    if len(query) != 1:
+        raise ValueError('Expected a single "buffer", "polygon" or "nearest" query.')
+    query_type, args = list(query.items())[0]
+    if query_type == 'buffer':
+        points = np.asarray(args.get('points', []), dtype=float).reshape(-1, 2)
+        if 'node_ids' in args:
+            points = np.concatenate([points, index.node_xy_of(args['node_ids'])])
+        if layer == 'nodes':
+            return index.nodes_within(points, args['distance'])
+        return index.tlines_within(points, args['distance'])
+    elif query_type == 'polygon':
+        if layer == 'nodes':
+            return index.nodes_in_polygon(args)
+        return index.tlines_in_polygon(args)
+    elif query_type == 'nearest':
+        if layer == 'nodes':
+            return index.nearest_nodes(args['point'], args['k'])
+        return index.nearest_tlines(args['point'], args['k'])
+    raise ValueError('Unknown query "{0}".'.format(query_type))
+
+
+def _points_in_polygon(xy, polygon):
+    ''' Test which points are inside a polygon, by ray casting. '''
+    inside = np.zeros(len(xy), dtype=bool)
+    x = xy[:, 0]
+    y = xy[:, 1]
+    for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def _segment_distances(segs, x, y):
+    ''' Return the distance from a point to each of an array of segments. '''
+    dx = segs[:, 2] - segs[:, 0]
+    dy = segs[:, 3] - segs[:, 1]
+    length_sq = dx * dx + dy * dy
+    t = np.where(length_sq > 0, ((x - segs[:, 0]) * dx + (y - segs[:, 1]) * dy) / np.where(length_sq > 0, length_sq, 1), 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(segs[:, 0] + t * dx - x, segs[:, 1] + t * dy - y)
+
+
+def _segments_cross(segs, edge):
+    ''' Test which of an array of segments intersect another segment. '''
+    def orientation(ax, ay, bx, by, cx, cy):
+        return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+    x1, y1, x2, y2 = segs[:, 0], segs[:, 1], segs[:, 2], segs[:, 3]
+    ex1, ey1, ex2, ey2 = edge
+    o1 = orientation(x1, y1, x2, y2, ex1, ey1)
+    o2 = orientation(x1, y1, x2, y2, ex2, ey2)
+    o3 = orientation(ex1, ey1, ex2, ey2, x1, y1)
+    o4 = orientation(ex1, ey1, ex2, ey2, x2, y2)
+    return (o1 * o2 <= 0) & (o3 * o4 <= 0) & ~((o1 == 0) & (o2 == 0) & (o3 == 0) & (o4 == 0))
+
+
+# -----------------------------------------------------------------------------
+#  Build the index, or apply a policy by location.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply TMM policies to nodes or tlines selected by location.')
+    parser.add_argument('--build', action='store_true', help='(re)build the spatial index of TMM_GIS.gdb')
+    parser.add_argument('layer', nargs='?', choices=('nodes', 'tlines'), help='layer to apply the policy to')
+    parser.add_argument('query', nargs='?', help='JSON file describing the query')
+    parser.add_argument('values', nargs='*', help='policy values to set, as FIELD=VALUE')
+    parser.add_argument('--table', help='policy table to update (default: the table in TMM_GIS.gdb)')
+    parser.add_argument('--ignore-zeroes', action='store_true', help='leave fields with a value of 0 unchanged')
+    args = parser.parse_args()
+
+    index_file = default_index_file()
+    if args.build:
+        build_index().save(index_file)
+        print('Saved {0}'.format(index_file))
+    if args.layer:
+        with open(args.query, 'r') as query_file:
+            query = json.load(query_file)
+        values = dict((field, int(value)) for field, value in (item.split('=', 1) for item in args.values))
+        selected, updated = apply_spatial_policy(SpatialIndex.load(index_file), args.layer, query, values, args.table, args.ignore_zeroes)
+        print('Updated {0} of {1} selected {2}.'.format(updated, selected, args.layer))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+'''
+    tmm_streaming.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module builds a scenario's batchin CSVs without ever holding a whole
+    baseline CSV in memory. Rows flow from the CSV reader through the
+    tmm_scoring adjusters to the CSV writer in fixed-size chunks, so memory
+    use is bounded by the chunk size rather than by the size of the CSV.
+
+    Outputs must be sorted by ID. While a baseline CSV's IDs are already in
+    ascending order, each scored chunk is written straight to the output.
+    Otherwise the remaining chunks are sorted and spilled to temporary run
+    files, which are then merged into the output (an external merge sort).
+    The results are identical to those of tmm_scoring.score_scenario(),
+    including the handling of duplicate IDs (the last row is kept). Each
+    output is written to a temporary file that replaces it once complete.
+
+'''
+import csv
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+import numpy as np
+import TMM
+import tmm_scoring
+
+default_chunk_rows = 50000
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def iter_csv_chunks(csv_file_path, id_is_tline=False, chunk_rows=default_chunk_rows):
+    ''' Read a CSV, yielding its rows as a series of AttrTables with up to
+        chunk_rows rows each, in file order. '''
+    with tmm_scoring.open_csv(csv_file_path, 'r') as attr_csv:
+        reader = csv.reader(attr_csv)
+        fields = next(reader)
+        rows = (row for row in reader if row)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            yield tmm_scoring.table_from_rows(fields, chunk, id_is_tline)
+
+
+def stream_scenario(input_dir, output_dir, node_policy, tline_policy, chunk_rows=default_chunk_rows):
+    ''' Stream every baseline CSV in input_dir through the scenario's policies
+        into output_dir. Returns a list of the CSVs written. '''
+    csv_files = []
+    TMM.ensure_dir(output_dir)
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        csv_files.append(stream_table_csv(
+            key, os.path.join(input_dir, filename), os.path.join(output_dir, filename),
+            node_policy, tline_policy, id_is_tline, chunk_rows,
+        ))
+    return csv_files
+
+
+def stream_table_csv(key, csv_in, csv_out, node_policy, tline_policy, id_is_tline=False, chunk_rows=default_chunk_rows):
+    ''' Stream one baseline CSV (identified by its key in
+        tmm_scoring.baseline_csvs) through the scenario's policies, writing
+        the adjusted rows sorted by ID. Returns the output CSV. '''
+    with tmm_scoring.open_csv(csv_in, 'r') as attr_csv:
+        fields = next(csv.reader(attr_csv))
+
+    spill_dir = None
+    run_files = []
+    last_id = None
+    temp_out = csv_out + '.tmp'  # Replaces csv_out once complete
+    if os.path.exists(temp_out):
+        os.remove(temp_out)  # Never write through a leftover link to another file
+    out_csv = tmm_scoring.open_csv(temp_out, 'w', tmm_scoring.csv_buffer_size)
+    try:
+        out_csv.write(tmm_scoring.format_csv_rows([[field] for field in fields]))
+        for chunk in iter_csv_chunks(csv_in, id_is_tline, chunk_rows):
+            scored = tmm_scoring.score_table(key, chunk, node_policy, tline_policy)
+            columns = [scored.columns[field] for field in fields]
+
+            # Write in-order chunks directly, until the first out-of-order ID
+            ids = scored.ids
+            in_order = (last_id is None or ids[0] > last_id) and (ids[1:] > ids[:-1]).all()
+            if not run_files and in_order:
+                out_csv.write(tmm_scoring.format_csv_rows(columns))
+                last_id = ids[-1]
+                continue
+
+            # Then spill sorted runs, starting with the rows already written
+            if not run_files:
+                spill_dir = tempfile.mkdtemp(prefix='tmm_stream_', dir=os.path.dirname(os.path.abspath(csv_out)))
+                out_csv.close()
+                run_files.append(os.path.join(spill_dir, 'run_0.csv'))
+                shutil.move(temp_out, run_files[0])
+            order = np.argsort(ids, kind='mergesort')
+            run_files.append(os.path.join(spill_dir, 'run_{0}.csv'.format(len(run_files))))
+            tmm_scoring.write_csv_columns(run_files[-1], fields, [column[order] for column in columns])
+
+        if run_files:
+            _merge_runs(run_files, temp_out, fields, id_is_tline)
+        out_csv.close()
+        tmm_scoring.replace_file(temp_out, csv_out)
+    finally:
+        if not out_csv.closed:
+            out_csv.close()
+        if os.path.exists(temp_out):
+            os.remove(temp_out)
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+    return csv_out
+
+
+def _merge_runs(run_files, csv_out, fields, id_is_tline):
+    ''' Merge sorted run files into a single CSV sorted by ID, keeping only
+        the last row (i.e. from the latest run) of any duplicated ID. '''
+    parse_id = (lambda value: value) if id_is_tline else int
+    run_csvs = [tmm_scoring.open_csv(run_file, 'r') for run_file in run_files]
+    try:
+        runs = [_keyed_rows(run_csv, run_number, parse_id) for run_number, run_csv in enumerate(run_csvs)]
+        with tmm_scoring.open_csv(csv_out, 'w') as out_csv:
+            writer = csv.writer(out_csv)
+            writer.writerow(fields)
+            merged = heapq.merge(*runs)
+            for row_id, group in itertools.groupby(merged, key=lambda keyed_row: keyed_row[0][0]):
+                last_row = None
+                for keyed_row in group:
+                    last_row = keyed_row[1]
+                writer.writerow(last_row)
+    finally:
+        for run_csv in run_csvs:
+            run_csv.close()
+    return csv_out
+
+
+def _keyed_rows(run_csv, run_number, parse_id):
+    ''' Yield the rows of a run file, each keyed by (ID, run number, row
+        number) so that the merge keeps duplicated IDs in their file order. '''
+    reader = csv.reader(run_csv)
+    next(reader)
+    for row_number, row in enumerate(reader):
+        if row:
+            yield (parse_id(row[0]), run_number, row_number), row
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''
+    tmm_synthetic.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module generates a synthetic regional transit network, scaled to any
+    multiple of CMAP's network size, for benchmarking the TMM scripts without
+    ArcGIS or CMAP's Emme exports. For a given scale it writes:
+      - the node & tline policy tables (in any tmm_backends format), with a
+        small share of rows carrying non-zero policies;
+      - the five baseline batchin CSVs, in input\\;
+      - a tseg itinerary CSV (LINE_ID, INODE, JNODE) for each of the 8 TODs,
+        in itineraries\\, with each tline running in a random subset of TODs.
+
+    The 1x sizes below approximate the CMAP network; they are not exact.
+
+'''
+import csv
+import os
+import numpy as np
+import TMM
+import tmm_backends
+import tmm_scoring
+
+# Approximate size of the CMAP network (1x):
+scale_1x = {
+    'bus_nodes': 16000,
+    'rail_nodes': 400,
+    'tlines': 1800,
+    'stops_per_tline': 40,
+}
+bus_modes = 'beplq'  # CTA regular & express, Pace regular, local & express
+rail_modes = 'cm'    # CTA rail, Metra
+policy_share = 0.05  # Share of policy table rows with non-zero policies
+tod_share = 0.7      # Chance that a tline runs in any given TOD
+tod_periods = (1, 2, 3, 4, 5, 6, 7, 8)  # As in tmm_shp2gdb.py
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def generate_network(out_dir, scale=1, seed=0, policy_ext='.sqlite', sorted_inputs=True):
+    ''' Write a synthetic network of the specified scale to out_dir. Returns a
+        dictionary of the paths written: 'input_dir', 'node_table',
+        'tline_table' and 'itinerary_dir'. '''
+    rng = np.random.RandomState(seed)
+    n_bus = int(scale_1x['bus_nodes'] * scale)
+    n_rail = int(scale_1x['rail_nodes'] * scale)
+    n_tlines = int(scale_1x['tlines'] * scale)
+    n_stops = scale_1x['stops_per_tline']
+
+    # Nodes & tlines
+    bus_nodes = 10001 + np.arange(n_bus, dtype=np.int32)
+    rail_nodes = 10001 + n_bus + np.arange(n_rail, dtype=np.int32)
+    is_rail = rng.random_sample(n_tlines) < 0.1
+    modes = np.where(is_rail, rng.choice(list(rail_modes), n_tlines), rng.choice(list(bus_modes), n_tlines))
+    tline_ids = np.array(['{0}{1:06d}'.format(mode, i) for i, mode in enumerate(modes.tolist())], dtype='U')
+    nodes = np.concatenate([bus_nodes, rail_nodes])
+
+    # Itineraries: each tline serves n_stops nodes of its own type
+    stops = np.where(
+        is_rail[:, np.newaxis],
+        rng.choice(rail_nodes, (n_tlines, n_stops)),
+        rng.choice(bus_nodes, (n_tlines, n_stops)),
+    )
+
+    paths = {
+        'input_dir': TMM.ensure_dir(os.path.join(out_dir, 'input')),
+        'itinerary_dir': TMM.ensure_dir(os.path.join(out_dir, 'itineraries')),
+    }
+    if policy_ext in tmm_backends.sqlite_exts:
+        paths['node_table'] = os.path.join(out_dir, 'policy' + policy_ext, 'extra_attr_nodes')
+        paths['tline_table'] = os.path.join(out_dir, 'policy' + policy_ext, 'extra_attr_tlines')
+    else:
+        paths['node_table'] = os.path.join(out_dir, 'extra_attr_nodes' + policy_ext)
+        paths['tline_table'] = os.path.join(out_dir, 'extra_attr_tlines' + policy_ext)
+
+    # Policy tables
+    tmm_backends.write_table(paths['node_table'], ['NODE_ID'] + list(TMM.node_fields),
+                             _policy_columns(rng, 'NODE_ID', nodes, TMM.node_fields))
+    tmm_backends.write_table(paths['tline_table'], ['TLINE_ID'] + list(TMM.tline_fields),
+                             _policy_columns(rng, 'TLINE_ID', tline_ids, TMM.tline_fields))
+
+    # Baseline batchin CSVs
+    n_lines = len(tline_ids)
+    baseline = {
+        'bus': (['inode', '@bstyp', '@bsinf'], [
+            bus_nodes, rng.randint(1, 6, n_bus), rng.randint(0, 3, n_bus)]),
+        'rail': (['inode', '@rstyp', '@rsinf', '@rspac'], [
+            rail_nodes, rng.randint(1, 6, n_rail), rng.randint(0, 3, n_rail), rng.randint(0, 800, n_rail)]),
+        'easeb': (['line', '@easeb'], [
+            tline_ids, rng.randint(1, 4, n_lines)]),
+        'prof': (['line', '@prof1', '@prof2', '@prof3'], [
+            tline_ids, _decimals(rng, 0, 1, n_lines), _decimals(rng, 0, 1, n_lines), _decimals(rng, 0, 1, n_lines)]),
+        'relim': (['line', '@relim'], [
+            tline_ids, _decimals(rng, 0, 1, n_lines)]),
+    }
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        fields, columns = baseline[key]
+        order = np.arange(len(columns[0])) if sorted_inputs else rng.permutation(len(columns[0]))
+        _write_csv(os.path.join(paths['input_dir'], filename), fields, [column[order] for column in columns])
+
+    # TOD itineraries
+    for tod in tod_periods:
+        runs = rng.random_sample(n_tlines) < tod_share
+        tod_lines = tline_ids[runs]
+        tod_stops = stops[runs]
+        line_ids = np.repeat(tod_lines, n_stops - 1)
+        inodes = tod_stops[:, :-1].ravel().astype(float)
+        jnodes = tod_stops[:, 1:].ravel().astype(float)
+        _write_csv(os.path.join(paths['itinerary_dir'], 'tsegs_{0}.csv'.format(tod)),
+                   ['LINE_ID', 'INODE', 'JNODE'], [line_ids, inodes, jnodes])
+    return paths
+
+
+def read_tod_ids(itinerary_dir, tod):
+    ''' Read a TOD's itinerary CSV into the dictionary of ID lists expected by
+        tmm_network.merge_tod_ids(), as tmm_shp2gdb.read_tod_ids() would read
+        it from the TOD's feature classes. '''
+    with tmm_scoring.open_csv(os.path.join(itinerary_dir, 'tsegs_{0}.csv'.format(tod)), 'r') as tseg_csv:
+        reader = csv.reader(tseg_csv)
+        next(reader)
+        line_ids, inodes, jnodes = [list(column) for column in zip(*reader)] or ([], [], [])
+    inodes = [float(node) for node in inodes]
+    jnodes = [float(node) for node in jnodes]
+    tline_ids = sorted(set(line_ids))
+    node_ids = sorted(set(int(node) for node in inodes + jnodes))
+    return {
+        'tline_oids': list(range(1, len(tline_ids) + 1)),
+        'tline_ids': tline_ids,
+        'tseg_line_ids': line_ids,
+        'tseg_inodes': inodes,
+        'tseg_jnodes': jnodes,
+        'node_oids': list(range(1, len(node_ids) + 1)),
+        'node_ids': node_ids,
+    }
+
+
+def _decimals(rng, low, high, size):
+    ''' Random values formatted with 2 decimal places, as in the batchin
+        CSVs. '''
+    return np.array(['{0:.2f}'.format(value) for value in rng.uniform(low, high, size).tolist()], dtype='U')
+
+
+def _policy_columns(rng, key_field, ids, fields):
+    ''' Zero-filled policy columns with random values in a share of rows. '''
+    columns = {key_field: ids}
+    active = rng.random_sample(len(ids)) < policy_share
+    for field in fields:
+        column = np.zeros(len(ids), dtype=np.int16)
+        if field == 'ADD_PARKING':
+            values = rng.randint(0, 200, len(ids))
+        elif field == 'IMP_RELIABILITY':
+            values = rng.randint(0, 50, len(ids))
+        else:
+            values = rng.randint(0, 6, len(ids))
+        column[active] = values[active]
+        columns[field] = column
+    return columns
+
+
+def _write_csv(csv_file, fields, columns):
+    ''' Write a list of column arrays to a CSV. '''
+    with tmm_scoring.open_csv(csv_file, 'w') as out_csv:
+        writer = csv.writer(out_csv)
+        writer.writerow(fields)
+        writer.writerows(zip(*[column.tolist() for column in columns]))
+    return csv_file
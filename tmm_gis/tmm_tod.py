@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+'''
+    tmm_tod.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This module writes a scenario's batchin CSVs for each of the 8 TOD
+    periods in a single pass, for use by tmm_gdb2csv.py. The scenario is
+    scored once, and each TOD's CSVs contain only the rows whose node or
+    tline IDs are in that TOD's network (the tod_N feature dataset created by
+    tmm_shp2gdb.py). They are written to Scenario_101 - Scenario_108, by a
+    pool of threads.
+
+'''
+import os
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import TMM
+import tmm_scoring
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def filter_scenario(scenario, node_ids, tline_ids):
+    ''' Return a copy of a scenario's AttrTables containing only the rows with
+        the specified node or tline IDs. '''
+    node_ids = np.unique(tmm_scoring.id_array(node_ids))
+    tline_ids = np.unique(tmm_scoring.id_array(tline_ids, id_is_tline=True))
+    filtered = {}
+    for key, filename, id_is_tline in tmm_scoring.baseline_csvs:
+        found, pos = tmm_scoring.match_ids(scenario[key].ids, tline_ids if id_is_tline else node_ids)
+        filtered[key] = scenario[key].take(np.flatnonzero(found))
+    return filtered
+
+
+def read_tod_ids(gdb, tod):
+    ''' Read the node and tline IDs in a TOD's feature dataset. Returns a
+        tuple of lists: (node_ids, tline_ids). '''
+    arcpy = TMM.import_arcpy()
+    tod_fd = os.path.join(gdb, 'tod_{0}'.format(tod))
+    node_fc = os.path.join(tod_fd, 'emme_nodes_{0}'.format(tod))
+    tline_fc = os.path.join(tod_fd, 'emme_tlines_{0}'.format(tod))
+    with arcpy.da.SearchCursor(node_fc, [TMM.node_id_int_field]) as cursor:
+        node_ids = [row[0] for row in cursor]
+    with arcpy.da.SearchCursor(tline_fc, ['ID']) as cursor:
+        tline_ids = [row[0] for row in cursor]
+    return node_ids, tline_ids
+
+
+def tod_output_dir(output_dir, scen, tod):
+    ''' Return the output directory of a TOD's CSVs, e.g. Scenario_101. '''
+    return os.path.join(output_dir, 'Scenario_{0}'.format(scen + tod))
+
+
+def write_tod_scenario(scenario, node_ids, tline_ids, tod_dir):
+    ''' Write the rows of a scenario's AttrTables that are in a TOD to its
+        output directory. Returns a list of the CSVs written. '''
+    filtered = filter_scenario(scenario, node_ids, tline_ids)
+    return tmm_scoring.write_scenario(filtered, TMM.ensure_dir(tod_dir))
+
+
+def write_tod_scenarios(scenario, tod_ids, output_dir, scen=100, threads=None):
+    ''' Write a scenario's CSVs for every TOD concurrently. tod_ids is a
+        dictionary of (node_ids, tline_ids) keyed by TOD. Returns a list of
+        the TOD output directories, in TOD order. '''
+    tods = sorted(tod_ids)
+    tod_dirs = [tod_output_dir(output_dir, scen, tod) for tod in tods]
+    if threads is None:
+        threads = len(tods)
+    if threads <= 1:
+        for tod, tod_dir in zip(tods, tod_dirs):
+            write_tod_scenario(scenario, tod_ids[tod][0], tod_ids[tod][1], tod_dir)
+        return tod_dirs
+
+    pool = ThreadPool(threads)
+    try:
+        pool.map(_write_tod_scenario_args, [
+            (scenario, tod_ids[tod][0], tod_ids[tod][1], tod_dir) for tod, tod_dir in zip(tods, tod_dirs)
+        ], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return tod_dirs
+
+
+def _write_tod_scenario_args(args):
+    ''' Unpack write_tod_scenario() arguments passed through Pool.map(). '''
+    return write_tod_scenario(*args)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+'''
+    tmm_versions.py
+    Author: npeterson
+    Revised: 10/17/2026
+    ---------------------------------------------------------------------------
+    This script keeps named versions of the policy tables (extra_attr_nodes
+    and extra_attr_tlines), so that alternative scenarios can be saved,
+    switched between and compared without a copy of TMM_GIS.gdb for each.
+
+    Versions are stored in TMM_GIS_versions alongside TMM_GIS.gdb:
+      - base_<digest>.npz:  a snapshot of both tables' IDs & policy fields,
+                            named for a digest of its contents and shared by
+                            every version saved against it
+      - <name>.npz:         a version's delta against its base: the IDs added
+                            to or removed from each table and, for each policy
+                            field, only the IDs whose value differs from the
+                            base (with their new values)
+    A version is saved against an identical base if one is stored (found by
+    its digest alone), or else against whichever of the base_search_limit
+    most recently used bases it differs from least, unless that would still
+    change more than rebase_fraction of the rows, in which case its tables
+    are snapshotted as a new base. A base is deleted along with the last
+    version saved against it.
+
+    Checking out a version rebuilds its tables from its base & delta, and
+    updates only the rows that differ from the current tables, in a single
+    update pass keyed by ID. Switching between versions
+    therefore costs in proportion to how much they differ, not to the size of
+    the network. (If the current tables have different IDs, e.g. after the
+    network was rebuilt, they are recreated instead.)
+
+        python tmm_versions.py save <name>
+        python tmm_versions.py checkout <name>
+        python tmm_versions.py diff <name> [<other name>]
+        python tmm_versions.py list
+        python tmm_versions.py delete <name>
+        python tmm_versions.py export <name> <.gdb/.gpkg/.sqlite path>
+
+    The diff counts the rows changed in each policy field between two
+    versions, or between a version and the current tables. Tables other than
+    those in TMM_GIS.gdb can be used with --node-table and --tline-table,
+    which may be in any format supported by tmm_backends.py.
+
+    Exporting a version writes its policies to a separate database as sparse
+    tables, holding only the rows with a policy set, which tmm_gdb2csv.py
+    can build from with --sparse (leaving every other node & tline exactly
+    as in the baseline CSVs).
+
+'''
+import argparse
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import TMM
+import tmm_backends
+import tmm_gdb2csv
+import tmm_scoring
+
+store_dir_name = '{0}_versions'.format(TMM.gdb_name)
+base_prefix = 'base_'
+rebase_fraction = 0.25  # Snapshot a new base if a delta would change more rows
+base_search_limit = 3  # Most recently used bases to diff a new version against
+version_name_pattern = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+policy_tables = (  # (key, key_field, fields, id_is_tline)
+    ('node', 'NODE_ID', TMM.node_fields, False),
+    ('tline', 'TLINE_ID', TMM.tline_fields, True),
+)
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def checkout_version(store_dir, name, node_table, tline_table):
+    ''' Write a version's policies to a pair of policy tables (in any
+        tmm_backends format), updating only the rows whose values differ.
+        Returns the number of (node, tline) rows written. '''
+    policies = load_version(store_dir, name)
+    current = tmm_gdb2csv.load_policy_tables(node_table, tline_table)
+    written = []
+    for table_info, table, old_policy, new_policy in zip(policy_tables, (node_table, tline_table), current, policies):
+        written.append(_write_changes(table, table_info, old_policy, new_policy))
+    return tuple(written)
+
+
+def default_store_dir(gdb=TMM.gdb):
+    ''' Return the version store alongside a geodatabase. '''
+    return os.path.join(os.path.dirname(gdb), store_dir_name)
+
+
+def delete_version(store_dir, name):
+    ''' Delete a version, and its base if no other version uses it. '''
+    version_file = _version_file(store_dir, name)
+    base = _read_meta(version_file)['base']
+    os.remove(version_file)
+    _delete_unused_base(store_dir, base)
+    return version_file
+
+
+def diff_policies(old_policy, new_policy):
+    ''' Compare two policy AttrTables, treating rows that were added as
+        having been 0. Returns a dictionary of (ids, old_values, new_values)
+        for the rows changed in each field, and the sorted IDs that were
+        added and removed. '''
+    found, pos = tmm_scoring.match_ids(new_policy.ids, old_policy.ids)
+    still_found, _ = tmm_scoring.match_ids(old_policy.ids, new_policy.ids)
+    changes = {}
+    for field in new_policy.fields:
+        new_values = new_policy.columns[field]
+        old_values = np.zeros(len(new_policy), dtype=new_values.dtype)
+        if field in old_policy.columns:
+            old_values[found] = old_policy.columns[field][pos[found]]
+        changed = new_values != old_values
+        changes[field] = (new_policy.ids[changed], old_values[changed], new_values[changed])
+    return changes, new_policy.ids[~found], old_policy.ids[~still_found]
+
+
+def export_version(store_dir, name, container):
+    ''' Write a version's policies as sparse policy tables (holding only the
+        rows with a policy set; see tmm_gdb2csv.py --sparse) named
+        extra_attr_nodes & extra_attr_tlines in a geodatabase or SQLite
+        database. Returns the (node_table, tline_table) paths. '''
+    tables = []
+    for (key, key_field, fields, id_is_tline), policy in zip(policy_tables, load_version(store_dir, name)):
+        table = os.path.join(container, 'extra_attr_{0}s'.format(key))
+        tables.append(tmm_backends.write_sparse_policy(table, key_field, policy, id_is_tline))
+    return tuple(tables)
+
+
+def list_versions(store_dir):
+    ''' Return a list of (name, metadata) for every version in a store,
+        sorted by name. '''
+    if not os.path.isdir(store_dir):
+        return []
+    versions = []
+    for file_name in sorted(os.listdir(store_dir)):
+        name, ext = os.path.splitext(file_name)
+        if ext == '.npz' and not name.startswith(base_prefix):
+            versions.append((name, _read_meta(os.path.join(store_dir, file_name))))
+    return versions
+
+
+def load_version(store_dir, name):
+    ''' Rebuild a version's policies from its base & delta. Returns
+        (node_policy, tline_policy) as tmm_scoring.AttributeStores. '''
+    delta = _load_npz(_version_file(store_dir, name))
+    base_policies = _load_base(store_dir, json.loads(str(delta['meta']))['base'])
+    return tuple(_apply_delta(base, delta, table_info) for base, table_info in zip(base_policies, policy_tables))
+
+
+def save_version(store_dir, name, node_policy, tline_policy):
+    ''' Save a pair of policy AttrTables as a named version, replacing any
+        version of the same name. Returns the version's metadata: its base
+        and the number of rows changed from the base in each table. '''
+    if not version_name_pattern.match(name) or name.startswith(base_prefix):
+        raise ValueError('"{0}" is not a valid version name.'.format(name))
+    policies = (node_policy, tline_policy)
+    TMM.ensure_dir(store_dir)
+    version_file = os.path.join(store_dir, '{0}.npz'.format(name))
+    old_base = _read_meta(version_file)['base'] if os.path.exists(version_file) else None
+
+    # Use an identical base if there is one, or else the recently used base
+    # that the policies differ from least
+    base, deltas, changed_rows = None, None, None
+    digest = _policy_digest(policies)
+    if os.path.exists(_base_file(store_dir, digest)):
+        base, deltas, changed_rows = digest, [diff_policies(policy, policy) for policy in policies], [0 for policy in policies]
+    recent_bases = sorted(_base_names(store_dir), key=lambda base_name: os.path.getmtime(_base_file(store_dir, base_name)))
+    for base_name in ([] if base else recent_bases[-base_search_limit:]):
+        base_deltas = [diff_policies(old, new) for old, new in zip(_load_base(store_dir, base_name), policies)]
+        base_rows = [_changed_ids(delta).size for delta in base_deltas]
+        if changed_rows is None or sum(base_rows) < sum(changed_rows):
+            base, deltas, changed_rows = base_name, base_deltas, base_rows
+    if base is None or sum(changed_rows) > rebase_fraction * sum(len(policy) for policy in policies):
+        base = _save_base(store_dir, policies)
+        deltas = [diff_policies(policy, policy) for policy in policies]
+        changed_rows = [0 for policy in policies]
+    os.utime(_base_file(store_dir, base), None)
+
+    meta = {'base': base, 'changed_rows': dict((table_info[0], rows) for table_info, rows in zip(policy_tables, changed_rows))}
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for (key, key_field, fields, id_is_tline), policy, (changes, added, removed) in zip(policy_tables, policies, deltas):
+        arrays['{0}_fields'.format(key)] = np.array(policy.fields, dtype='U')
+        arrays['{0}_added'.format(key)] = added
+        arrays['{0}_removed'.format(key)] = removed
+        for field in policy.fields:
+            ids, old_values, new_values = changes[field]
+            arrays['{0}_ids_{1}'.format(key, field)] = ids
+            arrays['{0}_values_{1}'.format(key, field)] = new_values
+    _save_npz(version_file, arrays)
+    if old_base is not None and old_base != base:
+        _delete_unused_base(store_dir, old_base)
+    return meta
+
+
+def _apply_delta(base, delta, table_info):
+    ''' Rebuild one of a version's policy tables from its base table and the
+        version's delta arrays. '''
+    key, key_field, fields, id_is_tline = table_info
+    added = delta['{0}_added'.format(key)]
+    kept = ~tmm_scoring.match_ids(base.ids, delta['{0}_removed'.format(key)])[0]
+    fields = delta['{0}_fields'.format(key)].tolist()
+    columns = {key_field: np.concatenate([base.ids[kept], added])}
+    for field in fields:
+        base_column = base.columns.get(field, np.zeros(len(base), dtype=np.int16))
+        columns[field] = np.concatenate([base_column[kept], np.zeros(len(added), dtype=base_column.dtype)])
+    policy = tmm_scoring.AttributeStore.from_columns(key_field, fields, columns)
+    for field in fields:
+        found, pos = tmm_scoring.match_ids(delta['{0}_ids_{1}'.format(key, field)], policy.ids)
+        policy.columns[field][pos[found]] = delta['{0}_values_{1}'.format(key, field)][found]
+    return policy
+
+
+def _base_file(store_dir, base):
+    return os.path.join(store_dir, '{0}{1}.npz'.format(base_prefix, base))
+
+
+def _base_names(store_dir):
+    ''' Return the names (digests) of the bases in a store. '''
+    return sorted(
+        os.path.splitext(file_name)[0][len(base_prefix):] for file_name in os.listdir(store_dir)
+        if file_name.startswith(base_prefix) and file_name.endswith('.npz')
+    )
+
+
+def _changed_ids(delta):
+    ''' Return the sorted IDs of the rows added, removed or changed in any
+        field by a delta from diff_policies(). '''
+    changes, added, removed = delta
+    return np.unique(np.concatenate([added, removed] + [ids for ids, old_values, new_values in changes.values()]))
+
+
+def _delete_unused_base(store_dir, base):
+    ''' Delete a base if no version in the store uses it. '''
+    if not any(meta['base'] == base for name, meta in list_versions(store_dir)):
+        os.remove(_base_file(store_dir, base))
+
+
+def _load_base(store_dir, base):
+    ''' Load a base's (node_policy, tline_policy) AttributeStores. '''
+    arrays = _load_npz(_base_file(store_dir, base))
+    policies = []
+    for key, key_field, fields, id_is_tline in policy_tables:
+        fields = arrays['{0}_fields'.format(key)].tolist()
+        columns = dict((field, arrays['{0}_column_{1}'.format(key, field)]) for field in fields)
+        policies.append(tmm_scoring.AttributeStore(arrays['{0}_ids'.format(key)], fields, columns, key_field))
+    return tuple(policies)
+
+
+def _load_npz(npz_file):
+    with np.load(npz_file) as arrays:
+        return dict((name, arrays[name]) for name in arrays.files)
+
+
+def _policy_digest(policies):
+    ''' Return the hex digest of a pair of policy AttrTables' IDs, fields &
+        values, which names their base. '''
+    digest = hashlib.sha1()
+    for (key, key_field, fields, id_is_tline), policy in zip(policy_tables, policies):
+        digest.update(json.dumps([key] + list(policy.fields)).encode('utf-8'))
+        digest.update(u'\n'.join(u'{0}'.format(row_id) for row_id in policy.ids.tolist()).encode('utf-8'))
+        for field in policy.fields:
+            digest.update(policy.columns[field].astype('<i8').tobytes())
+    return digest.hexdigest()
+
+
+def _read_meta(version_file):
+    with np.load(version_file) as arrays:
+        return json.loads(str(arrays['meta']))
+
+
+def _save_base(store_dir, policies):
+    ''' Snapshot a pair of policy AttrTables as a base, unless an identical
+        one is already stored. Returns the base's name. '''
+    arrays = {}
+    for (key, key_field, fields, id_is_tline), policy in zip(policy_tables, policies):
+        arrays['{0}_ids'.format(key)] = policy.ids
+        arrays['{0}_fields'.format(key)] = np.array(policy.fields, dtype='U')
+        for field in policy.fields:
+            arrays['{0}_column_{1}'.format(key, field)] = policy.columns[field]
+    base = _policy_digest(policies)
+    if not os.path.exists(_base_file(store_dir, base)):
+        _save_npz(_base_file(store_dir, base), arrays)
+    return base
+
+
+def _save_npz(npz_file, arrays):
+    ''' Save arrays to a .npz file via a temporary file, so a failed save
+        can't leave a partial version behind. '''
+    temp_file = npz_file + '.tmp'
+    with open(temp_file, 'wb') as temp_npz:
+        np.savez(temp_npz, **arrays)
+    tmm_scoring.replace_file(temp_file, npz_file)
+    return npz_file
+
+
+def _version_file(store_dir, name):
+    version_file = os.path.join(store_dir, '{0}.npz'.format(name))
+    if name.startswith(base_prefix) or not os.path.exists(version_file):
+        raise ValueError('There is no version named "{0}".'.format(name))
+    return version_file
+
+
+def _write_changes(table, table_info, old_policy, new_policy):
+    ''' Update the rows of a policy table whose values differ between its
+        current AttrTable and a new one. Returns the number of rows written. '''
+    key, key_field, fields, id_is_tline = table_info
+    fields = new_policy.fields
+    if not np.array_equal(old_policy.ids, new_policy.ids) or old_policy.fields != fields:
+        tmm_backends.create_policy_table(table, key_field, new_policy.ids, fields, id_is_tline)
+        zeroes = dict((field, np.zeros(len(new_policy), dtype=np.int16)) for field in fields)
+        old_policy = tmm_scoring.AttrTable(new_policy.ids, fields, zeroes)
+
+    # Write every changed row's new values in a single update, keyed by ID
+    new_values = np.column_stack([new_policy.columns[field] for field in fields])
+    old_values = np.column_stack([old_policy.columns[field] for field in fields])
+    changed = np.flatnonzero(np.any(new_values != old_values, axis=1))
+    columns = dict((field, new_policy.columns[field][changed]) for field in fields)
+    return tmm_backends.update_policy(table, key_field, new_policy.ids[changed].tolist(), fields, columns)
+
+
+# -----------------------------------------------------------------------------
+#  Save, check out or compare versions.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save, check out and compare versions of the TMM policy tables.')
+    parser.add_argument('command', choices=('save', 'checkout', 'diff', 'list', 'delete', 'export'))
+    parser.add_argument('names', nargs='*', help='version name(s), or a version name & database to export it to')
+    parser.add_argument('--node-table', default=os.path.join(TMM.gdb, 'extra_attr_nodes'), help='node policy table')
+    parser.add_argument('--tline-table', default=os.path.join(TMM.gdb, 'extra_attr_tlines'), help='tline policy table')
+    parser.add_argument('--store-dir', default=default_store_dir(), help='version store (default: alongside TMM_GIS.gdb)')
+    args = parser.parse_args()
+    min_names, max_names = {'list': (0, 0), 'diff': (1, 2), 'export': (2, 2)}.get(args.command, (1, 1))
+    if not min_names <= len(args.names) <= max_names:
+        parser.error('wrong number of version names for "{0}"'.format(args.command))
+
+    if args.command == 'save':
+        meta = save_version(args.store_dir, args.names[0], *tmm_gdb2csv.load_policy_tables(args.node_table, args.tline_table))
+        print('Saved {0}: {1[node]} nodes and {1[tline]} tlines differ from base {2}.'.format(args.names[0], meta['changed_rows'], meta['base'][:12]))
+
+    elif args.command == 'checkout':
+        written = checkout_version(args.store_dir, args.names[0], args.node_table, args.tline_table)
+        print('Checked out {0}: updated {1} nodes and {2} tlines.'.format(args.names[0], *written))
+
+    elif args.command == 'diff':
+        old_policies = load_version(args.store_dir, args.names[0])
+        if len(args.names) > 1:
+            new_policies = load_version(args.store_dir, args.names[1])
+        else:
+            new_policies = tmm_gdb2csv.load_policy_tables(args.node_table, args.tline_table)
+        for (key, key_field, fields, id_is_tline), old_policy, new_policy in zip(policy_tables, old_policies, new_policies):
+            changes, added, removed = diff_policies(old_policy, new_policy)
+            print('{0}: {1} added, {2} removed'.format(key, len(added), len(removed)))
+            for field in new_policy.fields:
+                print('  {0}: {1} changed'.format(field, len(changes[field][0])))
+
+    elif args.command == 'list':
+        for name, meta in list_versions(args.store_dir):
+            print('{0}\tbase {1}\t{2[node]} nodes, {2[tline]} tlines changed'.format(name, meta['base'][:12], meta['changed_rows']))
+
+    elif args.command == 'delete':
+        delete_version(args.store_dir, args.names[0])
+
+    elif args.command == 'export':
+        node_table, tline_table = export_version(args.store_dir, args.names[0], args.names[1])
+        print('Exported {0}: run tmm_gdb2csv.py --sparse --node-table {1} --tline-table {2}'.format(args.names[0], node_table, tline_table))